@@ -1,9 +1,10 @@
 import os
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any
-import vertexai
-from vertexai.generative_models import GenerativeModel, FunctionDeclaration, Tool, Part
+from vertexai.generative_models import FunctionDeclaration, Tool, Part
 from google.cloud import firestore
+import llm_gateway
+from structured_output import QUERY_ANALYSIS_SCHEMA, StructuredOutputError
 import json
 import requests
 from tools.incidents import get_incidents_tool
@@ -21,8 +22,6 @@ firestore_db = firestore.Client()
 
 # --- Helper: Analyze Query with Gemini ---
 def analyze_query_with_gemini(query: str) -> dict:
-    vertexai.init(project=PROJECT, location=LOCATION)
-    model = GenerativeModel(GEMINI_MODEL)
     prompt = f"""
 You are an AI assistant analyzing user queries for a safety monitoring system. 
 
@@ -58,13 +57,11 @@ Analyze this query and return a JSON object with the following structure:
 Only include fields that are relevant based on the query. Be intelligent about what data would be most helpful.
 Return ONLY the JSON object, no other text.
 """
-    response = model.generate_content([Part.from_text(prompt)])
-    text = response.text.replace("```json", "").replace("```", "").strip()
     try:
-        analysis = json.loads(text)
+        analysis, _ = llm_gateway.generate_json([Part.from_text(prompt)], "analyze_query_with_gemini", QUERY_ANALYSIS_SCHEMA, prompt=prompt, model_name=GEMINI_MODEL)
         return analysis
-    except Exception as e:
-        print("Gemini query analysis failed, falling back. Raw:", text)
+    except StructuredOutputError as e:
+        print("Gemini query analysis failed, falling back. Raw:", e.raw)
         return None
 
 # --- Fallback Manual Query Analysis ---
@@ -127,11 +124,10 @@ def fetch_context_data(analysis: dict) -> dict:
 
 # --- Generate Final Response with Gemini ---
 def generate_intelligent_response_with_gemini(query: str, context_data: dict, analysis: dict) -> str:
-    vertexai.init(project=PROJECT, location=LOCATION)
-    model = GenerativeModel(GEMINI_MODEL)
     context_text = json.dumps(context_data, indent=2)
     prompt = f"""{query}\n\nContext:\n{context_text}"""
-    response = model.generate_content([Part.from_text(prompt)])
+    response = llm_gateway.generate_content([Part.from_text(prompt)], "generate_intelligent_response_with_gemini",
+                                            prompt=prompt, model_name=GEMINI_MODEL)
     return response.text.strip()
 
 # --- Tool registration for Gemini ---
@@ -259,8 +255,7 @@ def agentic_orchestrator(request: Dict):
     user_query = request.get("input")
     if not user_query:
         raise HTTPException(status_code=400, detail="Query parameter 'input' is required.")
-    vertexai.init(project=PROJECT, location=LOCATION)
-    model = GenerativeModel(GEMINI_MODEL, tools=adk_tools)
+    model = llm_gateway.get_model(GEMINI_MODEL, tools=adk_tools)
     system_prompt = (
         "You are a safety monitoring AI agent. You have access to real-time data via tools. "
         "Always use the tools to get numbers, lists, or facts. Never make up data. "
@@ -270,7 +265,7 @@ def agentic_orchestrator(request: Dict):
     )
     # Remove system_instruction and tool_config from start_chat()
     full_prompt = f"{system_prompt}\n\n{user_query}"
-    response = model.generate_content(full_prompt)
+    response = llm_gateway.generate_content(full_prompt, "agentic_orchestrator", model_name=GEMINI_MODEL, tools=adk_tools)
     tool_calls = getattr(response, "function_calls", [])
     tool_results = {}
     # If the agent called tools, execute them and send results back to the model
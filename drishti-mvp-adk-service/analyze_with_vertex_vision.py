@@ -6,8 +6,9 @@ from datetime import datetime
 import base64
 import json
 import requests
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from vertexai.generative_models import Part
+import llm_gateway
+from structured_output import MEDIA_ANALYSIS_SCHEMA, StructuredOutputError
 
 router = APIRouter()
 
@@ -101,20 +102,15 @@ The person count detected by Vertex AI Vision is {person_count}.
 """
 
     # 5. Call Gemini
-    vertexai.init(project=PROJECT, location=LOCATION)
-    model = GenerativeModel(GEMINI_MODEL)
     contents = [
         Part.from_text(prompt),
         Part.from_image(image_bytes) if image_bytes else Part.from_text("")
     ]
-    response = model.generate_content(contents)
-    # 6. Parse JSON from Gemini response
+    # 6. Parse JSON from Gemini response (structured output, validated and repaired)
     try:
-        text = response.text
-        text = text.replace("```json", "").replace("```", "").strip()
-        result_json = json.loads(text)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Gemini response parse error: {e}, raw: {text}")
+        result_json, text = llm_gateway.generate_json(contents, "analyze_with_vertex_vision", MEDIA_ANALYSIS_SCHEMA, prompt=prompt, model_name=GEMINI_MODEL)
+    except StructuredOutputError as e:
+        raise HTTPException(status_code=500, detail=f"Gemini response parse error: {e}, raw: {e.raw}")
 
     # 7. Store result in Firestore (optional, if media_id or gcs_path)
     if media_doc:
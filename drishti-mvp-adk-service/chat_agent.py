@@ -3,9 +3,7 @@ import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Any, Dict
-import vertexai
 from vertexai.generative_models import (
-    GenerativeModel,
     GenerationConfig,
     FunctionDeclaration,
     Tool,
@@ -13,6 +11,8 @@ from vertexai.generative_models import (
     HarmCategory,
     SafetySetting,
 )
+import llm_gateway
+from llm_tracing import llm_span
 from tools import (
     create_incident_tool,
     get_incidents_tool as get_incident_data,
@@ -22,9 +22,6 @@ from tools import (
     get_incident_analytics_tool as get_analytics_summary,
 )
 
-# Initialize Vertex AI
-vertexai.init(project=os.getenv("GCP_PROJECT"), location=os.getenv("GCP_REGION", "us-central1"))
-
 # Manually define function declarations for each tool
 incident_tool = Tool(function_declarations=[
     FunctionDeclaration(
@@ -103,7 +100,7 @@ incident_tool = Tool(function_declarations=[
 ])
 
 # Set up the model with tools and config
-model = GenerativeModel(
+model = llm_gateway.get_model(
     os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
     tools=[incident_tool],
     generation_config=GenerationConfig(temperature=0.0),
@@ -130,7 +127,9 @@ async def chat_with_agent(request: ChatRequest):
     try:
         # Start a chat session
         chat = model.start_chat()
-        response = chat.send_message(user_input, safety_settings=safety_settings)
+        with llm_span(model._model_name, user_input, "chat_with_agent", operation="chat") as span:
+            response = chat.send_message(user_input, safety_settings=safety_settings)
+            span.record_response(response)
         return {"response": response.text}
     except Exception as e:
         return {"response": f"Sorry, I encountered an error: {e}"}
@@ -0,0 +1,107 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+import json
+import os
+import threading
+from collections import OrderedDict
+import vertexai
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+from llm_tracing import llm_span
+from structured_output import parse_json
+
+PROJECT = os.getenv("GCP_PROJECT")
+LOCATION = os.getenv("GCP_REGION", "us-central1")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+
+_lock = threading.Lock()
+_initialized = False
+# Oldest handles are dropped past this many, so callers building Tools per request cannot grow the cache without bound.
+MAX_CACHED_MODELS = 64
+# key -> (tools, model); holding the tools keeps their ids, which are part of the key, from being reused.
+_models: "OrderedDict[Tuple, Tuple[tuple, GenerativeModel]]" = OrderedDict()
+_json_configs: Dict[str, GenerationConfig] = {}
+
+def init_vertex():
+    """vertexai.init once per process."""
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if not _initialized:
+            vertexai.init(project=PROJECT, location=LOCATION)
+            _initialized = True
+
+def _config_key(config: Any) -> Optional[str]:
+    if config is None:
+        return None
+    if hasattr(config, "to_dict"):
+        config = config.to_dict()
+    return json.dumps(config, sort_keys=True, default=str)
+
+def get_model(model_name: str = GEMINI_MODEL, generation_config: Any = None, tools: Optional[Sequence] = None,
+              system_instruction: Optional[str] = None) -> GenerativeModel:
+    """Shared GenerativeModel for (model, generation config, tools, system instruction).
+
+    Handles are built once and reused, so callers no longer pay model setup per call and
+    reuse its gRPC channel. Tools are keyed by identity: pass the same Tool objects
+    (module-level constants) to get the same handle back.
+    """
+    tools = tuple(tools or ())
+    key = (model_name, _config_key(generation_config), tuple(id(tool) for tool in tools), system_instruction)
+    entry = _models.get(key)
+    if entry is not None:
+        return entry[1]
+    init_vertex()
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None:
+            model = entry[1]
+        else:
+            kwargs = {}
+            if generation_config is not None:
+                kwargs["generation_config"] = generation_config
+            if tools:
+                kwargs["tools"] = list(tools)
+            if system_instruction:
+                kwargs["system_instruction"] = system_instruction
+            model = GenerativeModel(model_name, **kwargs)
+            _models[key] = (tools, model)
+            while len(_models) > MAX_CACHED_MODELS:
+                _models.popitem(last=False)
+    return model
+
+def json_config(schema: Dict[str, Any]) -> GenerationConfig:
+    """GenerationConfig that constrains the answer to schema (response_mime_type application/json).
+    Built once per distinct schema (keyed by its JSON form, like generation configs in get_model)."""
+    key = _config_key(schema)
+    config = _json_configs.get(key)
+    if config is None:
+        config = _json_configs[key] = GenerationConfig(response_mime_type="application/json", response_schema=schema)
+    return config
+
+def generate_content(contents: Any, agent: str, prompt: Optional[str] = None, model_name: str = GEMINI_MODEL,
+                     generation_config: Any = None, tools: Optional[Sequence] = None,
+                     system_instruction: Optional[str] = None, **kwargs):
+    """generate_content on the shared model handle, traced as one LLM span for agent (the calling router or tool).
+    prompt is the text used for the span's size; it defaults to contents when that is a string."""
+    model = get_model(model_name, generation_config, tools, system_instruction)
+    span_prompt = prompt if prompt is not None else contents if isinstance(contents, str) else ""
+    with llm_span(model_name, span_prompt, agent) as span:
+        response = model.generate_content(contents, **kwargs)
+        span.record_response(response)
+    return response
+
+def response_text(response) -> str:
+    """response.text, or "" for responses without text (blocked, function calls)."""
+    try:
+        return response.text
+    except Exception:
+        return ""
+
+def generate_json(contents: Any, agent: str, schema: Dict[str, Any], prompt: Optional[str] = None,
+                  model_name: str = GEMINI_MODEL, **kwargs) -> Tuple[Any, str]:
+    """generate_content in structured-output mode: the answer is constrained to schema, then parsed,
+    validated and repaired by structured_output.parse_json. Returns (result, raw text); raises
+    StructuredOutputError when the answer cannot be used."""
+    response = generate_content(contents, agent, prompt, model_name, generation_config=json_config(schema), **kwargs)
+    text = response_text(response)
+    return parse_json(text, schema, agent), text
@@ -0,0 +1,249 @@
+# Kept in sync with gcp-crowd-agents/tools/llm_tracing.py: the two services are built and deployed
+# from separate directories, so they cannot share a module. This copy takes the agent as a parameter
+# and has no Prometheus or prompt context hooks; change anything else in both files.
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "drishti-mvp-adk-service"
+LLM_TRACE_PATH = os.getenv("LLM_TRACE_PATH", "")
+LLM_TRACE_OTLP_ENDPOINT = os.getenv("LLM_TRACE_OTLP_ENDPOINT", "")
+LLM_TRACE_FLUSH_INTERVAL_SECONDS = float(os.getenv("LLM_TRACE_FLUSH_INTERVAL_SECONDS", "1.0"))
+SPAN_QUEUE_SIZE = 10000
+SPAN_BATCH_SIZE = 200
+# OTLP span kind CLIENT and status codes OK / ERROR.
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+class LLMSpan:
+    """One model call: who made it, how big it was and where the time went.
+
+    Token counts are taken from the response's usage_metadata when the SDK returns it.
+    For unary calls the whole answer arrives at once, so time to first token equals latency.
+    """
+
+    def __init__(self, model: str, prompt: str, agent: str, operation: str):
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.model = model
+        self.operation = operation
+        self.agent = agent
+        self.prompt_chars = len(prompt or "")
+        self.prompt_tokens: Optional[int] = None
+        self.response_tokens: Optional[int] = None
+        self.response_chars: Optional[int] = None
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._started = time.perf_counter()
+        self.first_token_seconds: Optional[float] = None
+        self.duration_seconds: Optional[float] = None
+
+    def first_token(self):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self._started
+
+    def record_usage(self, usage_metadata):
+        """Add the token counts of one model response; multi-step calls report one per step."""
+        if usage_metadata is None:
+            return
+        prompt_tokens = getattr(usage_metadata, "prompt_token_count", None)
+        response_tokens = getattr(usage_metadata, "candidates_token_count", None)
+        if prompt_tokens is not None:
+            self.prompt_tokens = (self.prompt_tokens or 0) + prompt_tokens
+        if response_tokens is not None:
+            self.response_tokens = (self.response_tokens or 0) + response_tokens
+
+    def record_response(self, response=None, text: Optional[str] = None):
+        self.first_token()
+        if response is not None:
+            self.record_usage(getattr(response, "usage_metadata", None))
+            if text is None:
+                try:
+                    text = response.text
+                except Exception:
+                    # Blocked and function-call-only responses have no text.
+                    text = None
+        if text is not None:
+            self.response_chars = len(text)
+
+    def end(self, error: Optional[BaseException] = None):
+        self.duration_seconds = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration_seconds * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def outcome(self) -> str:
+        return "error" if self.error else "ok"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in OTLP/JSON form, with gen_ai.* semantic convention attribute names where they exist."""
+        attributes = {
+            "gen_ai.system": "vertex_ai",
+            "gen_ai.operation.name": self.operation,
+            "gen_ai.request.model": self.model,
+            "drishti.agent": self.agent,
+            "llm.prompt_chars": self.prompt_chars,
+            "llm.latency_ms": round(self.duration_seconds * 1000, 2),
+        }
+        if self.prompt_tokens is not None:
+            attributes["gen_ai.usage.input_tokens"] = self.prompt_tokens
+        if self.response_tokens is not None:
+            attributes["gen_ai.usage.output_tokens"] = self.response_tokens
+        if self.response_chars is not None:
+            attributes["llm.response_chars"] = self.response_chars
+        if self.first_token_seconds is not None:
+            attributes["llm.time_to_first_token_ms"] = round(self.first_token_seconds * 1000, 2)
+        status = {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK}
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": f"{self.operation} {self.model}",
+            "kind": SPAN_KIND_CLIENT,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in attributes.items()],
+            "status": status,
+        }
+
+def export_request(spans: List[Dict]) -> Dict[str, Any]:
+    """Wrap spans in an OTLP ExportTraceServiceRequest, as read by the collector's otlpjsonfile receiver."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "drishti.llm"}, "spans": spans}],
+    }]}
+
+class SpanSink:
+    """Bounded queue of finished spans, drained by a background thread.
+
+    If path is set (LLM_TRACE_PATH), every batch is appended to it as one OTLP/JSON line; if endpoint
+    is set, it is POSTed to an OTLP/HTTP traces endpoint (e.g. http://collector:4318/v1/traces).
+    Both are off by default. The file is not rotated, so use it for local runs only: on Cloud Run
+    it lives in the in-memory filesystem. export() never blocks; spans are dropped and counted when
+    the queue is full.
+    """
+
+    def __init__(self, path: str = LLM_TRACE_PATH, endpoint: str = LLM_TRACE_OTLP_ENDPOINT,
+                 flush_interval: float = LLM_TRACE_FLUSH_INTERVAL_SECONDS, maxsize: int = SPAN_QUEUE_SIZE):
+        self.path = path
+        self.endpoint = endpoint
+        self.flush_interval = flush_interval
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.endpoint)
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-span-writer", daemon=True)
+                self._thread.start()
+
+    def export(self, span: LLMSpan) -> bool:
+        if not self.enabled:
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(span.to_otlp())
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _next_batch(self) -> List[Dict]:
+        spans = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(spans) < SPAN_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                spans.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return spans
+
+    def _write(self, spans: List[Dict]):
+        line = json.dumps(export_request(spans))
+        try:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            if self.endpoint:
+                request = urllib.request.Request(self.endpoint, data=line.encode("utf-8"),
+                                                 headers={"Content-Type": "application/json"})
+                urllib.request.urlopen(request, timeout=10).close()
+            self.exported += len(spans)
+        except Exception as e:
+            self.failed += len(spans)
+            logger.error(f"[LLMTracing] Failed to export {len(spans)} spans: {e}")
+        finally:
+            for _ in spans:
+                self._queue.task_done()
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            spans = self._next_batch()
+            if spans:
+                self._write(spans)
+
+    def flush(self, timeout: Optional[float] = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.05)
+
+    def close(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), "exported": self.exported, "dropped": self.dropped, "failed": self.failed}
+
+span_sink = SpanSink()
+atexit.register(span_sink.close)
+
+@contextmanager
+def llm_span(model: str, prompt: str, agent: str, operation: str = "generate_content"):
+    """Wrap one model call in a span; agent names the router or tool making it. On exit the span is queued for export."""
+    span = LLMSpan(model, prompt, agent, operation)
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        span.end(error)
+        span_sink.export(span)
@@ -0,0 +1,193 @@
+# Kept in sync with gcp-crowd-agents/tools/structured_output.py: the two services are built and
+# deployed from separate directories, so they cannot share a module. Change the parsing code in both
+# files; only the response schemas at the end of this copy are specific to it.
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DECODER = json.JSONDecoder()
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+_CLOSERS = {"{": "}", "[": "]"}
+
+class StructuredOutputError(ValueError):
+    """The model answer could not be parsed, or repaired, into the expected JSON."""
+
+    def __init__(self, message: str, raw: Optional[str] = None):
+        super().__init__(message)
+        self.raw = raw
+
+def extract_json_from_markdown(text: str) -> str:
+    """Strip a ```json ... ``` (or bare ```) fence around the answer."""
+    text = re.sub(r'^```json\s*', '', text.strip(), flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'^```\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'```$', '', text, flags=re.MULTILINE)
+    return text.strip()
+
+def _close_truncated(text: str) -> str:
+    """Close the strings, objects and arrays left open by an answer cut off at max_output_tokens."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text = (text[:-1] if escaped else text) + '"'
+    # A dangling separator or key would still be invalid once closed.
+    text = re.sub(r'((?:,|(?<=\{))\s*"[^"]*"\s*:?|"[^"]*"\s*:|,)\s*$', '', text.rstrip())
+    return text + "".join(reversed(stack))
+
+def repair_json(text: str) -> Any:
+    """Best-effort parse of a near-JSON answer: leading or trailing prose, trailing commas, truncation.
+    Raises StructuredOutputError when nothing usable is left."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise StructuredOutputError("no JSON object or array in the answer", text)
+    candidate = _TRAILING_COMMA.sub(r'\1', text[min(starts):])
+    for attempt in (candidate, _close_truncated(candidate)):
+        try:
+            value, _ = _DECODER.raw_decode(attempt)
+            return value
+        except ValueError:
+            continue
+    raise StructuredOutputError("answer is not valid JSON and could not be repaired", text)
+
+def _type_of(schema: Dict[str, Any]) -> str:
+    return str(schema.get("type", "")).lower()
+
+def conform(value: Any, schema: Dict[str, Any], path: str = "$") -> Tuple[Any, List[str]]:
+    """Validate value against a response_schema (the OpenAPI subset Vertex accepts: type, properties,
+    required, items, enum, nullable) and repair what can be repaired without guessing: numbers and
+    booleans sent as strings, enum values in the wrong case, a lone object where a list is expected.
+    Returns the repaired value and the problems that are left."""
+    kind = _type_of(schema)
+    if value is None:
+        return value, [] if schema.get("nullable") or not kind else [f"{path}: missing value"]
+    errors: List[str] = []
+    if kind == "object":
+        if not isinstance(value, dict):
+            return value, [f"{path}: expected object, got {type(value).__name__}"]
+        value = dict(value)
+        for name, sub_schema in schema.get("properties", {}).items():
+            if name in value:
+                value[name], sub_errors = conform(value[name], sub_schema, f"{path}.{name}")
+                errors.extend(sub_errors)
+        errors.extend(f"{path}: missing {name}" for name in schema.get("required", ()) if name not in value)
+    elif kind == "array":
+        if isinstance(value, dict) and _type_of(schema.get("items", {})) == "object":
+            value = [value]
+        if not isinstance(value, list):
+            return value, [f"{path}: expected array, got {type(value).__name__}"]
+        items, value = schema.get("items"), list(value)
+        if items:
+            for i, item in enumerate(value):
+                value[i], sub_errors = conform(item, items, f"{path}[{i}]")
+                errors.extend(sub_errors)
+    elif kind == "string":
+        if isinstance(value, (int, float, bool)):
+            value = json.dumps(value)
+        elif not isinstance(value, str):
+            errors.append(f"{path}: expected string, got {type(value).__name__}")
+    elif kind in ("integer", "number"):
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                pass
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append(f"{path}: expected {kind}, got {type(value).__name__}")
+        elif kind == "integer" and float(value).is_integer():
+            value = int(value)
+        elif kind == "integer":
+            errors.append(f"{path}: expected integer, got {value}")
+    elif kind == "boolean":
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            value = value.strip().lower() == "true"
+        elif not isinstance(value, bool):
+            errors.append(f"{path}: expected boolean, got {type(value).__name__}")
+    enum = schema.get("enum")
+    if enum and isinstance(value, str) and value not in enum:
+        matches = [option for option in enum if option.lower() == value.strip().lower()]
+        if matches:
+            value = matches[0]
+        else:
+            errors.append(f"{path}: {value!r} is not one of {enum}")
+    return value, errors
+
+def parse_json(text: Optional[str], schema: Optional[Dict[str, Any]] = None, label: str = "") -> Any:
+    """The model answer as JSON: fences stripped, repaired if needed, and conformed to schema.
+    Only an unusable answer raises StructuredOutputError; smaller schema problems are logged and the
+    value is kept, so one odd field does not throw away the whole call."""
+    if not text:
+        raise StructuredOutputError("empty answer", text)
+    cleaned = extract_json_from_markdown(text)
+    try:
+        value = json.loads(cleaned)
+    except ValueError:
+        value = repair_json(cleaned)
+        logger.info("[StructuredOutput] Repaired malformed JSON answer (%s)", label)
+    if schema is None:
+        return value
+    value, errors = conform(value, schema)
+    root = _type_of(schema)
+    if (root == "object" and not isinstance(value, dict)) or (root == "array" and not isinstance(value, list)):
+        raise StructuredOutputError(f"expected a JSON {root}: {errors[0]}", text)
+    if errors:
+        logger.warning("[StructuredOutput] Answer does not match its schema (%s): %s", label, "; ".join(errors[:5]))
+    return value
+
+# response_schema of the media analysis JSON requested by the analyze endpoints and tools.
+MEDIA_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "peopleCount": {"type": "integer"},
+        "crowdDensity": {"type": "string", "enum": ["low", "moderate", "high"]},
+        "smokeDetected": {"type": "boolean"},
+        "fireDetected": {"type": "boolean"},
+        "medicalEmergency": {"type": "boolean"},
+        "potentialRisk": {"type": "boolean"},
+        "incidentRecommended": {"type": "boolean"},
+        "incidentType": {"type": "string"},
+        "suggestedAction": {"type": "string"},
+    },
+    "required": [
+        "peopleCount", "crowdDensity", "smokeDetected", "fireDetected", "medicalEmergency",
+        "potentialRisk", "incidentRecommended", "incidentType", "suggestedAction",
+    ],
+}
+
+# response_schema of the chat query analysis; every field is optional, as the prompt asks.
+QUERY_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "contextType": {"type": "string", "enum": ["incidents", "zones", "responders", "contacts", "analytics", "general"]},
+        "needsIncidents": {"type": "boolean"},
+        "needsZones": {"type": "boolean"},
+        "needsResponders": {"type": "boolean"},
+        "needsContacts": {"type": "boolean"},
+        "needsAnalytics": {"type": "boolean"},
+        "specificFilters": {
+            "type": "object",
+            "properties": {
+                "status": {"type": "string"},
+                "priority": {"type": "string"},
+                "zone": {"type": "string"},
+                "type": {"type": "string"},
+            },
+        },
+        "intent": {"type": "string"},
+        "suggestedSearches": {"type": "array", "items": {"type": "string"}},
+    },
+}
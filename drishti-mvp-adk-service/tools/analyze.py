@@ -1,13 +1,16 @@
 
 # AI/Analysis tool functions
 import os
-from google.cloud import aiplatform, firestore, storage
+from google.cloud import firestore, storage
 from google.cloud import vision
 from datetime import datetime
 import base64
 import json
 import requests
 from typing import Dict, Any
+from vertexai.generative_models import Part
+import llm_gateway
+from structured_output import MEDIA_ANALYSIS_SCHEMA, StructuredOutputError
 
 PROJECT = os.getenv("GCP_PROJECT")
 LOCATION = os.getenv("GCP_REGION", "us-central1")
@@ -71,21 +74,13 @@ def analyze_with_gemini_tool(request: Dict[str, Any]) -> Dict[str, Any]:
 {zone_context}
 {schema}
 """
-    aiplatform.init(project=PROJECT, location=LOCATION)
-    model = aiplatform.TextGenerationModel.from_pretrained(GEMINI_MODEL)
-    contents = [
-        {"role": "user", "parts": [
-            {"text": prompt},
-            {"inlineData": {"mimeType": "image/jpeg", "data": image_b64}}
-        ]}
-    ]
-    response = model.predict(contents)
+    contents = [Part.from_text(prompt)]
+    if image_b64:
+        contents.append(Part.from_data(data=base64.b64decode(image_b64), mime_type="image/jpeg"))
     try:
-        text = response.text
-        text = text.replace("```json", "").replace("```", "").strip()
-        result_json = json.loads(text)
-    except Exception as e:
-        raise ValueError(f"Gemini response parse error: {e}, raw: {text}")
+        result_json, text = llm_gateway.generate_json(contents, "analyze_with_gemini_tool", MEDIA_ANALYSIS_SCHEMA, prompt=prompt, model_name=GEMINI_MODEL)
+    except StructuredOutputError as e:
+        raise ValueError(f"Gemini response parse error: {e}, raw: {e.raw}")
     if media_doc:
         media_ref = firestore_db.collection("media").document(media_doc.id)
         media_ref.update({"geminiAnalysis": result_json, "analyzedAt": datetime.utcnow()})
@@ -152,21 +147,11 @@ def analyze_with_vertex_vision_tool(request: Dict[str, Any]) -> Dict[str, Any]:
 The person count detected by Vertex AI Vision is {person_count}.
 {schema}
 """
-    aiplatform.init(project=PROJECT, location=LOCATION)
-    model = aiplatform.TextGenerationModel.from_pretrained(GEMINI_MODEL)
-    contents = [
-        {"role": "user", "parts": [
-            {"text": prompt},
-            {"inlineData": {"mimeType": "image/jpeg", "data": image_b64}}
-        ]}
-    ]
-    response = model.predict(contents)
+    contents = [Part.from_text(prompt), Part.from_data(data=image_bytes, mime_type="image/jpeg")]
     try:
-        text = response.text
-        text = text.replace("```json", "").replace("```", "").strip()
-        result_json = json.loads(text)
-    except Exception as e:
-        raise ValueError(f"Gemini response parse error: {e}, raw: {text}")
+        result_json, text = llm_gateway.generate_json(contents, "analyze_with_vertex_vision_tool", MEDIA_ANALYSIS_SCHEMA, prompt=prompt, model_name=GEMINI_MODEL)
+    except StructuredOutputError as e:
+        raise ValueError(f"Gemini response parse error: {e}, raw: {e.raw}")
     if media_doc:
         media_ref = firestore_db.collection("media").document(media_doc.id)
         media_ref.update({"vertexVisionAnalysis": result_json, "visionPersonCount": person_count, "analyzedAt": datetime.utcnow()})
@@ -1,8 +1,9 @@
 # Chat agent tool functions
 import os
-from google.cloud import aiplatform, firestore
-import json
+from google.cloud import firestore
 from typing import Dict, Any
+import llm_gateway
+from structured_output import QUERY_ANALYSIS_SCHEMA, StructuredOutputError
 
 PROJECT = os.getenv("GCP_PROJECT")
 LOCATION = os.getenv("GCP_REGION", "us-central1")
@@ -14,19 +15,14 @@ def chat_agent_tool(request: Dict[str, Any]) -> Dict[str, Any]:
     if not user_input:
         raise ValueError("Input is required.")
     # Step 1: Analyze query with Gemini
-    aiplatform.init(project=PROJECT, location=LOCATION)
-    model = aiplatform.TextGenerationModel.from_pretrained(MODEL)
     prompt = f"""
 You are an AI assistant analyzing user queries for a safety monitoring system. ... (same as before)
 User Query: \"{user_input}\"
 ... (rest of the prompt)
 """
-    response = model.predict(prompt)
     try:
-        output = response.text
-        output = output.replace("```json", "").replace("```", "").strip()
-        analysis = json.loads(output)
-    except Exception as e:
+        analysis, _ = llm_gateway.generate_json(prompt, "chat_agent_tool", QUERY_ANALYSIS_SCHEMA, model_name=MODEL)
+    except StructuredOutputError:
         analysis = None
     if not analysis:
         # fallback logic (copy from chat_agent.py)
@@ -1,6 +1,8 @@
 from memory.firestore_memory import FirestoreMemory
 from comms.pubsub import PubSubComms
 from utils.agent_service import AgentService
+from tools.metrics import track_agent
+from utils.log_policy import get_logger, lazy_json, lazy_text
 import json
 import time
 from google.adk.events import Event, EventActions
@@ -9,7 +11,7 @@ import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 class ChatAgent:
     def __init__(self):
@@ -29,8 +31,8 @@ class ChatAgent:
         else:
             return obj
 
-    async def handle_query(self, user_query, session_id="default", use_llm_prompt=False):
-        logger.info(f"[ChatAgent] handle_query called with session_id={session_id}, user_query={user_query.replace(chr(10), ' | ')}")
+    async def _prepare_turn(self, user_query, session_id, use_llm_prompt):
+        """Records the user query in short-term memory and builds the prompt for the turn."""
         user_event = {
             "type": "user_query",
             "timestamp": int(time.time() * 1000),
@@ -42,9 +44,9 @@ class ChatAgent:
         await self.agent_service.append_event(session_id, user_event)
         logger.info("[ChatAgent] Appended user query to short-term memory")
         short_term_context = await self.agent_service.get_short_term_context(session_id)
-        logger.info(f"[ChatAgent] short_term_context: {short_term_context.replace(chr(10), ' | ')}")
+        logger.debug("[ChatAgent] short_term_context: %s", lazy_text(short_term_context))
         long_term_context = self.memory.get_recent_events(limit=5)
-        logger.info(f"[ChatAgent] long_term_context: {json.dumps(long_term_context, separators=(',', ':'))}")
+        logger.debug("[ChatAgent] long_term_context: %s", lazy_json(long_term_context))
         logger.info("[ChatAgent] Fetching structured data from Firestore")
         # Build prompt without up-front data fetching
         prompt = (
@@ -61,10 +63,12 @@ class ChatAgent:
                 "Return ONLY the prompt."
             )
             prompt = await self.agent_service.run_llm(meta_prompt, session_id)
-        logger.info(f"[ChatAgent] prompt: {prompt.replace(chr(10), ' | ')}")
-        logger.info("[ChatAgent] Calling LLM via AgentService")
-        answer = await self.agent_service.run_llm(prompt, session_id)
-        logger.info(f"[ChatAgent] LLM answer: {str(answer).replace(chr(10), ' | ')}")
+        logger.debug("[ChatAgent] prompt: %s", lazy_text(prompt))
+        return prompt
+
+    async def _finish_turn(self, user_query, answer, session_id):
+        """Saves the answer to long- and short-term memory."""
+        logger.info("[ChatAgent] LLM answer: %s", lazy_text(answer))
         self.memory.save_event({"query": user_query, "answer": answer})
         logger.info("[ChatAgent] Saved to long-term memory")
         assistant_event = {
@@ -79,9 +83,30 @@ class ChatAgent:
         logger.info("[ChatAgent] Appended answer to short-term memory")
         await self.agent_service.update_structured_context(session_id, user_query, answer, {})
         logger.info("[ChatAgent] Updated structured context in short-term memory")
+
+    @track_agent("chat")
+    async def handle_query(self, user_query, session_id="default", use_llm_prompt=False):
+        logger.info("[ChatAgent] handle_query called with session_id=%s, user_query=%s", session_id, lazy_text(user_query))
+        prompt = await self._prepare_turn(user_query, session_id, use_llm_prompt)
+        logger.info("[ChatAgent] Calling LLM via AgentService")
+        answer = await self.agent_service.run_llm(prompt, session_id)
+        await self._finish_turn(user_query, answer, session_id)
         logger.info("[ChatAgent] Returning answer")
         return answer
 
+    @track_agent("chat")
+    async def handle_query_stream(self, user_query, session_id="default", use_llm_prompt=False):
+        """handle_query that yields the answer as the model produces it.
+        Memory is only updated once the whole answer has been streamed."""
+        logger.info("[ChatAgent] handle_query_stream called with session_id=%s, user_query=%s", session_id, lazy_text(user_query))
+        prompt = await self._prepare_turn(user_query, session_id, use_llm_prompt)
+        logger.info("[ChatAgent] Streaming LLM via AgentService")
+        chunks = []
+        async for chunk in self.agent_service.run_llm_stream(prompt, session_id):
+            chunks.append(chunk)
+            yield chunk
+        await self._finish_turn(user_query, "".join(chunks), session_id)
+
     async def get_session_events(self, session_id: str) -> list:
         """Returns session events for the given session ID."""
         session = await self.agent_service.ensure_session(session_id)
@@ -1,8 +1,9 @@
-import json
-from utils.firestore_utils import get_collection
-from tools.gcp_llm import query_gemini
+from tools import db_tools
+from tools.gcp_llm import query_gemini_json, stream_gemini
+from tools.metrics import track_agent
+from tools.prompt_context import render_snapshot
+from tools.response_cache import ResponseCache
 import logging
-import re
 logger = logging.getLogger("CommandAgent")
 
 def clean_firestore_data(obj):
@@ -15,117 +16,253 @@ def clean_firestore_data(obj):
     else:
         return obj
 
-# Utility to extract JSON from Markdown code block
-def extract_json_from_markdown(text):
-    text = re.sub(r'^```json\s*', '', text.strip(), flags=re.IGNORECASE|re.MULTILINE)
-    text = re.sub(r'^```\s*', '', text, flags=re.MULTILINE)
-    text = re.sub(r'```$', '', text, flags=re.MULTILINE)
-    return text.strip()
+# Instructions of each CommandAgent prompt; the context tables are appended after them.
+SUMMARY_INSTRUCTIONS = (
+    "You are an event command AI assistant.\n"
+    "Summarize the current situation based on the following event data.\n"
+    "Focus on critical incidents, crowd risks, medical emergencies, and responder availability.\n"
+    "Respond ONLY with a JSON object: {\"summary\": string}.\n"
+)
+# Same task as SUMMARY_INSTRUCTIONS in plain text, so the answer can be shown while it streams.
+SUMMARY_STREAM_INSTRUCTIONS = (
+    "You are an event command AI assistant.\n"
+    "Summarize the current situation based on the following event data.\n"
+    "Focus on critical incidents, crowd risks, medical emergencies, and responder availability.\n"
+    "Respond ONLY with the summary as plain text, without JSON or Markdown code blocks.\n"
+)
+RESOURCE_INSTRUCTIONS = (
+    "You are an event command AI assistant.\n"
+    "For each zone or incident, assess if the currently available responders are sufficient.\n"
+    "If more responders are needed, specify the number and type (e.g., fire, medical, security) in a resourceRecommendations list.\n"
+    "Respond ONLY with a JSON object: {\"resourceRecommendations\": list of recommendations, each with zoneId or incidentId, needed (bool), and categories (list of {type, count, reason})}.\n"
+)
+# Rules every suggested action follows, shared by the actions and bundle prompts.
+ACTION_RULES = (
+    "If a zone or incident does NOT need any action, do NOT suggest anything for it.\n"
+    "Prioritize actions by urgency and risk (most critical first).\n"
+    "If you suggest a lockdown_zone action, also suggest dispatching available security responders to that zone if not already present.\n"
+    "For dispatch_responder actions, always include responderName and responderType (category) in the parameters, in addition to responderId.\n"
+    "Each action must have:\n"
+    "  - type: one of ['dispatch_responder', 'send_alert', 'lockdown_zone']\n"
+    "  - label: a short button label for the UI\n"
+    "  - parameters: a dict with all required fields for the action type\n"
+    "  - description: a short explanation of the action\n"
+    "For each action type, use these parameter schemas:\n"
+    "  - dispatch_responder: {responderId: string, responderName: string, responderType: string, zoneId: string, notes: string (optional)}\n"
+    "  - send_alert: {target: string, alertType: string, message: string, language: string (optional)}\n"
+    "  - lockdown_zone: {zoneId: string, reason: string}\n"
+)
+ACTIONS_INSTRUCTIONS = (
+    "You are an event command AI assistant.\n"
+    "Analyze ALL zones, incidents, responders, and alerts in the data below.\n"
+    "For every zone or incident that requires attention, suggest a concrete action as a JSON object.\n"
+    + ACTION_RULES +
+    "Return a JSON object with keys:\n"
+    "  actions: prioritized list of actions (one per situation/zone/incident as needed, or empty if no action needed)\n"
+    "Respond ONLY with valid JSON, no extra text.\n"
+    "Example output:\n"
+    "{\n"
+    "  \"actions\": [\n"
+    "    {\n"
+    "      \"type\": \"dispatch_responder\",\n"
+    "      \"label\": \"Dispatch Security: John Smith to Zone C\",\n"
+    "      \"parameters\": {\"responderId\": \"responder_7\", \"responderName\": \"John Smith\", \"responderType\": \"Security\", \"zoneId\": \"zone_c\", \"notes\": \"Lockdown support\"},\n"
+    "      \"description\": \"Send security responder John Smith to enforce lockdown in Zone C.\"\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+)
+# SUMMARY_INSTRUCTIONS, RESOURCE_INSTRUCTIONS and ACTIONS_INSTRUCTIONS answered in one call.
+BUNDLE_INSTRUCTIONS = (
+    "You are an event command AI assistant.\n"
+    "Analyze ALL zones, incidents, responders, and alerts in the data below and answer three tasks.\n"
+    "1. summary: summarize the current situation, focusing on critical incidents, crowd risks, medical emergencies, and responder availability.\n"
+    "2. resourceRecommendations: for each zone or incident, assess if the currently available responders are sufficient. "
+    "Each recommendation has zoneId or incidentId, needed (bool), and categories (list of {type, count, reason}), "
+    "where type is e.g. fire, medical, security.\n"
+    "3. actions: for every zone or incident that requires attention, suggest a concrete action.\n"
+    + ACTION_RULES +
+    "Respond ONLY with valid JSON, no extra text: {\"summary\": string, \"resourceRecommendations\": list, \"actions\": list}.\n"
+)
+
+# response_schema of each JSON prompt, so Gemini answers in the expected shape.
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}},
+    "required": ["summary"],
+}
+RESOURCE_RECOMMENDATIONS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "zoneId": {"type": "string", "nullable": True},
+            "incidentId": {"type": "string", "nullable": True},
+            "needed": {"type": "boolean"},
+            "categories": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string"},
+                        "count": {"type": "integer"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["type", "count", "reason"],
+                },
+            },
+        },
+        "required": ["needed", "categories"],
+    },
+}
+ACTIONS_LIST_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "enum": ["dispatch_responder", "send_alert", "lockdown_zone"]},
+            "label": {"type": "string"},
+            # Union of the parameters of every action type; ACTION_RULES says which ones each type needs.
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "responderId": {"type": "string"},
+                    "responderName": {"type": "string"},
+                    "responderType": {"type": "string"},
+                    "zoneId": {"type": "string"},
+                    "notes": {"type": "string"},
+                    "target": {"type": "string"},
+                    "alertType": {"type": "string"},
+                    "message": {"type": "string"},
+                    "language": {"type": "string"},
+                    "reason": {"type": "string"},
+                },
+            },
+            "description": {"type": "string"},
+        },
+        "required": ["type", "label", "parameters", "description"],
+    },
+}
+RESOURCE_SCHEMA = {
+    "type": "object",
+    "properties": {"resourceRecommendations": RESOURCE_RECOMMENDATIONS_SCHEMA},
+    "required": ["resourceRecommendations"],
+}
+ACTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {"actions": ACTIONS_LIST_SCHEMA},
+    "required": ["actions"],
+}
+BUNDLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "resourceRecommendations": RESOURCE_RECOMMENDATIONS_SCHEMA,
+        "actions": ACTIONS_LIST_SCHEMA,
+    },
+    "required": ["summary", "resourceRecommendations", "actions"],
+}
 
 class CommandAgent:
     def __init__(self):
-        pass
+        self.cache = ResponseCache()
+
+    def _data(self):
+        """Cache version and the snapshot rendered as budgeted context tables, the data every prompt is built from."""
+        # Read the version before the data: a change landing in between tags the entry as older, never newer.
+        version = db_tools.snapshot_version()
+        snapshot = clean_firestore_data(db_tools.fetch_snapshot())
+        # taken_at changes on every read; leaving it out keeps the rendered data usable as a cache key.
+        snapshot.pop("taken_at", None)
+        return version, render_snapshot(snapshot)
+
+    @staticmethod
+    def _prompt(instructions: str, data: str) -> str:
+        return instructions + data + "\n"
+
+    def _query_json(self, label: str, prompt: str, schema):
+        """Gemini's structured answer, or the error response returned to the caller."""
+        logger.info("[AICommand] Prompt to Gemini (%s):\n%s", label, prompt[:1000])
+        result, response = query_gemini_json(prompt, schema, label)
+        logger.info("[AICommand] Gemini response (%s):\n%s", label, response[:1000])
+        if result is None:
+            logger.error("[AICommand] Failed to parse Gemini response (%s)", label)
+            return None, {"success": False, "error": "Failed to parse AI response", "raw": response}
+        return result, None
 
+    def _ask(self, label: str, instructions: str, schema, result_key: str, default):
+        """Prompt Gemini with the instructions and the rendered snapshot, take result_key from
+        the answer constrained to schema. Successful results are cached per (instructions, data in the
+        prompt) until the snapshot's data version changes."""
+        version, data = self._data()
+        key = ResponseCache.key(instructions, data)
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            logger.info("[AICommand] Cache hit (%s)", label)
+            return cached
+        result, error = self._query_json(label, self._prompt(instructions, data), schema)
+        if error:
+            return error
+        answer = {"success": True, result_key: result.get(result_key, default)}
+        self.cache.put(key, version, answer)
+        return answer
+
+    @track_agent("command")
     def get_summary(self):
-        incidents = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("incidents").stream()]
-        zones = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("zones").stream()]
-        responders = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("responders").stream()]
-        alerts = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("alerts").stream()]
-        prompt = (
-            "You are an event command AI assistant.\n"
-            "Summarize the current situation based on the following event data.\n"
-            "Focus on critical incidents, crowd risks, medical emergencies, and responder availability.\n"
-            "Respond ONLY with a JSON object: {\"summary\": string}.\n"
-            f"Incidents: {json.dumps(incidents[:5])}\n"
-            f"Zones: {json.dumps(zones[:5])}\n"
-            f"Responders: {json.dumps(responders[:5])}\n"
-            f"Alerts: {json.dumps(alerts[:5])}\n"
-        )
-        logger.info("[AICommand] Prompt to Gemini (summary):\n%s", prompt[:1000])
-        response = query_gemini(prompt)
-        logger.info("[AICommand] Gemini response (summary):\n%s", response[:1000])
-        try:
-            clean_response = extract_json_from_markdown(response)
-            result = json.loads(clean_response)
-            return {"success": True, "summary": result.get("summary", "")}
-        except Exception as e:
-            logger.error("[AICommand] Failed to parse Gemini response (summary): %s", e)
-            return {"success": False, "error": f"Failed to parse AI response: {e}", "raw": response}
+        return self._ask("summary", SUMMARY_INSTRUCTIONS, SUMMARY_SCHEMA, "summary", "")
+
+    @track_agent("command")
+    def stream_summary(self):
+        """get_summary as plain text chunks, yielded as Gemini produces them.
+        Shares get_summary's cache entries, so a cached summary comes back as a single chunk."""
+        version, data = self._data()
+        key = ResponseCache.key(SUMMARY_INSTRUCTIONS, data)
+        prompt = self._prompt(SUMMARY_STREAM_INSTRUCTIONS, data)
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            logger.info("[AICommand] Cache hit (summary stream)")
+            yield cached["summary"]
+            return
+        logger.info("[AICommand] Streaming prompt to Gemini (summary):\n%s", prompt[:1000])
+        chunks = []
+        for chunk in stream_gemini(prompt):
+            chunks.append(chunk)
+            yield chunk
+        summary = "".join(chunks).strip()
+        logger.info("[AICommand] Gemini streamed response (summary):\n%s", summary[:1000])
+        if summary:
+            self.cache.put(key, version, {"success": True, "summary": summary})
 
+    @track_agent("command")
     def get_resource_recommendations(self):
-        incidents = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("incidents").stream()]
-        zones = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("zones").stream()]
-        responders = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("responders").stream()]
-        alerts = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("alerts").stream()]
-        prompt = (
-            "You are an event command AI assistant.\n"
-            "For each zone or incident, assess if the currently available responders are sufficient.\n"
-            "If more responders are needed, specify the number and type (e.g., fire, medical, security) in a resourceRecommendations list.\n"
-            "Respond ONLY with a JSON object: {\"resourceRecommendations\": list of recommendations, each with zoneId or incidentId, needed (bool), and categories (list of {type, count, reason})}.\n"
-            f"Incidents: {json.dumps(incidents[:5])}\n"
-            f"Zones: {json.dumps(zones[:5])}\n"
-            f"Responders: {json.dumps(responders[:5])}\n"
-            f"Alerts: {json.dumps(alerts[:5])}\n"
-        )
-        logger.info("[AICommand] Prompt to Gemini (resources):\n%s", prompt[:1000])
-        response = query_gemini(prompt)
-        logger.info("[AICommand] Gemini response (resources):\n%s", response[:1000])
-        try:
-            clean_response = extract_json_from_markdown(response)
-            result = json.loads(clean_response)
-            return {"success": True, "resourceRecommendations": result.get("resourceRecommendations", [])}
-        except Exception as e:
-            logger.error("[AICommand] Failed to parse Gemini response (resources): %s", e)
-            return {"success": False, "error": f"Failed to parse AI response: {e}", "raw": response}
+        return self._ask("resources", RESOURCE_INSTRUCTIONS, RESOURCE_SCHEMA, "resourceRecommendations", [])
 
+    @track_agent("command")
     def get_command_actions(self):
-        incidents = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("incidents").stream()]
-        zones = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("zones").stream()]
-        responders = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("responders").stream()]
-        alerts = [clean_firestore_data(doc.to_dict() | {"id": doc.id}) for doc in get_collection("alerts").stream()]
-        prompt = (
-            "You are an event command AI assistant.\n"
-            "Analyze ALL zones, incidents, responders, and alerts in the data below.\n"
-            "For every zone or incident that requires attention, suggest a concrete action as a JSON object.\n"
-            "If a zone or incident does NOT need any action, do NOT suggest anything for it.\n"
-            "Prioritize actions by urgency and risk (most critical first).\n"
-            "If you suggest a lockdown_zone action, also suggest dispatching available security responders to that zone if not already present.\n"
-            "For dispatch_responder actions, always include responderName and responderType (category) in the parameters, in addition to responderId.\n"
-            "Each action must have:\n"
-            "  - type: one of ['dispatch_responder', 'send_alert', 'lockdown_zone']\n"
-            "  - label: a short button label for the UI\n"
-            "  - parameters: a dict with all required fields for the action type\n"
-            "  - description: a short explanation of the action\n"
-            "For each action type, use these parameter schemas:\n"
-            "  - dispatch_responder: {responderId: string, responderName: string, responderType: string, zoneId: string, notes: string (optional)}\n"
-            "  - send_alert: {target: string, alertType: string, message: string, language: string (optional)}\n"
-            "  - lockdown_zone: {zoneId: string, reason: string}\n"
-            "Return a JSON object with keys:\n"
-            "  actions: prioritized list of actions (one per situation/zone/incident as needed, or empty if no action needed)\n"
-            "Respond ONLY with valid JSON, no extra text.\n"
-            "Example output:\n"
-            "{\n"
-            "  \"actions\": [\n"
-            "    {\n"
-            "      \"type\": \"dispatch_responder\",\n"
-            "      \"label\": \"Dispatch Security: John Smith to Zone C\",\n"
-            "      \"parameters\": {\"responderId\": \"responder_7\", \"responderName\": \"John Smith\", \"responderType\": \"Security\", \"zoneId\": \"zone_c\", \"notes\": \"Lockdown support\"},\n"
-            "      \"description\": \"Send security responder John Smith to enforce lockdown in Zone C.\"\n"
-            "    }\n"
-            "  ]\n"
-            "}\n"
-            f"Incidents: {json.dumps(incidents[:5])}\n"
-            f"Zones: {json.dumps(zones[:5])}\n"
-            f"Responders: {json.dumps(responders[:5])}\n"
-            f"Alerts: {json.dumps(alerts[:5])}\n"
-        )
-        logger.info("[AICommand] Prompt to Gemini (actions):\n%s", prompt[:1000])
-        response = query_gemini(prompt)
-        logger.info("[AICommand] Gemini response (actions):\n%s", response[:1000])
-        try:
-            clean_response = extract_json_from_markdown(response)
-            result = json.loads(clean_response)
-            return {"success": True, "actions": result.get("actions", [])}
-        except Exception as e:
-            logger.error("[AICommand] Failed to parse Gemini response (actions): %s", e)
-            return {"success": False, "error": f"Failed to parse AI response: {e}", "raw": response} 
\ No newline at end of file
+        return self._ask("actions", ACTIONS_INSTRUCTIONS, ACTIONS_SCHEMA, "actions", [])
+
+    @track_agent("command")
+    def get_command_bundle(self):
+        """Summary, resource recommendations and actions from one snapshot and at most one Gemini call.
+        Each part is cached under the same entry as its single endpoint, so a refresh with unchanged
+        data is free and any part fetched on its own is reused here."""
+        version, data = self._data()
+        parts = (("summary", SUMMARY_INSTRUCTIONS, ""),
+                 ("resourceRecommendations", RESOURCE_INSTRUCTIONS, []),
+                 ("actions", ACTIONS_INSTRUCTIONS, []))
+        keys = {result_key: ResponseCache.key(instructions, data) for result_key, instructions, _ in parts}
+        cached = {result_key: self.cache.get(key, version) for result_key, key in keys.items()}
+        if all(answer is not None for answer in cached.values()):
+            logger.info("[AICommand] Cache hit (bundle)")
+            bundle = {"success": True}
+            for answer in cached.values():
+                bundle.update(answer)
+            return bundle
+        result, error = self._query_json("bundle", self._prompt(BUNDLE_INSTRUCTIONS, data), BUNDLE_SCHEMA)
+        if error:
+            return error
+        bundle = {"success": True}
+        for result_key, _, default in parts:
+            bundle[result_key] = result.get(result_key, default)
+            self.cache.put(keys[result_key], version, {"success": True, result_key: bundle[result_key]})
+        return bundle
@@ -3,6 +3,8 @@ from memory.firestore_memory import FirestoreMemory
 from tools.gcp_llm import query_gemini
 from tools import db_tools
 from comms.pubsub import PubSubComms
+from tools.metrics import track_agent
+from tools.prompt_context import render_snapshot
 import datetime
 import json
 
@@ -11,10 +13,8 @@ class ResponseDispatcherAgent(BaseAgent):
         memory = FirestoreMemory("dispatcher")
         tools = {
             "llm": query_gemini,
-            "fetch_incidents": db_tools.fetch_incidents,
-            "fetch_zones": db_tools.fetch_zones,
-            "fetch_responders": db_tools.fetch_responders,
-            "fetch_alerts": db_tools.fetch_alerts,
+            "fetch_snapshot": db_tools.fetch_snapshot,
+            "optimize_responder_assignments": db_tools.optimize_responder_assignments,
         }
         comms = PubSubComms("dispatcher")
         super().__init__("dispatcher", memory, tools, comms)
@@ -50,6 +50,7 @@ class ResponseDispatcherAgent(BaseAgent):
         self.memory.save_context(session_id, structured_event)
         return new_context
 
+    @track_agent("dispatcher")
     def handle_event(self, event, session_id="default"):
         event["timestamp"] = datetime.datetime.utcnow().isoformat()
         self.memory.save_event(event)
@@ -60,18 +61,19 @@ class ResponseDispatcherAgent(BaseAgent):
         }
         self.memory.save_context(session_id, event_entry)
         long_term_context = self.memory.get_recent_events(limit=5)
-        context = {
-            "incidents": self.tools["fetch_incidents"](),
-            "zones": self.tools["fetch_zones"](),
-            "responders": self.tools["fetch_responders"](),
-            "alerts": self.tools["fetch_alerts"]()
-        }
+        context = self.tools["fetch_snapshot"]()
         structured_context = self.get_structured_context(session_id)
         structured_context_str = f"\nStructured context: {json.dumps(structured_context)}" if structured_context else ""
+        # Optimisation mode: assignments are decided by the min-cost solver and the LLM only explains them.
+        plan_str = ""
+        if event.get("mode") == "optimize":
+            plan = self.tools["optimize_responder_assignments"](commit=event.get("commit", True))
+            plan_str = f"\nOptimized assignment plan (already decided, explain it to responders):\n{json.dumps(plan)}\n"
         prompt = (
             f"Recent dispatch events (long-term):\n{long_term_context}\n"
-            f"Data snapshot:\n{context}\n"
+            f"Data snapshot:\n{render_snapshot(context)}\n"
             f"{structured_context_str}\n"
+            f"{plan_str}"
             f"Given these high-risk zone alerts and responder status updates, generate dispatch instructions for responders.\nAssistant:"
         )
         dispatch = self.tools["llm"](prompt)
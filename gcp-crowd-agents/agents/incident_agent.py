@@ -1,21 +1,48 @@
 import os
 from google.cloud import firestore
 from comms.pubsub import PubSubComms
-from tools.gcp_llm import query_gemini
-import json
-import re
+from tools.gcp_llm import query_gemini_json
+from tools.entity_cache import entity_cache
+from tools.responder_index import responder_index
+from tools.metrics import track_agent
+
+# response_schema of the actions answer; mirrors the JSON shape spelled out in the prompt.
+INCIDENT_ACTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "actions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["create", "update", "close", "escalate", "assign_responder", "send_alert", "none"]},
+                    "incidentTypes": {"type": "array", "items": {"type": "string"}},
+                    "incidentIds": {"type": "array", "items": {"type": "string"}},
+                    "priority": {"type": "string"},
+                    "responderIds": {"type": "array", "items": {"type": "string"}},
+                    "alertType": {"type": "string", "nullable": True},
+                    "notes": {"type": "string"},
+                    "reason": {"type": "string"},
+                },
+                "required": ["type", "reason"],
+            },
+        },
+    },
+    "required": ["actions"],
+}
 
 class IncidentAgent:
     def __init__(self, topic="media-uploads"):
         self.db = firestore.Client()
         self.comms = PubSubComms(topic)
 
-    def extract_json_from_markdown(self, text):
-        text = re.sub(r'^```json\s*', '', text.strip(), flags=re.IGNORECASE|re.MULTILINE)
-        text = re.sub(r'^```\s*', '', text, flags=re.MULTILINE)
-        text = re.sub(r'```$', '', text, flags=re.MULTILINE)
-        return text.strip()
+    def record_status_update(self, responder_id, status_update):
+        """Append to the status history and overwrite the responder's latest status, as db_tools does."""
+        self.db.collection("responder_status_updates_history").add(status_update)
+        self.db.collection("responder_status_updates").document(responder_id).set(status_update)
+        responder_index.apply_status(responder_id, status_update)
 
+    @track_agent("incident")
     def handle_media_event(self, event):
         print(f"[IncidentAgent] Received media event: {event}")
         zone_id = event.get("zone")
@@ -24,30 +51,13 @@ class IncidentAgent:
             print("[IncidentAgent] No zone in event, skipping.")
             return
 
-        # Fetch zone context
-        zone_doc = self.db.collection("zones").document(zone_id).get()
-        zone = zone_doc.to_dict() if zone_doc.exists else {}
-
-        # Fetch current incidents
-        incidents_query = (
-            self.db.collection("incidents")
-            .where("zoneId", "==", zone_id)
-            .where("status", "==", "active")
-        )
+        # Zone, incident and responder context come from the shared entity cache
+        zone = entity_cache.get("zones", zone_id) or {}
         incidents = [
-            doc.to_dict() | {"id": doc.id}
-            for doc in incidents_query.stream()
-        ]
-
-        # Fetch available responders
-        responders_query = (
-            self.db.collection("responders")
-            .where("status", "==", "available")
-        )
-        responders = [
-            doc.to_dict() | {"id": doc.id}
-            for doc in responders_query.stream()
+            i for i in entity_cache.get_all("incidents")
+            if i.get("zoneId") == zone_id and i.get("status") == "active"
         ]
+        responders = responder_index.list_available()
 
         # Fetch recent alerts (last 10)
         alerts_query = self.db.collection("alerts").order_by("timestamp", direction=firestore.Query.DESCENDING).limit(10)
@@ -87,12 +97,9 @@ Instructions:
 - Always explain the reason for each action.
 '''
         print(f"[IncidentAgent] Prompting Gemini with context...")
-        response_text = query_gemini(prompt)
-        try:
-            clean_response = self.extract_json_from_markdown(response_text)
-            actions = json.loads(clean_response)
-        except Exception as e:
-            print(f"[IncidentAgent] Failed to parse Gemini response as JSON: {e}, raw: {response_text}")
+        actions, response_text = query_gemini_json(prompt, INCIDENT_ACTIONS_SCHEMA, "incident_actions")
+        if actions is None:
+            print(f"[IncidentAgent] Failed to parse Gemini response as JSON, raw: {response_text}")
             actions = {"actions": [], "error": "Failed to parse Gemini response"}
         print(f"[IncidentAgent] Gemini recommended actions: {actions}")
 
@@ -154,7 +161,7 @@ Instructions:
                             "releasedAt": firestore.SERVER_TIMESTAMP
                         })
                         # Log status update
-                        self.db.collection("responder_status_updates").add({
+                        self.record_status_update(responder_id, {
                             "responderId": responder_id,
                             "status": "available",
                             "incidentId": inc_id,
@@ -181,7 +188,7 @@ Instructions:
                         "assignedAt": firestore.SERVER_TIMESTAMP
                     })
                     # Log status update
-                    self.db.collection("responder_status_updates").add({
+                    self.record_status_update(responder_id, {
                         "responderId": responder_id,
                         "status": "assigned",
                         "incidentId": assigned_incident,
@@ -3,6 +3,8 @@ from memory.firestore_memory import FirestoreMemory
 from tools.gcp_llm import query_gemini
 from tools import db_tools
 from comms.pubsub import PubSubComms
+from tools.metrics import track_agent
+from tools.prompt_context import render_snapshot
 import datetime
 import json
 
@@ -11,10 +13,7 @@ class CrowdNotificationAgent(BaseAgent):
         memory = FirestoreMemory("notification")
         tools = {
             "llm": query_gemini,
-            "fetch_incidents": db_tools.fetch_incidents,
-            "fetch_zones": db_tools.fetch_zones,
-            "fetch_responders": db_tools.fetch_responders,
-            "fetch_alerts": db_tools.fetch_alerts,
+            "fetch_snapshot": db_tools.fetch_snapshot,
         }
         comms = PubSubComms("notification")
         super().__init__("notification", memory, tools, comms)
@@ -50,6 +49,7 @@ class CrowdNotificationAgent(BaseAgent):
         self.memory.save_context(session_id, structured_event)
         return new_context
 
+    @track_agent("notification")
     def handle_event(self, event, session_id="default"):
         event["timestamp"] = datetime.datetime.utcnow().isoformat()
         self.memory.save_event(event)
@@ -60,17 +60,12 @@ class CrowdNotificationAgent(BaseAgent):
         }
         self.memory.save_context(session_id, event_entry)
         long_term_context = self.memory.get_recent_events(limit=5)
-        context = {
-            "incidents": self.tools["fetch_incidents"](),
-            "zones": self.tools["fetch_zones"](),
-            "responders": self.tools["fetch_responders"](),
-            "alerts": self.tools["fetch_alerts"]()
-        }
+        context = self.tools["fetch_snapshot"]()
         structured_context = self.get_structured_context(session_id)
         structured_context_str = f"\nStructured context: {json.dumps(structured_context)}" if structured_context else ""
         prompt = (
             f"Recent notification events (long-term):\n{long_term_context}\n"
-            f"Data snapshot:\n{context}\n"
+            f"Data snapshot:\n{render_snapshot(context)}\n"
             f"{structured_context_str}\n"
             f"Given these zone risk scores and attendee locations, generate attendee alerts and notification messages.\nAssistant:"
         )
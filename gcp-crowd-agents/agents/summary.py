@@ -3,6 +3,8 @@ from memory.firestore_memory import FirestoreMemory
 from tools.gcp_llm import query_gemini
 from tools import db_tools
 from comms.pubsub import PubSubComms
+from tools.metrics import track_agent
+from tools.prompt_context import render_snapshot
 import datetime
 import json
 
@@ -11,10 +13,7 @@ class SituationalSummaryAgent(BaseAgent):
         memory = FirestoreMemory("summary")
         tools = {
             "llm": query_gemini,
-            "fetch_incidents": db_tools.fetch_incidents,
-            "fetch_zones": db_tools.fetch_zones,
-            "fetch_responders": db_tools.fetch_responders,
-            "fetch_alerts": db_tools.fetch_alerts,
+            "fetch_snapshot": db_tools.fetch_snapshot,
         }
         comms = PubSubComms("summary")
         super().__init__("summary", memory, tools, comms)
@@ -52,23 +51,19 @@ class SituationalSummaryAgent(BaseAgent):
         self.memory.save_context(session_id, structured_event)
         return new_context
 
+    @track_agent("summary")
     def handle_event(self, event, session_id="default"):
         event["timestamp"] = datetime.datetime.utcnow().isoformat()
         self.memory.save_event(event)
         # Fetch context from long-term memory
         long_term_context = self.memory.get_recent_events(limit=5)
-        context = {
-            "incidents": self.tools["fetch_incidents"](),
-            "zones": self.tools["fetch_zones"](),
-            "responders": self.tools["fetch_responders"](),
-            "alerts": self.tools["fetch_alerts"]()
-        }
+        context = self.tools["fetch_snapshot"]()
         # --- NEW: Get structured context and use in prompt ---
         structured_context = self.get_structured_context(session_id)
         structured_context_str = f"\nStructured context: {json.dumps(structured_context)}" if structured_context else ""
         prompt = (
             f"Recent events (long-term):\n{long_term_context}\n"
-            f"Data snapshot:\n{context}\n"
+            f"Data snapshot:\n{render_snapshot(context)}\n"
             f"{structured_context_str}\n"
             f"Provide a situational summary and recommendations.\nAssistant:"
         )
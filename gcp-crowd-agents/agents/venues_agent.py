@@ -1,8 +1,24 @@
 from google.cloud import firestore, storage
-from tools.gcp_llm import query_gemini
+from tools.gcp_llm import query_gemini_json
 import base64
 import os
-import json
+
+# response_schema of the auto-zoning answer; mirrors the zone fields described in the prompt.
+VENUE_ZONES_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "zoneId": {"type": "string"},
+            "name": {"type": "string"},
+            "area": {"type": "number"},
+            "capacity": {"type": "integer"},
+            "assignedGates": {"type": "array", "items": {"type": "integer"}},
+            "risk": {"type": "string"},
+        },
+        "required": ["zoneId", "name", "area", "capacity", "assignedGates", "risk"],
+    },
+}
 
 class VenuesAgent:
     def __init__(self):
@@ -50,20 +66,8 @@ class VenuesAgent:
                 "\nReturn ONLY the JSON array."
             )
             # NOTE: query_gemini currently only supports text. You may need to adapt this to send image if your backend supports it.
-            gemini_response = query_gemini(prompt)
-            # Strip markdown code fences if present
-            if gemini_response.strip().startswith('```'):
-                gemini_response = gemini_response.strip()
-                if gemini_response.startswith('```json'):
-                    gemini_response = gemini_response[len('```json'):]
-                elif gemini_response.startswith('```'):
-                    gemini_response = gemini_response[len('```'):]
-                if gemini_response.endswith('```'):
-                    gemini_response = gemini_response[:-3]
-                gemini_response = gemini_response.strip()
-            try:
-                finalZones = json.loads(gemini_response)
-            except Exception as e:
+            finalZones, gemini_response = query_gemini_json(prompt, VENUE_ZONES_SCHEMA, "venue_zones")
+            if finalZones is None:
                 raise ValueError(f"Failed to parse Gemini response: {gemini_response}")
 
         # Venue data
@@ -1,26 +1,46 @@
 import os
 import io
 from google.cloud import storage
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, Image as VertexImage
+from vertexai.generative_models import Part, Image as VertexImage
 from comms.pubsub import PubSubComms
 from PIL import Image
 from utils.firestore_utils import get_collection, get_document, update_document
 from utils.gemini_utils import call_gemini
+from tools import llm_gateway
+from tools.llm_scheduler import LLMOverloaded
+from tools.metrics import track_agent
+
+# response_schema of the image analysis; mirrors the JSON shape spelled out in the prompt.
+VISION_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "personCount": {"type": "integer"},
+        "crowdDensity": {"type": "string", "enum": ["low", "moderate", "high"]},
+        "smokeDetected": {"type": "boolean"},
+        "fireDetected": {"type": "boolean"},
+        "stampedeDetected": {"type": "boolean"},
+        "medicalEmergency": {"type": "boolean"},
+        "potentialRisk": {"type": "boolean"},
+        "incidentRecommended": {"type": "boolean"},
+        "incidentType": {"type": "string"},
+        "suggestedAction": {"type": "string"},
+    },
+    "required": [
+        "personCount", "crowdDensity", "smokeDetected", "fireDetected", "stampedeDetected", "medicalEmergency",
+        "potentialRisk", "incidentRecommended", "incidentType", "suggestedAction",
+    ],
+}
 
 class VisionAnalysisAgent:
     def __init__(self, media_topic="media-uploads", incident_topic="incident-events"):
         self.storage_client = storage.Client()
         self.comms = PubSubComms(media_topic)
         self.incident_comms = PubSubComms(incident_topic)
-        project_id = os.getenv("GCP_PROJECT")
-        location = os.getenv("GCP_REGION", "us-central1")
-        if not project_id:
+        if not os.getenv("GCP_PROJECT"):
             raise ValueError("GCP_PROJECT environment variable must be set for Vertex AI initialization.")
-        print(f"[VisionAnalysisAgent] Initializing Vertex AI for project: {project_id}, location: {location}")
-        vertexai.init(project=project_id, location=location)
-        self.model = GenerativeModel("gemini-2.5-pro")
+        self.model = llm_gateway.get_model("gemini-2.5-pro")
 
+    @track_agent("vision")
     def handle_media_event(self, event):
         print(f"[VisionAnalysisAgent] Received media event: {event}")
         file_url = event.get("fileUrl")
@@ -67,11 +87,13 @@ Return ONLY this JSON. For personCount, analyze the image only—do NOT use or c
 }}
 Zone context (for location, risk, and other metadata, but NOT for personCount): {zone_context}
 '''
-            analysis, raw_response = call_gemini(self.model, prompt, vertex_image)
+            analysis, raw_response = call_gemini(self.model, prompt, vertex_image, schema=VISION_ANALYSIS_SCHEMA)
             if not analysis:
                 print(f"[VisionAnalysisAgent] Failed to parse Gemini response as JSON, raw: {raw_response}")
                 analysis = {"personCount": 0, "error": "Failed to parse Gemini response"}
             print(f"[VisionAnalysisAgent] Gemini (Vertex AI) analysis: {analysis}")
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"[VisionAnalysisAgent] Error analyzing image with Gemini (Vertex AI): {e}")
             return {"success": False, "error": str(e)}
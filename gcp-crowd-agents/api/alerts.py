@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from agents.command import CommandAgent
+from utils.sse import sse_response
 
 router = APIRouter()
 command_agent = CommandAgent()
@@ -13,10 +14,22 @@ command_agent = CommandAgent()
 def ai_summary():
     return command_agent.get_summary()
 
+@router.api_route("/ai_summary/stream", methods=["GET", "POST"])
+def ai_summary_stream():
+    return sse_response(command_agent.stream_summary())
+
 @router.post("/ai_resource_recommendations")
 def ai_resource_recommendations():
     return command_agent.get_resource_recommendations()
 
 @router.post("/ai_command_actions")
 def ai_command_actions():
-    return command_agent.get_command_actions() 
\ No newline at end of file
+    return command_agent.get_command_actions() 
+
+@router.post("/ai_command_bundle")
+def ai_command_bundle():
+    return command_agent.get_command_bundle()
+
+@router.get("/ai_cache/stats")
+def ai_cache_stats():
+    return command_agent.cache.stats()
@@ -1,91 +1,215 @@
-from fastapi import APIRouter, Query
-from tools import db_tools
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, Body
+from fastapi.responses import StreamingResponse
+from google.api_core import exceptions as gcp_exceptions
+from pydantic import BaseModel
+from typing import AsyncIterable, List, Optional
+import json
+from tools import async_db_tools, db_tools
+from tools.entity_cache import entity_cache
+from tools.tool_logging import tool_log_sink
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class BulkAssignment(BaseModel):
+    incident_id: Optional[str] = None
+    zone_id: Optional[str] = None
+    responder_id: Optional[str] = None
+    responder_type: Optional[str] = None
+
+class BulkAssignRequest(BaseModel):
+    assignments: List[BulkAssignment]
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=db_tools.MAX_PAGE_SIZE),
+    start_after: Optional[str] = Query(None, description="Document id of the last item of the previous page"),
+    order_by: Optional[str] = Query(None, description="Field to order by, prefix with '-' for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    where: Optional[List[str]] = Query(None, description="Repeatable filter such as status==active or severity>=3"),
+) -> dict:
+    return {
+        "limit": limit,
+        "start_after": start_after,
+        "order_by": order_by,
+        "fields": [f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        "filters": where,
+    }
+
+def is_paged(params: dict) -> bool:
+    return any(value is not None for value in params.values())
+
+async def fetch_page(collection: str, params: dict) -> dict:
+    try:
+        return await async_db_tools.query_page(collection, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (gcp_exceptions.InvalidArgument, gcp_exceptions.FailedPrecondition) as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+async def ndjson_response(collection: str, params: dict) -> StreamingResponse:
+    """Stream a collection as one JSON document per line, straight from the async Firestore stream."""
+    try:
+        docs = async_db_tools.iter_collection(
+            collection, params["order_by"], params["fields"], params["filters"], params["start_after"], params["limit"]
+        )
+        # Pull the first document eagerly so query errors surface as a 400 rather than a truncated stream.
+        first = await anext(docs, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (gcp_exceptions.InvalidArgument, gcp_exceptions.FailedPrecondition) as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    async def lines(first: Optional[dict], rest: AsyncIterable[dict]):
+        if first is None:
+            return
+        yield json.dumps(first, default=_json_default) + "\n"
+        async for doc in rest:
+            yield json.dumps(doc, default=_json_default) + "\n"
+
+    return StreamingResponse(lines(first, docs), media_type=NDJSON_MEDIA_TYPE)
+
 @router.get("/incidents")
-def get_incidents():
-    return db_tools.fetch_incidents()
+async def get_incidents(request: Request, params: dict = Depends(page_params)):
+    if wants_ndjson(request):
+        return await ndjson_response("incidents", params)
+    if is_paged(params):
+        return await fetch_page("incidents", params)
+    return await async_db_tools.fetch_incidents()
 
 @router.get("/incidents/active")
-def get_active_incidents():
-    return db_tools.get_active_incidents()
+async def get_active_incidents():
+    return await async_db_tools.get_active_incidents()
 
 @router.get("/zones")
-def get_zones():
-    return db_tools.fetch_zones()
+async def get_zones(params: dict = Depends(page_params)):
+    if is_paged(params):
+        return await fetch_page("zones", params)
+    # Unpaged callers (the dashboard) read the list from the "zones" key.
+    return {"zones": await async_db_tools.fetch_zones()}
 
 @router.get("/responders")
-def get_responders():
-    return db_tools.fetch_responders()
+async def get_responders(params: dict = Depends(page_params)):
+    if is_paged(params):
+        page = await fetch_page("responders", params)
+        if not params["fields"] or "status" in params["fields"]:
+            await async_db_tools.attach_latest_status(page["items"])
+        return page
+    return await async_db_tools.fetch_responders()
 
 @router.get("/responders/available")
-def get_available_responders():
-    return db_tools.get_available_responders()
+async def get_available_responders(responder_type: Optional[str] = Query(None)):
+    return await async_db_tools.get_available_responders(responder_type)
+
+@router.get("/responders/available/count")
+async def count_available_responders(responder_type: Optional[str] = Query(None), zone_id: Optional[str] = Query(None)):
+    return await async_db_tools.count_available_responders(responder_type, zone_id)
 
 @router.get("/alerts")
-def get_alerts():
-    return db_tools.fetch_alerts()
+async def get_alerts(request: Request, params: dict = Depends(page_params)):
+    if wants_ndjson(request):
+        return await ndjson_response("alerts", params)
+    if is_paged(params):
+        return await fetch_page("alerts", params)
+    return await async_db_tools.fetch_alerts()
 
 @router.get("/responder_assignments")
-def analyze_responder_assignments():
-    return db_tools.analyze_responder_assignments()
+async def analyze_responder_assignments():
+    return await async_db_tools.analyze_responder_assignments()
 
 @router.post("/assign_responder_to_incident")
-def assign_responder_to_incident(incident_id: str = Query(...)):
-    return db_tools.assign_responder_to_incident(incident_id)
+async def assign_responder_to_incident(incident_id: str = Query(...)):
+    return await async_db_tools.assign_responder_to_incident(incident_id)
 
 @router.post("/assign_any_responder_to_incident")
-def assign_any_responder_to_incident(incident_id: str = Query(...)):
-    return db_tools.assign_any_responder_to_incident(incident_id)
+async def assign_any_responder_to_incident(incident_id: str = Query(...)):
+    return await async_db_tools.assign_any_responder_to_incident(incident_id)
 
 @router.post("/assign_responder_to_zone")
-def assign_responder_to_zone(responder_id: str = Query(...), zone_id: str = Query(...)):
-    return db_tools.assign_responder_to_zone(responder_id, zone_id)
+async def assign_responder_to_zone(responder_id: str = Query(...), zone_id: str = Query(...)):
+    return await async_db_tools.assign_responder_to_zone(responder_id, zone_id)
 
 @router.post("/assign_any_responder_to_zone")
-def assign_any_responder_to_zone(zone_id: str = Query(...)):
-    return db_tools.assign_any_responder_to_zone(zone_id)
+async def assign_any_responder_to_zone(zone_id: str = Query(...)):
+    return await async_db_tools.assign_any_responder_to_zone(zone_id)
+
+@router.post("/assign_responders_bulk")
+async def assign_responders_bulk(req: BulkAssignRequest):
+    return await async_db_tools.assign_responders_bulk([a.dict() for a in req.assignments])
+
+@router.post("/optimize_responder_assignments")
+async def optimize_responder_assignments(commit: bool = Query(True)):
+    return await async_db_tools.optimize_responder_assignments(commit)
 
 @router.post("/notify_unavailable")
-def notify_unavailable(zone_id: str = Query(...)):
-    return db_tools.notify_unavailable(zone_id)
+async def notify_unavailable(zone_id: str = Query(...)):
+    return await async_db_tools.notify_unavailable(zone_id)
 
 @router.get("/suggest_zones_needing_responders")
-def suggest_zones_needing_responders():
-    return db_tools.suggest_zones_needing_responders()
+async def suggest_zones_needing_responders():
+    return await async_db_tools.suggest_zones_needing_responders()
 
 @router.get("/incidents/{incident_id}")
-def get_incident_by_id(incident_id: str):
-    return db_tools.get_incident_by_id(incident_id)
+async def get_incident_by_id(incident_id: str):
+    return await async_db_tools.get_incident_by_id(incident_id)
 
 @router.get("/incidents/status/{status}")
-def get_incidents_by_status(status: str):
-    return db_tools.get_incidents_by_status(status)
+async def get_incidents_by_status(status: str):
+    return await async_db_tools.get_incidents_by_status(status)
 
 @router.get("/incidents/zone/{zone_id}")
-def get_incidents_by_zone(zone_id: str):
-    return db_tools.get_incidents_by_zone(zone_id)
+async def get_incidents_by_zone(zone_id: str):
+    return await async_db_tools.get_incidents_by_zone(zone_id)
 
 @router.get("/responders/assigned_to_incident/{incident_id}")
-def get_responders_assigned_to_incident(incident_id: str):
-    return db_tools.get_responders_assigned_to_incident(incident_id)
+async def get_responders_assigned_to_incident(incident_id: str):
+    return await async_db_tools.get_responders_assigned_to_incident(incident_id)
 
 @router.get("/incident_reports")
-def get_all_incident_reports():
-    return db_tools.get_all_incident_reports()
+async def get_all_incident_reports(request: Request, params: dict = Depends(page_params)):
+    if wants_ndjson(request):
+        return await ndjson_response("incident_reports", params)
+    if is_paged(params):
+        return await fetch_page("incident_reports", params)
+    return await async_db_tools.get_all_incident_reports()
+
+@router.post("/incident_reports")
+def record_incident_report(report: dict = Body(...), report_id: Optional[str] = Query(None)):
+    return db_tools.record_incident_report(report, report_id)
 
 @router.get("/incident_reports/{venue_id}")
-def get_incident_reports_by_venue(venue_id: str):
-    return db_tools.get_incident_reports_by_venue(venue_id)
+async def get_incident_reports_by_venue(venue_id: str):
+    return await async_db_tools.get_incident_reports_by_venue(venue_id)
 
 @router.get("/incident_statistics")
 def get_incident_statistics():
-    return db_tools.get_incident_statistics() 
+    return db_tools.get_incident_statistics()
+
+@router.post("/incident_statistics/rebuild")
+def rebuild_incident_statistics():
+    return db_tools.rebuild_incident_statistics() 
 @router.get("/incidents_for_responder/{responder_id}")
-def get_incidents_for_responder(responder_id: str):
-    return db_tools.get_incidents_for_responder(responder_id)
+async def get_incidents_for_responder(responder_id: str):
+    return await async_db_tools.get_incidents_for_responder(responder_id)
 
 @router.get("/incidents_details_for_responder/{responder_id}")
-def get_incidents_details_for_responder(responder_id: str):
-    return db_tools.get_incidents_details_for_responder(responder_id) 
+async def get_incidents_details_for_responder(responder_id: str):
+    return await async_db_tools.get_incidents_details_for_responder(responder_id)
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    return entity_cache.stats()
+
+@router.post("/cache/refresh")
+def refresh_cache(collection: Optional[str] = Query(None)):
+    return entity_cache.refresh(collection)
+
+@router.get("/tool_logs/stats")
+def get_tool_log_stats():
+    return tool_log_sink.stats()
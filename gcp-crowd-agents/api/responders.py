@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from tools import db_tools
+from tools import async_db_tools
 
 router = APIRouter()
 
@@ -12,7 +12,7 @@ class DispatchRequest(BaseModel):
 @router.post("/dispatch_responder")
 async def dispatch_responder(req: DispatchRequest):
     try:
-        result = db_tools.assign_responder_to_incident(req.incidentId, req.responderId)
+        result = await async_db_tools.assign_responder_to_incident(req.incidentId, req.responderId)
         if result.get("status") == "error":
             raise HTTPException(status_code=400, detail=result.get("message", "Assignment failed"))
         return {"success": True, "result": result}
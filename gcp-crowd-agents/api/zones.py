@@ -3,12 +3,7 @@ from utils.firestore_utils import get_collection, get_document
 
 router = APIRouter()
 
-@router.get("/zones")
-def get_zones():
-    print("[API] GET /zones")
-    docs = get_collection("zones").stream()
-    zones = [doc.to_dict() | {"id": doc.id} for doc in docs]
-    return {"zones": zones}
+# GET /zones (full list or a page) is served by api/db_tools_api.py.
 
 @router.get("/zones/{zone_id}")
 def get_zone_by_id(zone_id: str):
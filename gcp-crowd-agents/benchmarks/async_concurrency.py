@@ -0,0 +1,110 @@
+"""Concurrency benchmark for the async db_tools endpoints.
+
+Ramps the number of concurrent clients against one service instance and reports,
+per level, throughput, p50/p95 latency and error rate. The highest level whose p95
+stays under --slo-ms with at most 1% errors is reported as the concurrency the
+instance sustains.
+
+To compare before and after, deploy the old and the new revision with
+--concurrency=250 --max-instances=1 (or run both locally with a single uvicorn
+worker) and pass both URLs:
+
+    python benchmarks/async_concurrency.py \
+        --url https://new---gcp-crowd-agents-xyz.a.run.app \
+        --baseline-url https://old---gcp-crowd-agents-xyz.a.run.app
+
+A JWT for the /api routes is minted from JWT_SECRET unless --token is given.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+import aiohttp
+import jwt
+
+LEVELS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+MAX_ERROR_RATE = 0.01
+
+# (method, path, json body) requests cycled by every client; all read-only.
+REQUESTS = [
+    ("GET", "/api/responders/available/count", None),
+    ("GET", "/api/suggest_zones_needing_responders", None),
+    ("POST", "/mcp/mcp_server", {"jsonrpc": "2.0", "method": "get_active_incidents", "params": {}, "id": 1}),
+]
+
+def mint_token() -> str:
+    payload = {"userid": "benchmark", "accesscode": 1, "exp": datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, os.getenv("JWT_SECRET", "supersecretkey"), algorithm="HS256")
+
+async def client(session, base_url, headers, deadline, latencies, errors):
+    i = 0
+    while time.monotonic() < deadline:
+        method, path, body = REQUESTS[i % len(REQUESTS)]
+        i += 1
+        start = time.monotonic()
+        try:
+            async with session.request(method, base_url + path, json=body, headers=headers) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+                    continue
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.monotonic() - start)
+
+async def run_level(base_url, headers, concurrency, duration):
+    latencies, errors = [], []
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(client(session, base_url, headers, deadline, latencies, errors) for _ in range(concurrency)))
+    total = len(latencies) + len(errors)
+    if len(latencies) >= 2:
+        p95 = statistics.quantiles(latencies, n=20)[18]
+    else:
+        p95 = latencies[0] if latencies else float("nan")
+    return {
+        "concurrency": concurrency,
+        "rps": len(latencies) / duration,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95_ms": p95 * 1000,
+        "error_rate": len(errors) / total if total else 1.0,
+    }
+
+async def ramp(base_url, headers, duration, slo_ms):
+    results = []
+    for concurrency in LEVELS:
+        result = await run_level(base_url, headers, concurrency, duration)
+        result["ok"] = result["p95_ms"] <= slo_ms and result["error_rate"] <= MAX_ERROR_RATE
+        results.append(result)
+        print(f"  {base_url} c={concurrency:>3}  {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+              f"p95 {result['p95_ms']:7.1f} ms  errors {result['error_rate']:.1%}")
+        if not result["ok"]:
+            break
+    sustained = max((r["concurrency"] for r in results if r["ok"]), default=0)
+    return sustained, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Base URL of the instance running the async db_tools")
+    parser.add_argument("--baseline-url", help="Base URL of an instance running the previous, synchronous revision")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="p95 latency budget for a level to count as sustained")
+    parser.add_argument("--token", help="Bearer token for /api routes (default: minted from JWT_SECRET)")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token or mint_token()}"}
+    targets = [("baseline", args.baseline_url), ("async", args.url)] if args.baseline_url else [("async", args.url)]
+    summary = {}
+    for label, url in targets:
+        print(f"[Benchmark] {label}: {url}")
+        summary[label], _ = asyncio.run(ramp(url.rstrip("/"), headers, args.duration, args.slo_ms))
+    for label, sustained in summary.items():
+        print(f"[Benchmark] {label}: sustains {sustained} concurrent requests (p95 <= {args.slo_ms:.0f} ms, errors <= {MAX_ERROR_RATE:.0%})")
+
+if __name__ == "__main__":
+    main()
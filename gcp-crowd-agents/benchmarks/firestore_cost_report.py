@@ -0,0 +1,87 @@
+"""Offline Firestore cost report per endpoint.
+
+Reads one or more scrapes of the /metrics endpoint (URLs or saved files) and ranks
+HTTP routes by Firestore documents read per call, the number Firestore bills on.
+Queries and writes per call are shown alongside, so 1+N query patterns stand out
+from routes that simply read large collections. Scrapes from several instances are
+summed.
+
+    curl -s https://gcp-crowd-agents-xyz.a.run.app/metrics > instance-a.prom
+    python benchmarks/firestore_cost_report.py instance-a.prom instance-b.prom
+    python benchmarks/firestore_cost_report.py https://gcp-crowd-agents-xyz.a.run.app/metrics --by tool
+
+The counters are cumulative since each instance started; scrape before and after a
+load run and pass --baseline to report only the calls in between.
+"""
+import argparse
+import urllib.request
+from collections import defaultdict
+from prometheus_client.parser import text_string_to_metric_families
+
+HISTOGRAMS = {
+    "route": "drishti_http_firestore_documents",
+    "tool": "drishti_tool_firestore_documents",
+    "agent": "drishti_agent_firestore_documents",
+}
+OPS = ("read", "query", "write")
+
+def load(source: str) -> str:
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=30) as response:
+            return response.read().decode("utf-8")
+    with open(source, encoding="utf-8") as f:
+        return f.read()
+
+def usage_totals(text: str, by: str) -> dict:
+    """{(label, op): [sum, count]} from the _sum and _count samples of the chosen histogram."""
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for family in text_string_to_metric_families(text):
+        if family.name != HISTOGRAMS[by]:
+            continue
+        for sample in family.samples:
+            key = (sample.labels.get(by), sample.labels.get("op"))
+            if sample.name.endswith("_sum"):
+                totals[key][0] += sample.value
+            elif sample.name.endswith("_count"):
+                totals[key][1] += sample.value
+    return totals
+
+def report(totals: dict, baseline: dict) -> list:
+    rows = {}
+    for (label, op), (total, calls) in totals.items():
+        base_total, base_calls = baseline.get((label, op), (0.0, 0.0))
+        calls -= base_calls
+        if calls <= 0:
+            continue
+        row = rows.setdefault(label, {"calls": calls})
+        row[op] = (total - base_total) / calls
+    return sorted(rows.items(), key=lambda item: item[1].get("read", 0), reverse=True)
+
+def merged(sources, by: str) -> dict:
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for source in sources:
+        for key, (total, calls) in usage_totals(load(source), by).items():
+            totals[key][0] += total
+            totals[key][1] += calls
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="/metrics URLs or saved scrapes")
+    parser.add_argument("--baseline", nargs="*", default=[], help="Earlier scrapes of the same instances to subtract")
+    parser.add_argument("--by", choices=sorted(HISTOGRAMS), default="route", help="Rank HTTP routes, tools or agents")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print")
+    args = parser.parse_args()
+
+    rows = report(merged(args.sources, args.by), merged(args.baseline, args.by))
+    if not rows:
+        print(f"[FirestoreCost] No {HISTOGRAMS[args.by]} samples found")
+        return
+    width = max(len(label or "") for label, _ in rows[:args.top])
+    print(f"{args.by:<{width}}  {'calls':>8}  {'reads/call':>10}  {'queries/call':>12}  {'writes/call':>11}")
+    for label, row in rows[:args.top]:
+        print(f"{label:<{width}}  {row['calls']:>8.0f}  {row.get('read', 0):>10.1f}  "
+              f"{row.get('query', 0):>12.1f}  {row.get('write', 0):>11.1f}")
+
+if __name__ == "__main__":
+    main()
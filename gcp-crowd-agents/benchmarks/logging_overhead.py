@@ -0,0 +1,125 @@
+"""Per-turn CPU spent in logging by a chat turn, before and after the logging policy.
+
+Replays the log statements of one ChatAgent.handle_query turn (two AgentService.append_event
+calls, run_llm streaming parts, the ChatAgent context dumps and one Pub/Sub message) against
+a growing session, once with the old f-string logging and once through utils.log_policy.
+Records go through a real StreamHandler into os.devnull, so formatting and I/O are counted.
+Only logging is measured; there is no LLM or Firestore work in the loop.
+
+    python -m benchmarks.logging_overhead --turns 200 --level INFO
+
+The old path dumps every session event after each append, so its per-turn cost grows with
+the conversation; the new one stays flat.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from utils.log_policy import PolicyFilter, lazy, lazy_json, lazy_text
+
+REPORT_AT = (1, 10, 50, 100, 200, 500)
+ANSWER = "Zone B is at 92% capacity; two medical responders are assigned to incident INC-4411. " * 8
+
+class FakePart:
+    def __init__(self, text):
+        self.text = text
+        self.thought = None
+        self.function_call = None
+        self.inline_data = None
+
+class FakeEvent:
+    """Stands in for an ADK Event, whose repr spells out every field."""
+
+    def __init__(self, author, text, index):
+        self.author = author
+        self.invocation_id = f"{author}_event"
+        self.id = f"evt-{index:06d}"
+        self.timestamp = 1_760_000_000_000 + index
+        self.parts = [FakePart(text)]
+
+    def __repr__(self):
+        return f"Event({vars(self)!r}, parts={[vars(p) for p in self.parts]!r})"
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.data = json.dumps(payload).encode("utf-8")
+
+def make_logger(name, level, policy):
+    logger = logging.getLogger(f"bench.{name}.{policy}")
+    logger.handlers.clear()
+    logger.filters.clear()
+    logger.propagate = False
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    if policy == "after":
+        logger.addFilter(PolicyFilter())
+    return logger
+
+def legacy_turn(log, events, long_term_context, prompt, message):
+    user_query = "What is the status of zone B?"
+    log.info(f"[ChatAgent] handle_query called with session_id=s1, user_query={user_query.replace(chr(10), ' | ')}")
+    for author, text in (("user", user_query), ("assistant", ANSWER)):
+        log.info(f"[AgentService] Creating event with: {json.dumps({'author': author, 'content': text}, separators=(',', ':'))}, original type: x")
+        events.append(FakeEvent(author, text, len(events)))
+        log.info(f"[AgentService] Session events after append: {[e for e in events]}")
+        if author == "user":
+            log.info(f"[ChatAgent] short_term_context: {prompt.replace(chr(10), ' | ')}")
+            log.info(f"[ChatAgent] long_term_context: {json.dumps(long_term_context, separators=(',', ':'))}")
+            log.info(f"[ChatAgent] prompt: {prompt.replace(chr(10), ' | ')}")
+            log.info(f"[AgentService] Running LLM with prompt: {prompt}")
+            for part in events[-1].parts * 6:
+                log.info(f"Result event: {events[-1]}")
+                log.info(f"Processing Part: {vars(part)}")
+            log.info(f"[AgentService] LLM answer: {ANSWER}")
+    log.info(f"[PubSubComms] Message received: {message.data}")
+    log.info(f"[PubSubComms] Decoded data: {json.loads(message.data.decode('utf-8'))}")
+
+def policy_turn(log, events, long_term_context, prompt, message):
+    user_query = "What is the status of zone B?"
+    log.info("[ChatAgent] handle_query called with session_id=%s, user_query=%s", "s1", lazy_text(user_query))
+    for author, text in (("user", user_query), ("assistant", ANSWER)):
+        log.debug("[AgentService] Creating event with: %s, original type: %s", lazy_json({'author': author, 'content': text}), "x")
+        events.append(FakeEvent(author, text, len(events)))
+        log.debug("[AgentService] Session %s has %d events after append", "s1", len(events))
+        if author == "user":
+            log.debug("[ChatAgent] short_term_context: %s", lazy_text(prompt))
+            log.debug("[ChatAgent] long_term_context: %s", lazy_json(long_term_context))
+            log.debug("[ChatAgent] prompt: %s", lazy_text(prompt))
+            log.info("[AgentService] Running LLM with prompt: %s", lazy_text(prompt))
+            for part in events[-1].parts * 6:
+                log.debug("Result event: %s", events[-1])
+                log.debug("Processing Part: %s", lazy(vars, part))
+            log.info("[AgentService] LLM answer: %s", lazy_text(ANSWER))
+    log.debug("[PubSubComms] Message received: %d bytes", len(message.data))
+    log.debug("[PubSubComms] Decoded data: %s", lazy_json(json.loads(message.data.decode("utf-8"))))
+
+def run(turn, log, turns):
+    events, per_turn = [], {}
+    long_term_context = [{"query": f"question {i}", "answer": ANSWER} for i in range(5)]
+    prompt = "Instructions: use the tools.\n" + "\n".join(f"User: q{i}\nAssistant: {ANSWER}" for i in range(5))
+    message = FakeMessage({"type": "incident", "zone_id": "B", "details": ANSWER})
+    for i in range(1, turns + 1):
+        started = time.process_time()
+        turn(log, events, long_term_context, prompt, message)
+        if i in REPORT_AT or i == turns:
+            per_turn[i] = (time.process_time() - started) * 1000
+    return per_turn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="Conversation length to replay")
+    parser.add_argument("--level", default="INFO", help="Logger level for both runs")
+    args = parser.parse_args()
+
+    level = getattr(logging, args.level.upper())
+    before = run(legacy_turn, make_logger("chat", level, "before"), args.turns)
+    after = run(policy_turn, make_logger("chat", level, "after"), args.turns)
+    print(f"{'turn':>6}  {'before ms':>10}  {'after ms':>10}")
+    for i in sorted(before):
+        print(f"{i:>6}  {before[i]:>10.3f}  {after[i]:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 from google.cloud import pubsub_v1
 from config import GCP_PROJECT, PUBSUB_TOPIC_PREFIX
+from utils.log_policy import get_logger, lazy, lazy_json
 import json
 
+logger = get_logger(__name__)
+
 class PubSubComms:
     def __init__(self, agent_name):
         self.publisher = pubsub_v1.PublisherClient()
@@ -15,17 +18,16 @@ class PubSubComms:
         return future.result()
 
     def subscribe(self, callback):
-        import logging
         def _callback(message):
-            logging.info(f"[PubSubComms] Message received: {message.data}")
+            logger.debug("[PubSubComms] Message received: %d bytes", len(message.data))
             try:
                 data = json.loads(message.data.decode("utf-8"))
-                logging.info(f"[PubSubComms] Decoded data: {data}")
+                logger.debug("[PubSubComms] Decoded data: %s", lazy_json(data))
                 callback(data)
-                logging.info("[PubSubComms] Callback executed successfully.")
+                logger.debug("[PubSubComms] Callback executed successfully.")
             except Exception as e:
-                logging.error(f"[PubSubComms] Error in callback: {e}")
+                logger.error("[PubSubComms] Error in callback: %s, payload: %s", e, lazy(message.data.decode, "utf-8", "replace"))
             message.ack()
-            logging.info("[PubSubComms] Message acked.")
-        logging.info(f"[PubSubComms] Subscribing to {self.subscription_path}")
+            logger.debug("[PubSubComms] Message acked.")
+        logger.info("[PubSubComms] Subscribing to %s", self.subscription_path)
         self.subscriber.subscribe(self.subscription_path, callback=_callback) 
\ No newline at end of file
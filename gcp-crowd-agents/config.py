@@ -8,4 +8,29 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 FIRESTORE_COLLECTION_PREFIX = os.getenv("FIRESTORE_COLLECTION_PREFIX", "crowd_agents_")
 PUBSUB_TOPIC_PREFIX = os.getenv("PUBSUB_TOPIC_PREFIX", "")
 VERTEX_LOCATION = os.getenv("VERTEX_LOCATION", "us-central1")
-VERTEX_MODEL = os.getenv("VERTEX_MODEL", "gemini-2.5-pro") 
\ No newline at end of file
+VERTEX_MODEL = os.getenv("VERTEX_MODEL", "gemini-2.5-pro")
+ENTITY_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL_SECONDS", "1.0"))
+ENTITY_CACHE_LISTEN = os.getenv("ENTITY_CACHE_LISTEN", "true").lower() == "true"
+TOOL_LOG_QUEUE_SIZE = int(os.getenv("TOOL_LOG_QUEUE_SIZE", "10000"))
+TOOL_LOG_BATCH_SIZE = int(os.getenv("TOOL_LOG_BATCH_SIZE", "500"))
+TOOL_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("TOOL_LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+TOOL_LOG_SAMPLE_RATE = float(os.getenv("TOOL_LOG_SAMPLE_RATE", "1.0"))
+TOOL_LOG_MAX_RESULT_CHARS = int(os.getenv("TOOL_LOG_MAX_RESULT_CHARS", "2000"))
+LLM_TRACE_PATH = os.getenv("LLM_TRACE_PATH", "")
+LLM_TRACE_OTLP_ENDPOINT = os.getenv("LLM_TRACE_OTLP_ENDPOINT", "")
+LLM_TRACE_FLUSH_INTERVAL_SECONDS = float(os.getenv("LLM_TRACE_FLUSH_INTERVAL_SECONDS", "1.0"))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "1000"))
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+COMMAND_CACHE_TTL_SECONDS = float(os.getenv("COMMAND_CACHE_TTL_SECONDS", "60"))
+COMMAND_CACHE_MAX_ENTRIES = int(os.getenv("COMMAND_CACHE_MAX_ENTRIES", "128"))
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "100"))
+LLM_QUEUE_TIMEOUTS = os.getenv("LLM_QUEUE_TIMEOUTS", "life_safety=60,interactive=20,background=10")
+LLM_AGENT_PRIORITIES = os.getenv("LLM_AGENT_PRIORITIES", "")
+PROMPT_CONTEXT_BUDGETS = os.getenv("PROMPT_CONTEXT_BUDGETS", "incidents=1200,zones=600,responders=600,alerts=400")
+DISPATCH_WORKLOAD_WINDOW_HOURS = float(os.getenv("DISPATCH_WORKLOAD_WINDOW_HOURS", "8"))
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from utils.mcp_server import router as mcp_router
+from tools.metrics import PrometheusMiddleware, instrument_firestore, metrics_payload
 import logging
 
 
@@ -16,6 +18,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
+instrument_firestore()
 
 
 app.include_router(mcp_router,prefix="/mcp")  # Add MCP router
@@ -25,6 +29,11 @@ app.include_router(mcp_router,prefix="/mcp")  # Add MCP router
 def read_root():
     return {"message": "MCP is alive!"}
 
+@app.get("/metrics")
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     uvicorn.run("main-mcp:app", host="0.0.0.0", port=port, reload=False)
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Body, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from typing import Optional, Callable
 from agents.summary import SituationalSummaryAgent
 from agents.escalation import EmergencyEscalationAgent
@@ -19,8 +19,11 @@ from api.venues import router as venues_router
 from api.predict import router as predict_router
 from api.db_tools_api import router as db_tools_router
 from utils.mcp_server import router as mcp_router
+from tools.metrics import PrometheusMiddleware, instrument_firestore, metrics_payload
+from tools.llm_scheduler import LLMOverloaded, llm_scheduler
 import logging
 from utils.agent_service import AgentService
+from utils.sse import sse_response
 import jwt
 import os
 from datetime import datetime, timedelta
@@ -157,6 +160,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it is outermost and its latency includes auth and CORS handling
+app.add_middleware(PrometheusMiddleware)
+instrument_firestore()
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    return JSONResponse(status_code=429, content={"error": str(exc), "retry_after": exc.retry_after},
+                        headers={"Retry-After": str(exc.retry_after)})
 
 # Initialize agents
 summary_agent = SituationalSummaryAgent()
@@ -220,6 +231,15 @@ def login(payload: dict = Body(...)):
 def read_root():
     return {"message": "GCP Crowd Agents system is running"}
 
+@app.get("/metrics")
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/llm_scheduler/stats")
+def llm_scheduler_stats():
+    return llm_scheduler.stats()
+
 @app.post("/summary")
 def run_summary(event: dict = Body(...)):
     session_id = event.get("session_id", "default")
@@ -253,6 +273,14 @@ async def chat_endpoint(payload: dict = Body(...)):
     answer = await chat_agent.handle_query(user_query, session_id=session_id)
     return {"answer": answer}
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(payload: dict = Body(...)):
+    user_query = payload.get("query")
+    session_id = payload.get("session_id", "default")
+    if not user_query:
+        return {"error": "Missing query"}
+    return sse_response(chat_agent.handle_query_stream(user_query, session_id=session_id))
+
 @app.get("/api/chat/session-events/{session_id}")
 async def get_chat_session_events(session_id: str):
     events_list = await chat_agent.get_session_events(session_id)
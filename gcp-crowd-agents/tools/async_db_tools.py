@@ -0,0 +1,362 @@
+import asyncio
+from google.cloud import firestore
+from fastapi import HTTPException
+from typing import Dict, List, Any, Optional, AsyncIterator
+from tools.tool_logging import log_tool_call
+from tools.entity_cache import entity_cache
+from tools.responder_index import responder_index
+from utils.firestore_utils import get_async_firestore_client
+from tools import db_tools
+from tools.db_tools import (
+    DEFAULT_PAGE_SIZE, FETCH_BY_IDS_BATCH_SIZE, FETCH_BY_IDS_WORKERS, MAX_ASSIGN_ATTEMPTS,
+    MAX_PAGE_SIZE, ResponderUnavailable, _status_update, shape_query
+)
+
+# Async counterparts of the db_tools functions, built on firestore.AsyncClient, for async routes, the MCP
+# endpoint and the ADK agent. Cached collections are refreshed through the AsyncClient when stale, so the
+# in-memory reads that follow never block the event loop. The synchronous db_tools module stays the
+# implementation for the Pub/Sub driven agents.
+_adb = None
+
+def adb():
+    """The module's AsyncClient for GCP_PROJECT, created on first use so importing opens no client."""
+    global _adb
+    if _adb is None:
+        _adb = get_async_firestore_client()
+    return _adb
+
+# Caps concurrent get_all calls per process, like the thread pool in db_tools.
+_get_all_slots = asyncio.Semaphore(FETCH_BY_IDS_WORKERS)
+
+async def _get_docs_by_ids(collection: str, ids: List[str]) -> Dict[str, Dict]:
+    """Dedupe ids, split them into batches and fetch the batches concurrently with get_all.
+    Returns {doc_id: data} for the documents that exist."""
+    unique_ids = list(dict.fromkeys(i for i in ids if i))
+    col = adb().collection(collection)
+    chunks = [unique_ids[i:i + FETCH_BY_IDS_BATCH_SIZE] for i in range(0, len(unique_ids), FETCH_BY_IDS_BATCH_SIZE)]
+
+    async def fetch(chunk: List[str]) -> Dict[str, Dict]:
+        async with _get_all_slots:
+            return {doc.id: doc.to_dict() async for doc in adb().get_all([col.document(i) for i in chunk]) if doc.exists}
+
+    found = {}
+    for result in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+        found.update(result)
+    return found
+
+async def fetch_documents_by_ids(collection: str, ids: List[str]) -> List[Dict]:
+    """Fetch documents by id in one concurrent wave of get_all calls, in first-seen id order; missing ids are skipped."""
+    found = await _get_docs_by_ids(collection, ids)
+    return [{**found[i], "id": i} for i in dict.fromkeys(ids) if i in found]
+
+async def build_query(collection: str, start_after: Optional[str] = None, order_by: Optional[str] = None,
+                      fields: Optional[List[str]] = None, filters: Optional[List[str]] = None, limit: Optional[int] = None):
+    """Async db_tools.build_query: same filters, ordering, projection and id cursor, on the AsyncClient."""
+    query = shape_query(adb().collection(collection), start_after, order_by, fields, filters)
+    if start_after:
+        cursor = await adb().collection(collection).document(start_after).get()
+        if not cursor.exists:
+            raise ValueError(f"Cursor document '{start_after}' not found in {collection}")
+        query = query.start_after(cursor)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+async def query_page(collection: str, limit: Optional[int] = None, start_after: Optional[str] = None, order_by: Optional[str] = None,
+                     fields: Optional[List[str]] = None, filters: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Return one page of a collection plus the cursor for the next page (None on the last page)."""
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    query = await build_query(collection, start_after, order_by, fields, filters, limit)
+    items = [{**doc.to_dict(), "id": doc.id} async for doc in query.stream()]
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+async def iter_collection(collection: str, order_by: Optional[str] = None, fields: Optional[List[str]] = None,
+                          filters: Optional[List[str]] = None, start_after: Optional[str] = None, limit: Optional[int] = None) -> AsyncIterator[Dict]:
+    """Yield documents straight from the async Firestore stream, without materializing the result list."""
+    query = await build_query(collection, start_after, order_by, fields, filters, limit)
+    async for doc in query.stream():
+        yield {**doc.to_dict(), "id": doc.id}
+
+async def _cached(name: str) -> List[Dict]:
+    await entity_cache.ensure_fresh_async(adb(), name)
+    return entity_cache.get_all(name, reload=False)
+
+@log_tool_call("fetch_incidents")
+async def fetch_incidents() -> List[Dict]:
+    """Fetches all incidents from the entity cache."""
+    return await _cached('incidents')
+
+@log_tool_call("get_active_incidents")
+async def get_active_incidents() -> Dict[str, Any]:
+    """Return all incidents whose status is not 'close'."""
+    all_incidents = await fetch_incidents()
+    active = [i for i in all_incidents if i.get('status') != 'close']
+    return {"status": "success", "incidents": active}
+
+@log_tool_call("fetch_zones")
+async def fetch_zones() -> List[Dict]:
+    """Fetches all zones from the entity cache."""
+    return await _cached('zones')
+
+async def fetch_snapshot() -> Dict[str, Any]:
+    """Incidents, zones, responders (with latest status) and alerts as one bundle, with stale collections
+    reloaded concurrently through the AsyncClient."""
+    await entity_cache.ensure_fresh_async(adb(), *db_tools.SNAPSHOT_COLLECTIONS, 'responder_status_updates')
+    return db_tools.snapshot_from_cache(reload=False)
+
+async def attach_latest_status(responders: List[Dict]) -> List[Dict]:
+    """Attach the latest status event to each responder, falling back to the responder doc status or 'available'."""
+    statuses = await _get_docs_by_ids('responder_status_updates', [r['id'] for r in responders])
+    return db_tools.attach_statuses(responders, statuses)
+
+@log_tool_call("fetch_responders")
+async def fetch_responders() -> List[Dict]:
+    """Fetches all responders from Firestore, including their latest status from responder_status_updates if available. If not, use responder doc status or default to 'available'."""
+    return await attach_latest_status(await _cached('responders'))
+
+@log_tool_call("get_available_responders")
+async def get_available_responders(responder_type: Optional[str] = None) -> Dict[str, Any]:
+    """Return only responders whose latest status event is 'available', or if no event, whose responder doc status is 'available' or missing (default to available). Optionally filter by responder type."""
+    await responder_index.ensure_fresh_async(adb())
+    return {"status": "success", "responders": responder_index.list_available(responder_type, reload=False)}
+
+@log_tool_call("count_available_responders")
+async def count_available_responders(responder_type: Optional[str] = None, zone_id: Optional[str] = None) -> Dict[str, Any]:
+    """Count available responders, optionally for one responder type and/or zone, with a per-type breakdown."""
+    await responder_index.ensure_fresh_async(adb())
+    return {
+        "status": "success",
+        "count": responder_index.count(responder_type, zone_id, reload=False),
+        "by_type": responder_index.counts_by_type(reload=False),
+    }
+
+@log_tool_call("fetch_alerts")
+async def fetch_alerts() -> List[Dict]:
+    """Fetches all alerts from the entity cache."""
+    return await _cached('alerts')
+
+@log_tool_call("analyze_responder_assignments")
+async def analyze_responder_assignments() -> Dict[str, Any]:
+    """Analyzes all responders in the system."""
+    responders = await _cached('responders')
+    available = [r['id'] for r in responders if r.get('status') == 'available']
+    assigned = {}
+    for responder in responders:
+        if responder.get('assignedIncident'):
+            assigned[responder.get('assignedIncident')] = responder['id']
+    return {"available": available, "assigned": assigned}
+
+def _write_assignment(writer, responder_id: str, status_update: Dict):
+    """Queue the history event and the latest-status overwrite on an async transaction or WriteBatch."""
+    writer.set(adb().collection('responder_status_updates_history').document(), status_update)
+    writer.set(adb().collection('responder_status_updates').document(responder_id), status_update)
+
+@firestore.async_transactional
+async def _assign_in_transaction(transaction, responder_id: str, target_ref, require_available: bool, incident_id: Optional[str] = None):
+    """Read the target and the responder's latest status, then write the assignment, all in one transaction.
+    Returns the status update, or None if the target document does not exist."""
+    status_ref = adb().collection('responder_status_updates').document(responder_id)
+    snapshots = {doc.reference.path: doc async for doc in adb().get_all([target_ref, status_ref], transaction=transaction)}
+    target = snapshots.get(target_ref.path)
+    if target is None or not target.exists:
+        return None
+    latest = snapshots.get(status_ref.path)
+    if require_available and latest is not None and latest.exists:
+        latest_status = latest.to_dict()
+        if latest_status.get('status', 'available') != 'available':
+            raise ResponderUnavailable(responder_id, latest_status)
+    zone_id = target.to_dict().get("zoneId") if incident_id else target.id
+    status_update = _status_update(responder_id, zone_id, incident_id)
+    _write_assignment(transaction, responder_id, status_update)
+    return status_update
+
+async def _assign_with_retry(target_ref, responder_id: Optional[str], preferred_zone: Optional[str], incident_id: Optional[str] = None):
+    """Run the assignment transaction, re-picking from the availability index if an auto-picked responder was taken.
+    Returns (responder_id, status_update); status_update is None if the target does not exist, responder_id is None if nobody is available."""
+    await responder_index.ensure_fresh_async(adb())
+    skipped = set()
+    for _ in range(MAX_ASSIGN_ATTEMPTS):
+        candidate = responder_id
+        if candidate is None:
+            responder = (responder_index.pick(zone_id=preferred_zone, exclude=skipped, reload=False)
+                         or responder_index.pick(exclude=skipped, reload=False))
+            if not responder:
+                return None, None
+            candidate = responder['id']
+        try:
+            status_update = await _assign_in_transaction(adb().transaction(), candidate, target_ref, responder_id is None, incident_id)
+        except ResponderUnavailable as e:
+            responder_index.apply_status(e.responder_id, e.latest_status)
+            skipped.add(e.responder_id)
+            continue
+        if status_update is not None:
+            responder_index.apply_status(candidate, status_update)
+        return candidate, status_update
+    return None, None
+
+@log_tool_call("assign_responder_to_incident")
+async def assign_responder_to_incident(incident_id: str, responder_id: Optional[str] = None) -> Dict[str, str]:
+    """Assigns a responder to the specified incident by writing an event to responder_status_updates.
+    If responder_id is not provided, picks an available responder, preferring one already in the incident's zone.
+    The incident read, availability check and both writes run in a single Firestore transaction."""
+    await entity_cache.ensure_fresh_async(adb(), 'incidents')
+    incident = entity_cache.get('incidents', incident_id, reload=False) or {}
+    incident_ref = adb().collection('incidents').document(incident_id)
+    responder_id, status_update = await _assign_with_retry(incident_ref, responder_id, incident.get('zoneId'), incident_id)
+    if responder_id is None:
+        return {"status": "error", "message": "No available responder found"}
+    if status_update is None:
+        return {"status": "error", "message": "Incident not found"}
+    return {"status": "assigned", "responder_id": responder_id, "incident_id": incident_id, "zone_id": status_update["zoneId"]}
+
+@log_tool_call("assign_any_responder_to_incident")
+async def assign_any_responder_to_incident(incident_id: str) -> Dict[str, Any]:
+    result = await assign_responder_to_incident(incident_id)
+    if result.get("message") == "No available responder found":
+        return {"status": "error", "error_message": "No responders available"}
+    return result
+
+@log_tool_call("assign_responder_to_zone")
+async def assign_responder_to_zone(responder_id: str, zone_id: str) -> Dict[str, str]:
+    """Assigns a responder to a zone by writing an event to responder_status_updates, in a single transaction."""
+    await entity_cache.ensure_fresh_async(adb(), 'responders')
+    if entity_cache.get('responders', responder_id, reload=False) is None:
+        return {"status": "error", "message": "Responder or zone not found"}
+    zone_ref = adb().collection('zones').document(zone_id)
+    _, status_update = await _assign_with_retry(zone_ref, responder_id, zone_id)
+    if status_update is None:
+        return {"status": "error", "message": "Responder or zone not found"}
+    return {"status": "assigned", "responder_id": responder_id, "zone_id": zone_id}
+
+@log_tool_call("assign_any_responder_to_zone")
+async def assign_any_responder_to_zone(zone_id: str) -> Dict[str, Any]:
+    """Assign any available responder to the given zone by writing an event to responder_status_updates."""
+    zone_ref = adb().collection('zones').document(zone_id)
+    responder_id, status_update = await _assign_with_retry(zone_ref, None, zone_id)
+    if responder_id is None:
+        return {"status": "error", "error_message": "No responders available"}
+    if status_update is None:
+        return {"status": "error", "message": "Responder or zone not found"}
+    return {"status": "assigned", "responder_id": responder_id, "zone_id": zone_id}
+
+@firestore.async_transactional
+async def _commit_bulk_chunk(transaction, chunk: List[tuple]):
+    """Async db_tools._commit_bulk_chunk: re-check the chunk's latest statuses and write the still-available ones."""
+    refs = [adb().collection('responder_status_updates').document(responder_id) for _, responder_id, _ in chunk]
+    latest = {doc.id: doc.to_dict() async for doc in adb().get_all(refs, transaction=transaction) if doc.exists}
+    committed, taken = db_tools.split_still_available(chunk, latest)
+    for _, responder_id, status_update in committed:
+        _write_assignment(transaction, responder_id, status_update)
+    return committed, taken
+
+@log_tool_call("assign_responders_bulk")
+async def assign_responders_bulk(assignments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assign many responders at once. Each assignment has an incident_id or a zone_id, and optionally a
+    responder_id and responder_type; missing responders are picked from the availability index, and no
+    responder is assigned twice in one request. Chunks of up to 250 assignments commit concurrently, each in
+    its own transaction that re-checks availability; the result lists what was actually committed."""
+    incident_ids = list({a['incident_id'] for a in assignments if a.get('incident_id')})
+    incidents, _ = await asyncio.gather(_get_docs_by_ids('incidents', incident_ids), responder_index.ensure_fresh_async(adb()))
+    planned, errors = db_tools.plan_bulk_assignments(assignments, incidents, reload=False)
+    chunks = db_tools.bulk_chunks(planned)
+    outcomes = await asyncio.gather(
+        *(_commit_bulk_chunk(adb().transaction(max_attempts=MAX_ASSIGN_ATTEMPTS), chunk) for chunk in chunks),
+        return_exceptions=True,
+    )
+    committed = []
+    for chunk, outcome in zip(chunks, outcomes):
+        committed.extend(db_tools.chunk_outcome(assignments, chunk, outcome, errors))
+    return db_tools.bulk_assignment_result(committed, errors)
+
+@log_tool_call("optimize_responder_assignments")
+async def optimize_responder_assignments(commit: bool = True) -> Dict[str, Any]:
+    """Match every open, unstaffed incident to an available responder in one globally optimal pass.
+    Minimizes total cost (distance, responder type fit, workload, incident severity) with the Hungarian
+    algorithm instead of picking greedily per incident. With commit=True the plan is written through
+    assign_responders_bulk; otherwise only the plan is returned."""
+    async def workload_events():
+        events = [doc.to_dict() async for doc in db_tools.workload_query(adb()).stream()]
+        return events
+
+    events, *_ = await asyncio.gather(
+        workload_events(),
+        entity_cache.ensure_fresh_async(adb(), 'incidents', 'zones'),
+        responder_index.ensure_fresh_async(adb()),
+    )
+    plan = db_tools.optimization_plan(db_tools.count_workload(events), reload=False)
+    if not commit or not plan["assignments"]:
+        return {"status": "success", "committed": False, **plan}
+    result = await assign_responders_bulk(db_tools.optimized_bulk_request(plan))
+    return {**plan, "status": result["status"], "committed": True, "assigned": result["assigned"], "errors": result["errors"]}
+
+@log_tool_call("notify_unavailable")
+async def notify_unavailable(zone_id: str) -> Dict[str, str]:
+    """Logs an alert in Firestore if no responder is available for a zone (event-driven)."""
+    await adb().collection('responder_status_updates').add({
+        "zoneId": zone_id,
+        "status": "unavailable",
+        "action": "no_responder_available",
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    return {"status": "notified", "zone_id": zone_id, "method": "event_logged"}
+
+@log_tool_call("suggest_zones_needing_responders")
+async def suggest_zones_needing_responders(limit: int = 20) -> Dict[str, Any]:
+    """Rank zones by responder deficit (required minus assigned responders), computed from active incident counts,
+    severity and occupancy/capacity. Returns the ranked zone ids and a compact table of the top `limit` zones."""
+    await asyncio.gather(entity_cache.ensure_fresh_async(adb(), 'zones', 'incidents'), responder_index.ensure_fresh_async(adb()))
+    return db_tools.zone_deficit_report(limit, reload=False)
+
+@log_tool_call("get_incident_by_id")
+async def get_incident_by_id(incident_id: str) -> dict:
+    await entity_cache.ensure_fresh_async(adb(), 'incidents')
+    incident = entity_cache.get('incidents', incident_id, reload=False)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
+
+@log_tool_call("get_incidents_by_status")
+async def get_incidents_by_status(status: str) -> dict:
+    incidents = [i for i in await _cached('incidents') if i.get('status') == status]
+    return {"incidents": incidents}
+
+@log_tool_call("get_incidents_by_zone")
+async def get_incidents_by_zone(zone_id: str) -> dict:
+    incidents = [i for i in await _cached('incidents') if i.get('zoneId') == zone_id]
+    return {"incidents": incidents}
+
+async def _status_event_values(field: str, **equals) -> List[str]:
+    """Values of `field` across responder_status_updates documents matching all field == value pairs."""
+    query = adb().collection('responder_status_updates')
+    for key, value in equals.items():
+        query = query.where(key, '==', value)
+    events = [doc.to_dict() async for doc in query.stream()]
+    return [event.get(field) for event in events if event.get(field)]
+
+@log_tool_call("get_responders_assigned_to_incident")
+async def get_responders_assigned_to_incident(incident_id: str) -> List[Dict]:
+    """Fetch all responders assigned to a given incident using responder_status_updates."""
+    responder_ids = await _status_event_values('responderId', incidentId=incident_id, status='assigned')
+    return await fetch_documents_by_ids('responders', responder_ids)
+
+async def get_all_incident_reports() -> dict:
+    incidents = [dict(id=doc.id, **doc.to_dict()) async for doc in adb().collection('incident_reports').stream()]
+    return {"incidents": incidents}
+
+async def get_incident_reports_by_venue(venue_id: str) -> dict:
+    query = adb().collection('incident_reports').where('venue_id', '==', venue_id)
+    incidents = [dict(id=doc.id, **doc.to_dict()) async for doc in query.stream()]
+    return {"incidents": incidents}
+
+@log_tool_call("get_incidents_for_responder")
+async def get_incidents_for_responder(responder_id: str) -> list:
+    """Fetch all incidents for a given responder based on responder_status_updates."""
+    incident_ids = await _status_event_values('incidentId', responderId=responder_id)
+    return await fetch_documents_by_ids('incidents', incident_ids)
+
+@log_tool_call("get_incidents_details_for_responder")
+async def get_incidents_details_for_responder(responder_id: str) -> list:
+    """Fetch full incident details for a given responder from incidents collection."""
+    incident_ids = await _status_event_values('incidentId', responderId=responder_id)
+    return await fetch_documents_by_ids('incidents', incident_ids)
@@ -1,14 +1,143 @@
 from google.cloud import firestore
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+import logging
+from config import DISPATCH_WORKLOAD_WINDOW_HOURS
 from tools.tool_logging import log_tool_call
+from tools.entity_cache import entity_cache
+from tools.responder_index import responder_index
+from tools import dispatch_optimizer, incident_rollups, metrics, zone_staffing
 
-db = firestore.Client()
+logger = logging.getLogger(__name__)
+
+db = metrics.counted_client(firestore.Client())
+
+# Ids per get_all call, and how many get_all calls may be in flight at once.
+FETCH_BY_IDS_BATCH_SIZE = 100
+FETCH_BY_IDS_WORKERS = 8
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_BY_IDS_WORKERS, thread_name_prefix="db-tools-get-all")
+
+def _get_docs_by_ids(collection: str, ids: List[str]) -> Dict[str, Dict]:
+    """Dedupe ids, split them into batches and fetch the batches concurrently with get_all.
+    Returns {doc_id: data} for the documents that exist."""
+    unique_ids = list(dict.fromkeys(i for i in ids if i))
+    col = db.collection(collection)
+    chunks = [unique_ids[i:i + FETCH_BY_IDS_BATCH_SIZE] for i in range(0, len(unique_ids), FETCH_BY_IDS_BATCH_SIZE)]
+
+    def fetch(chunk: List[str]) -> Dict[str, Dict]:
+        return {doc.id: doc.to_dict() for doc in db.get_all([col.document(i) for i in chunk]) if doc.exists}
+
+    found = {}
+    for result in _fetch_pool.map(metrics.carry_usage(fetch), chunks):
+        found.update(result)
+    return found
+
+def fetch_documents_by_ids(collection: str, ids: List[str]) -> List[Dict]:
+    """Fetch documents by id in one concurrent wave of get_all calls, in first-seen id order; missing ids are skipped."""
+    found = _get_docs_by_ids(collection, ids)
+    return [{**found[i], "id": i} for i in dict.fromkeys(ids) if i in found]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Two-character operators first so '>=' is not read as '>'.
+FILTER_OPERATORS = ("==", "!=", ">=", "<=", ">", "<")
+
+def _coerce_filter_value(raw: str) -> Any:
+    if raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    if raw.lower() == "null":
+        return None
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        return raw[1:-1]
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
+
+def parse_filter(expr: str) -> Tuple[str, str, Any]:
+    """Parse 'field<op>value' (e.g. 'status==active', 'severity>=3') into a Firestore where() triple."""
+    for op in FILTER_OPERATORS:
+        field, sep, raw = expr.partition(op)
+        if sep and field.strip():
+            return field.strip(), op, _coerce_filter_value(raw.strip())
+    raise ValueError(f"Invalid filter '{expr}', expected field<op>value with op in {', '.join(FILTER_OPERATORS)}")
+
+def shape_query(query, start_after: Optional[str] = None, order_by: Optional[str] = None,
+                fields: Optional[List[str]] = None, filters: Optional[List[str]] = None):
+    """Apply filters, ordering and projection to a sync or async Firestore query; cursor and limit are left to the caller."""
+    for expr in filters or []:
+        query = query.where(*parse_filter(expr))
+    if order_by:
+        descending = order_by.startswith('-')
+        query = query.order_by(order_by.lstrip('-'), direction=firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING)
+    elif start_after:
+        query = query.order_by(firestore.FieldPath.document_id())
+    if fields:
+        query = query.select(fields)
+    return query
+
+def build_query(collection: str, start_after: Optional[str] = None, order_by: Optional[str] = None,
+                fields: Optional[List[str]] = None, filters: Optional[List[str]] = None, limit: Optional[int] = None):
+    """Build a Firestore query with filters, ordering, projection and an id cursor pushed down to the server.
+    order_by takes a field name, prefixed with '-' for descending; without it, cursors page by document id."""
+    query = shape_query(db.collection(collection), start_after, order_by, fields, filters)
+    if start_after:
+        cursor = db.collection(collection).document(start_after).get()
+        if not cursor.exists:
+            raise ValueError(f"Cursor document '{start_after}' not found in {collection}")
+        query = query.start_after(cursor)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+def query_page(collection: str, limit: Optional[int] = None, start_after: Optional[str] = None, order_by: Optional[str] = None,
+               fields: Optional[List[str]] = None, filters: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Return one page of a collection plus the cursor for the next page (None on the last page)."""
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    query = build_query(collection, start_after, order_by, fields, filters, limit)
+    items = [{**doc.to_dict(), "id": doc.id} for doc in query.stream()]
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+def iter_collection(collection: str, order_by: Optional[str] = None, fields: Optional[List[str]] = None,
+                    filters: Optional[List[str]] = None, start_after: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Yield documents straight from the Firestore stream iterator, without materializing the result list."""
+    query = build_query(collection, start_after, order_by, fields, filters, limit)
+    for doc in query.stream():
+        yield {**doc.to_dict(), "id": doc.id}
+
+# Collections bundled by fetch_snapshot; responder_status_updates is read to attach each responder's latest status.
+SNAPSHOT_COLLECTIONS = ('incidents', 'zones', 'responders', 'alerts')
+_SNAPSHOT_SOURCES = SNAPSHOT_COLLECTIONS + ('responder_status_updates',)
+_snapshot_pool = ThreadPoolExecutor(max_workers=len(_SNAPSHOT_SOURCES), thread_name_prefix="db-tools-snapshot")
+
+def snapshot_from_cache(reload: bool = True) -> Dict[str, Any]:
+    """Copy the cached collections back to back into one bundle; callers make sure they are fresh first."""
+    snapshot = {name: entity_cache.get_all(name, reload) for name in SNAPSHOT_COLLECTIONS}
+    statuses = entity_cache.collection('responder_status_updates')
+    attach_statuses(snapshot['responders'], {r['id']: statuses.get(r['id'], reload) for r in snapshot['responders']})
+    snapshot['taken_at'] = datetime.utcnow().isoformat()
+    return snapshot
+
+def snapshot_version() -> Tuple[int, ...]:
+    """Entity cache versions of the collections behind fetch_snapshot; any change to their data moves it."""
+    return tuple(entity_cache.collection(name).version for name in _SNAPSHOT_SOURCES)
+
+def fetch_snapshot() -> Dict[str, Any]:
+    """Incidents, zones, responders (with latest status) and alerts as one bundle.
+    Stale collections are reloaded concurrently, so the cost is the slowest read rather than the sum of them."""
+    refresh = metrics.carry_usage(lambda name: entity_cache.collection(name).ensure_fresh())
+    list(_snapshot_pool.map(refresh, _SNAPSHOT_SOURCES))
+    return snapshot_from_cache()
 
 @log_tool_call("fetch_incidents")
 def fetch_incidents() -> List[Dict]:
-    """Fetches all incidents from Firestore."""
-    return [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('incidents').stream()]
+    """Fetches all incidents from the entity cache."""
+    return entity_cache.get_all('incidents')
 
 @log_tool_call("get_active_incidents")
 def get_active_incidents() -> Dict[str, Any]:
@@ -19,19 +148,16 @@ def get_active_incidents() -> Dict[str, Any]:
 
 @log_tool_call("fetch_zones")
 def fetch_zones() -> List[Dict]:
-    """Fetches all zones from Firestore."""
-    return [{**doc.to_dict(), "id": doc.id} for doc in db.collection('zones').stream()]
+    """Fetches all zones from the entity cache."""
+    return entity_cache.get_all('zones')
 
-@log_tool_call("fetch_responders")
-def fetch_responders() -> List[Dict]:
-    """Fetches all responders from Firestore, including their latest status from responder_status_updates if available. If not, use responder doc status or default to 'available'."""
-    responders = [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('responders').stream()]
+def _fetch_latest_statuses(responder_ids: List[str]) -> Dict[str, Dict]:
+    """Batch-read responder_status_updates/{responder_id} for all ids."""
+    return _get_docs_by_ids('responder_status_updates', responder_ids)
+
+def attach_statuses(responders: List[Dict], statuses: Dict[str, Dict]) -> List[Dict]:
     for responder in responders:
-        responder_id = responder['id']
-        events = list(db.collection('responder_status_updates')
-            .where('responderId', '==', responder_id)
-            .stream())
-        latest_event = events[0].to_dict() if events else None
+        latest_event = statuses.get(responder['id'])
         if latest_event and latest_event.get('status'):
             responder['status'] = latest_event['status']
         else:
@@ -39,117 +165,308 @@ def fetch_responders() -> List[Dict]:
         responder['last_status_event'] = latest_event or {}
     return responders
 
+def attach_latest_status(responders: List[Dict]) -> List[Dict]:
+    """Attach the latest status event to each responder, falling back to the responder doc status or 'available'."""
+    return attach_statuses(responders, _fetch_latest_statuses([r['id'] for r in responders]))
+
+@log_tool_call("fetch_responders")
+def fetch_responders() -> List[Dict]:
+    """Fetches all responders from Firestore, including their latest status from responder_status_updates if available. If not, use responder doc status or default to 'available'."""
+    responders = entity_cache.get_all('responders')
+    return attach_latest_status(responders)
+
 @log_tool_call("get_available_responders")
-def get_available_responders() -> Dict[str, Any]:
-    """Return only responders whose latest status event is 'available', or if no event, whose responder doc status is 'available' or missing (default to available)."""
-    responders = [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('responders').stream()]
-    available = []
-    for responder in responders:
-        responder_id = responder.get('id')
-        all_events = list(db.collection('responder_status_updates')
-            .where('responderId', '==', responder_id)
-            .stream())
-        latest_event = all_events[0].to_dict() if all_events else None
-        if latest_event and latest_event.get('status') == 'available':
-            available.append(responder)
-        elif not latest_event:
-            # No status event: use responder doc status or default to available
-            if responder.get('status', 'available') == 'available':
-                responder['status'] = 'available'
-                available.append(responder)
-    return {"status": "success", "responders": available}
+def get_available_responders(responder_type: Optional[str] = None) -> Dict[str, Any]:
+    """Return only responders whose latest status event is 'available', or if no event, whose responder doc status is 'available' or missing (default to available). Optionally filter by responder type."""
+    return {"status": "success", "responders": responder_index.list_available(responder_type)}
+
+@log_tool_call("count_available_responders")
+def count_available_responders(responder_type: Optional[str] = None, zone_id: Optional[str] = None) -> Dict[str, Any]:
+    """Count available responders, optionally for one responder type and/or zone, with a per-type breakdown."""
+    return {
+        "status": "success",
+        "count": responder_index.count(responder_type, zone_id),
+        "by_type": responder_index.counts_by_type(),
+    }
 
 @log_tool_call("fetch_alerts")
 def fetch_alerts() -> List[Dict]:
-    """Fetches all alerts from Firestore."""
-    return [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('alerts').stream()]
+    """Fetches all alerts from the entity cache."""
+    return entity_cache.get_all('alerts')
 
 @log_tool_call("analyze_responder_assignments")
 def analyze_responder_assignments() -> Dict[str, Any]:
     """Analyzes all responders in the system."""
-    responders_ref = db.collection('responders')
-    available_query = responders_ref.where('status', '==', 'available')
-    available_docs = available_query.stream()
-    available = [doc.id for doc in available_docs]
-    responders = responders_ref.stream()
+    responders = entity_cache.get_all('responders')
+    available = [r['id'] for r in responders if r.get('status') == 'available']
     assigned = {}
-    for doc in responders:
-        data = doc.to_dict()
-        if data.get('assignedIncident'):
-            assigned[data.get('assignedIncident')] = doc.id
+    for responder in responders:
+        if responder.get('assignedIncident'):
+            assigned[responder.get('assignedIncident')] = responder['id']
     return {"available": available, "assigned": assigned}
 
-@log_tool_call("assign_responder_to_incident")
-def assign_responder_to_incident(incident_id: str, responder_id: Optional[str] = None) -> Dict[str, str]:
-    """Assigns a responder to the specified incident by writing an event to responder_status_updates.
-    If responder_id is not provided, picks the first available responder."""
-    if responder_id is None:
-        available = get_available_responders().get('responders', [])
-        if not available:
-            return {"status": "error", "message": "No available responder found"}
-        responder_id = available[0]['id']
-    # Get incident info for zoneId
-    incident_ref = db.collection('incidents').document(incident_id)
-    incident_doc = incident_ref.get()
-    if not incident_doc.exists:
-        return {"status": "error", "message": "Incident not found"}
-    incident = incident_doc.to_dict()
-    zone_id = incident.get("zoneId")
+# Auto-picked responders that turn out to be taken are skipped; give up after this many.
+MAX_ASSIGN_ATTEMPTS = 5
+# A WriteBatch holds at most 500 writes and each assignment writes two documents.
+BULK_ASSIGN_CHUNK_SIZE = 250
+
+class ResponderUnavailable(Exception):
+    """Raised inside an assignment transaction when the responder was taken concurrently."""
+    def __init__(self, responder_id: str, latest_status: Dict):
+        super().__init__(f"Responder {responder_id} is no longer available")
+        self.responder_id = responder_id
+        self.latest_status = latest_status
+
+def _status_update(responder_id: str, zone_id: Optional[str], incident_id: Optional[str] = None) -> Dict[str, Any]:
     status_update = {
         "responderId": responder_id,
-        "incidentId": incident_id,
         "zoneId": zone_id,
         "status": "assigned",
-        "action": "assigned_to_incident",
+        "action": "assigned_to_incident" if incident_id else "assigned_to_zone",
         "timestamp": firestore.SERVER_TIMESTAMP
     }
-    # Write to event log (history)
-    db.collection('responder_status_updates_history').add(status_update)
-    # Write to latest status (deduplication)
-    db.collection('responder_status_updates').document(responder_id).set(status_update)
-    return {"status": "assigned", "responder_id": responder_id, "incident_id": incident_id, "zone_id": zone_id}
+    if incident_id:
+        status_update["incidentId"] = incident_id
+    return status_update
+
+def _write_assignment(writer, responder_id: str, status_update: Dict):
+    """Queue the history event and the latest-status overwrite on a transaction or WriteBatch."""
+    writer.set(db.collection('responder_status_updates_history').document(), status_update)
+    writer.set(db.collection('responder_status_updates').document(responder_id), status_update)
+
+@firestore.transactional
+def _assign_in_transaction(transaction, responder_id: str, target_ref, require_available: bool, incident_id: Optional[str] = None):
+    """Read the target and the responder's latest status, then write the assignment, all in one transaction.
+    Returns the status update, or None if the target document does not exist."""
+    status_ref = db.collection('responder_status_updates').document(responder_id)
+    snapshots = {doc.reference.path: doc for doc in db.get_all([target_ref, status_ref], transaction=transaction)}
+    target = snapshots.get(target_ref.path)
+    if target is None or not target.exists:
+        return None
+    latest = snapshots.get(status_ref.path)
+    if require_available and latest is not None and latest.exists:
+        latest_status = latest.to_dict()
+        if latest_status.get('status', 'available') != 'available':
+            raise ResponderUnavailable(responder_id, latest_status)
+    zone_id = target.to_dict().get("zoneId") if incident_id else target.id
+    status_update = _status_update(responder_id, zone_id, incident_id)
+    _write_assignment(transaction, responder_id, status_update)
+    return status_update
+
+def _assign_with_retry(target_ref, responder_id: Optional[str], preferred_zone: Optional[str], incident_id: Optional[str] = None):
+    """Run the assignment transaction, re-picking from the availability index if an auto-picked responder was taken.
+    Returns (responder_id, status_update); status_update is None if the target does not exist, responder_id is None if nobody is available."""
+    skipped = set()
+    for _ in range(MAX_ASSIGN_ATTEMPTS):
+        candidate = responder_id
+        if candidate is None:
+            responder = responder_index.pick(zone_id=preferred_zone, exclude=skipped) or responder_index.pick(exclude=skipped)
+            if not responder:
+                return None, None
+            candidate = responder['id']
+        try:
+            status_update = _assign_in_transaction(db.transaction(), candidate, target_ref, responder_id is None, incident_id)
+        except ResponderUnavailable as e:
+            responder_index.apply_status(e.responder_id, e.latest_status)
+            skipped.add(e.responder_id)
+            continue
+        if status_update is not None:
+            responder_index.apply_status(candidate, status_update)
+        return candidate, status_update
+    return None, None
+
+@log_tool_call("assign_responder_to_incident")
+def assign_responder_to_incident(incident_id: str, responder_id: Optional[str] = None) -> Dict[str, str]:
+    """Assigns a responder to the specified incident by writing an event to responder_status_updates.
+    If responder_id is not provided, picks an available responder, preferring one already in the incident's zone.
+    The incident read, availability check and both writes run in a single Firestore transaction."""
+    incident = entity_cache.get('incidents', incident_id) or {}
+    incident_ref = db.collection('incidents').document(incident_id)
+    responder_id, status_update = _assign_with_retry(incident_ref, responder_id, incident.get('zoneId'), incident_id)
+    if responder_id is None:
+        return {"status": "error", "message": "No available responder found"}
+    if status_update is None:
+        return {"status": "error", "message": "Incident not found"}
+    return {"status": "assigned", "responder_id": responder_id, "incident_id": incident_id, "zone_id": status_update["zoneId"]}
 
 @log_tool_call("assign_any_responder_to_incident")
 def assign_any_responder_to_incident(incident_id: str) -> Dict[str, Any]:
-    available = get_available_responders().get('responders', [])
-    if not available:
+    result = assign_responder_to_incident(incident_id)
+    if result.get("message") == "No available responder found":
         return {"status": "error", "error_message": "No responders available"}
-    responder_id = available[0]['id']
-    return assign_responder_to_incident(incident_id, responder_id)
+    return result
 
 @log_tool_call("assign_responder_to_zone")
 def assign_responder_to_zone(responder_id: str, zone_id: str) -> Dict[str, str]:
-    """Assigns a responder to a zone by writing an event to responder_status_updates."""
-    responders_ref = db.collection('responders')
-    zones_ref = db.collection('zones')
-    responder_doc = responders_ref.document(responder_id)
-    zone_doc = zones_ref.document(zone_id)
-    responder = responder_doc.get()
-    zone = zone_doc.get()
-    if not responder.exists or not zone.exists:
+    """Assigns a responder to a zone by writing an event to responder_status_updates, in a single transaction."""
+    if entity_cache.get('responders', responder_id) is None:
+        return {"status": "error", "message": "Responder or zone not found"}
+    zone_ref = db.collection('zones').document(zone_id)
+    _, status_update = _assign_with_retry(zone_ref, responder_id, zone_id)
+    if status_update is None:
         return {"status": "error", "message": "Responder or zone not found"}
-    responder_data = responder.to_dict()
-    # if responder_data.get("status") != "available":
-    #     return {"status": "error", "message": f"Responder {responder_id} is not available (current status: {responder_data.get('status')})"}
-    status_update = {
-        "responderId": responder_id,
-        "zoneId": zone_id,
-        "status": "assigned",
-        "action": "assigned_to_zone",
-        "timestamp": firestore.SERVER_TIMESTAMP
-    }
-    db.collection('responder_status_updates_history').add(status_update)
-    db.collection('responder_status_updates').document(responder_id).set(status_update)
     return {"status": "assigned", "responder_id": responder_id, "zone_id": zone_id}
 
 @log_tool_call("assign_any_responder_to_zone")
 def assign_any_responder_to_zone(zone_id: str) -> Dict[str, Any]:
     """Assign any available responder to the given zone by writing an event to responder_status_updates."""
-    available = get_available_responders().get('responders', [])
-    if not available:
+    zone_ref = db.collection('zones').document(zone_id)
+    responder_id, status_update = _assign_with_retry(zone_ref, None, zone_id)
+    if responder_id is None:
         return {"status": "error", "error_message": "No responders available"}
-    responder_id = available[0]["id"]
-    return assign_responder_to_zone(responder_id, zone_id)
+    if status_update is None:
+        return {"status": "error", "message": "Responder or zone not found"}
+    return {"status": "assigned", "responder_id": responder_id, "zone_id": zone_id}
+
+def plan_bulk_assignments(assignments: List[Dict[str, Any]], incidents: Dict[str, Dict], reload: bool = True) -> Tuple[List[tuple], List[Dict]]:
+    """Resolve each bulk assignment to (index, responder_id, status_update), picking missing responders from the
+    availability index. A responder is planned at most once per request: explicit ids must be available and
+    are rejected when repeated or already picked, and auto-picks skip everyone planned so far. Returns (planned, errors)."""
+    picked = set()
+    planned, errors = [], []
+    for index, assignment in enumerate(assignments):
+        incident_id = assignment.get('incident_id')
+        if incident_id:
+            if incident_id not in incidents:
+                errors.append({"index": index, "message": "Incident not found", **assignment})
+                continue
+            zone_id = incidents[incident_id].get('zoneId')
+        else:
+            zone_id = assignment.get('zone_id')
+            if not zone_id:
+                errors.append({"index": index, "message": "incident_id or zone_id is required", **assignment})
+                continue
+        responder_id = assignment.get('responder_id')
+        if responder_id is None:
+            responder_type = assignment.get('responder_type')
+            responder = (responder_index.pick(responder_type, zone_id, exclude=picked, reload=reload)
+                         or responder_index.pick(responder_type, exclude=picked, reload=reload))
+            if not responder:
+                errors.append({"index": index, "message": "No available responder found", **assignment})
+                continue
+            responder_id = responder['id']
+        elif responder_id in picked:
+            errors.append({"index": index, "message": "Responder is already assigned earlier in this request", **assignment})
+            continue
+        elif not responder_index.is_available(responder_id, reload):
+            errors.append({"index": index, "message": "Responder not found or not available", **assignment})
+            continue
+        picked.add(responder_id)
+        planned.append((index, responder_id, _status_update(responder_id, zone_id, incident_id)))
+    return planned, errors
+
+def bulk_chunks(planned: List[tuple]) -> List[List[tuple]]:
+    """Split planned assignments into chunks that fit one transaction (two writes each, 500 writes at most)."""
+    return [planned[start:start + BULK_ASSIGN_CHUNK_SIZE] for start in range(0, len(planned), BULK_ASSIGN_CHUNK_SIZE)]
+
+def split_still_available(chunk: List[tuple], latest: Dict[str, Dict]) -> Tuple[List[tuple], List[tuple]]:
+    """Split a chunk by the latest statuses read in its transaction into (still available, taken meanwhile)."""
+    available, taken = [], []
+    for item in chunk:
+        status = latest.get(item[1])
+        if status is not None and status.get('status', 'available') != 'available':
+            taken.append((item, status))
+        else:
+            available.append(item)
+    return available, taken
+
+@firestore.transactional
+def _commit_bulk_chunk(transaction, chunk: List[tuple]) -> Tuple[List[tuple], List[tuple]]:
+    """Re-read the chunk's latest statuses in a transaction and write only the assignments whose responder is
+    still available, so a concurrent single assignment cannot take the same responder. Returns (committed, taken)."""
+    refs = [db.collection('responder_status_updates').document(responder_id) for _, responder_id, _ in chunk]
+    latest = {doc.id: doc.to_dict() for doc in db.get_all(refs, transaction=transaction) if doc.exists}
+    committed, taken = split_still_available(chunk, latest)
+    for _, responder_id, status_update in committed:
+        _write_assignment(transaction, responder_id, status_update)
+    return committed, taken
+
+def chunk_outcome(assignments: List[Dict[str, Any]], chunk: List[tuple], outcome, errors: List[Dict]) -> List[tuple]:
+    """Fold one chunk's (committed, taken) result, or the exception its commit raised, into errors and the index.
+    Returns the committed assignments."""
+    if isinstance(outcome, Exception):
+        logger.error(f"[BulkAssign] Chunk of {len(chunk)} assignments failed to commit: {outcome}")
+        errors.extend({"index": index, "message": f"Commit failed: {outcome}", **assignments[index], "responder_id": responder_id}
+                      for index, responder_id, _ in chunk)
+        return []
+    committed, taken = outcome
+    for (index, responder_id, _), latest_status in taken:
+        responder_index.apply_status(responder_id, latest_status)
+        errors.append({"index": index, "message": "Responder is no longer available", **assignments[index], "responder_id": responder_id})
+    return committed
+
+def bulk_assignment_result(committed: List[tuple], errors: List[Dict]) -> Dict[str, Any]:
+    """Apply committed bulk assignments to the availability index and build the tool result."""
+    for _, responder_id, status_update in committed:
+        responder_index.apply_status(responder_id, status_update)
+    assigned = [
+        {"responder_id": rid, "incident_id": update.get("incidentId"), "zone_id": update["zoneId"]}
+        for _, rid, update in committed
+    ]
+    errors = sorted(errors, key=lambda e: e["index"])
+    return {"status": "success" if not errors else "partial" if assigned else "error", "assigned": assigned, "errors": errors}
+
+@log_tool_call("assign_responders_bulk")
+def assign_responders_bulk(assignments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assign many responders at once. Each assignment has an incident_id or a zone_id, and optionally a
+    responder_id and responder_type; missing responders are picked from the availability index, and no
+    responder is assigned twice in one request. Each chunk of up to 250 assignments commits in its own
+    transaction that re-checks availability; the result lists what was actually committed and why the rest was not."""
+    incident_ids = list({a['incident_id'] for a in assignments if a.get('incident_id')})
+    planned, errors = plan_bulk_assignments(assignments, _get_docs_by_ids('incidents', incident_ids))
+    committed = []
+    for chunk in bulk_chunks(planned):
+        try:
+            outcome = _commit_bulk_chunk(db.transaction(max_attempts=MAX_ASSIGN_ATTEMPTS), chunk)
+        except Exception as e:
+            outcome = e
+        committed.extend(chunk_outcome(assignments, chunk, outcome, errors))
+    return bulk_assignment_result(committed, errors)
+
+def workload_query(client=db, window_hours: float = DISPATCH_WORKLOAD_WINDOW_HOURS):
+    """Status history events of the last window_hours, projected to responder id and status.
+    Only the time range is pushed down (a single-field index); the status is checked in count_workload,
+    since filtering both in Firestore would need a composite index."""
+    since = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    return (client.collection('responder_status_updates_history')
+            .where('timestamp', '>=', since)
+            .select(['responderId', 'status']))
+
+def count_workload(events: Iterable[Dict]) -> Dict[str, int]:
+    """Number of recent assignments per responder."""
+    workload: Dict[str, int] = {}
+    for event in events:
+        responder_id = event.get('responderId')
+        if responder_id and event.get('status') == 'assigned':
+            workload[responder_id] = workload.get(responder_id, 0) + 1
+    return workload
+
+def optimization_plan(workload: Dict[str, int], reload: bool = True) -> Dict[str, Any]:
+    """Min-cost plan for every open, unstaffed incident, from the cached incidents, zones and availability index.
+    Async callers pass reload=False after awaiting freshness, so a stale mirror is never re-streamed on the event loop."""
+    incidents = dispatch_optimizer.open_incidents(entity_cache.get_all('incidents', reload), responder_index.assigned_incident_ids(reload))
+    return dispatch_optimizer.plan_assignments(
+        incidents,
+        responder_index.list_available(reload=reload),
+        entity_cache.get_all('zones', reload),
+        workload,
+    )
+
+def optimized_bulk_request(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"incident_id": a["incident_id"], "responder_id": a["responder_id"]} for a in plan["assignments"]]
+
+@log_tool_call("optimize_responder_assignments")
+def optimize_responder_assignments(commit: bool = True) -> Dict[str, Any]:
+    """Match every open, unstaffed incident to an available responder in one globally optimal pass.
+    Minimizes total cost (distance, responder type fit, workload, incident severity) with the Hungarian
+    algorithm instead of picking greedily per incident. With commit=True the plan is written through
+    assign_responders_bulk; otherwise only the plan is returned."""
+    events = [doc.to_dict() for doc in workload_query().stream()]
+    plan = optimization_plan(count_workload(events))
+    if not commit or not plan["assignments"]:
+        return {"status": "success", "committed": False, **plan}
+    result = assign_responders_bulk(optimized_bulk_request(plan))
+    return {**plan, "status": result["status"], "committed": True, "assigned": result["assigned"], "errors": result["errors"]}
 
 @log_tool_call("notify_unavailable")
 def notify_unavailable(zone_id: str) -> Dict[str, str]:
@@ -163,34 +480,41 @@ def notify_unavailable(zone_id: str) -> Dict[str, str]:
     })
     return {"status": "notified", "zone_id": zone_id, "method": "event_logged"}
 
+def zone_deficit_report(limit: int = 20, reload: bool = True) -> Dict[str, Any]:
+    """Ranked zone deficit table from the cached zones and incidents and the availability index (reload as in optimization_plan)."""
+    staffing = zone_staffing.compute_staffing(
+        entity_cache.get_all('zones', reload),
+        entity_cache.get_all('incidents', reload),
+        responder_index.assigned_counts_by_zone(reload),
+    )
+    table = zone_staffing.ranked_deficit_table(staffing, limit)
+    return {
+        "status": "success",
+        "zones_needing_responders": [row[0] for row in table["rows"]],
+        **table,
+    }
+
 @log_tool_call("suggest_zones_needing_responders")
-def suggest_zones_needing_responders() -> Dict[str, Any]:
-    """Suggest zones that need more responders based on incidents and current assignments. Placeholder logic."""
-    incidents = fetch_incidents()
-    zones = fetch_zones()
-    needs = []
-    for inc in incidents:
-        if inc.get('status') == 'active':
-            needs.append(inc.get('zoneId'))
-    return {"status": "success", "zones_needing_responders": list(set(needs))}
+def suggest_zones_needing_responders(limit: int = 20) -> Dict[str, Any]:
+    """Rank zones by responder deficit (required minus assigned responders), computed from active incident counts,
+    severity and occupancy/capacity. Returns the ranked zone ids and a compact table of the top `limit` zones."""
+    return zone_deficit_report(limit)
 
 @log_tool_call("get_incident_by_id")
 def get_incident_by_id(incident_id: str) -> dict:
-    doc = db.collection('incidents').document(incident_id).get()
-    if not doc.exists:
+    incident = entity_cache.get('incidents', incident_id)
+    if incident is None:
         raise HTTPException(status_code=404, detail="Incident not found")
-    return dict(id=doc.id, **doc.to_dict())
+    return incident
 
 @log_tool_call("get_incidents_by_status")
 def get_incidents_by_status(status: str) -> dict:
-    docs = db.collection('incidents').where('status', '==', status).stream()
-    incidents = [dict(id=doc.id, **doc.to_dict()) for doc in docs]
+    incidents = [i for i in entity_cache.get_all('incidents') if i.get('status') == status]
     return {"incidents": incidents}
 
 @log_tool_call("get_incidents_by_zone")
 def get_incidents_by_zone(zone_id: str) -> dict:
-    docs = db.collection('incidents').where('zoneId', '==', zone_id).stream()
-    incidents = [dict(id=doc.id, **doc.to_dict()) for doc in docs]
+    incidents = [i for i in entity_cache.get_all('incidents') if i.get('zoneId') == zone_id]
     return {"incidents": incidents}
 
 @log_tool_call("get_responders_assigned_to_incident")
@@ -202,11 +526,8 @@ def get_responders_assigned_to_incident(incident_id: str) -> List[Dict]:
         .where('status', '==', 'assigned')
         .stream())
     responder_ids = [e.to_dict().get('responderId') for e in status_events if e.to_dict().get('responderId')]
-    if not responder_ids:
-        return []
     # Fetch responder details
-    responders = [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('responders').where('id', 'in', responder_ids).stream()]
-    return responders 
+    return fetch_documents_by_ids('responders', responder_ids)
 
 # @log_tool_call("get_all_incident_reports")
 def get_all_incident_reports() -> dict:
@@ -222,39 +543,18 @@ def get_incident_reports_by_venue(venue_id: str) -> dict:
 
 # @log_tool_call("get_incident_statistics")
 def get_incident_statistics() -> dict:
-    docs = db.collection('incident_reports').stream()
-    incidents = [dict(id=doc.id, **doc.to_dict()) for doc in docs]
-    if not incidents:
-        return {
-            "total_incidents": 0,
-            "resolved_incidents": 0,
-            "resolution_rate": 0.0,
-            "avg_severity": 0.0,
-            "avg_feedback": 0.0,
-            "incident_types": {},
-            "severity_distribution": {}
-        }
-    resolved_incidents = [i for i in incidents if i.get('resolved', False)]
-    resolution_rate = len(resolved_incidents) / len(incidents)
-    avg_severity = sum([i.get('severity', 0) for i in resolved_incidents]) / max(len(resolved_incidents), 1)
-    avg_feedback = sum([i.get('feedback_rating', 4) for i in incidents]) / max(len(incidents), 1)
-    incident_types = {}
-    for incident in incidents:
-        inc_type = incident.get('type', 'unknown')
-        incident_types[inc_type] = incident_types.get(inc_type, 0) + 1
-    severity_distribution = {}
-    for incident in incidents:
-        severity = incident.get('severity', 0)
-        severity_distribution[severity] = severity_distribution.get(severity, 0) + 1
-    return {
-        "total_incidents": len(incidents),
-        "resolved_incidents": len(resolved_incidents),
-        "resolution_rate": resolution_rate,
-        "avg_severity": avg_severity,
-        "avg_feedback": avg_feedback,
-        "incident_types": incident_types,
-        "severity_distribution": severity_distribution
-    } 
+    """Incident statistics derived from the rollup over the cached incident reports (no document reads while listening)."""
+    return incident_rollups.read_statistics()
+
+def record_incident_report(report: Dict, report_id: Optional[str] = None) -> dict:
+    """Write an incident report and apply it to the statistics rollup."""
+    return incident_rollups.record_incident_report(report, report_id)
+
+def rebuild_incident_statistics() -> dict:
+    """Recompute the statistics rollup from scratch from every incident report."""
+    incident_rollups.rebuild_rollup()
+    return incident_rollups.read_statistics()
+
 @log_tool_call("get_incidents_for_responder")
 def get_incidents_for_responder(responder_id: str) -> list:
     """Fetch all incidents for a given responder based on responder_status_updates."""
@@ -263,13 +563,8 @@ def get_incidents_for_responder(responder_id: str) -> list:
         .where('responderId', '==', responder_id)
         .stream())
     incident_ids = [e.to_dict().get('incidentId') for e in status_events if e.to_dict().get('incidentId')]
-    if not incident_ids:
-        return []
-    # Remove duplicates
-    incident_ids = list(set(incident_ids))
     # Fetch incident details
-    incidents = [dict(id=doc.id, **doc.to_dict()) for doc in db.collection('incidents').where('id', 'in', incident_ids).stream()]
-    return incidents 
+    return fetch_documents_by_ids('incidents', incident_ids)
 
 @log_tool_call("get_incidents_details_for_responder")
 def get_incidents_details_for_responder(responder_id: str) -> list:
@@ -279,15 +574,5 @@ def get_incidents_details_for_responder(responder_id: str) -> list:
         .where('responderId', '==', responder_id)
         .stream())
     incident_ids = [e.to_dict().get('incidentId') for e in status_events if e.to_dict().get('incidentId')]
-    if not incident_ids:
-        return []
-    # Remove duplicates
-    incident_ids = list(set(incident_ids))
     # Fetch full incident details from incidents collection
-    incidents = []
-    for incident_id in incident_ids:
-        doc = db.collection('incidents').document(incident_id).get()
-        if doc.exists:
-            incident_data = dict(id=doc.id, **doc.to_dict())
-            incidents.append(incident_data)
-    return incidents 
+    return fetch_documents_by_ids('incidents', incident_ids) 
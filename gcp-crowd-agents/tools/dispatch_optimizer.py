@@ -0,0 +1,125 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from typing import Any, Dict, List, Optional
+from tools.zone_staffing import CLOSED_STATUSES, severity
+
+# Responder types that fit each incident type (lower-case).
+INCIDENT_RESPONDER_TYPES = {
+    "fire": {"fire brigade", "fire"},
+    "smoke": {"fire brigade", "fire"},
+    "medical": {"medical", "ambulance"},
+    "security": {"security", "police"},
+    "police": {"police", "security"},
+    "panic": {"security", "police"},
+    "crowd": {"security", "police"},
+    "stampede": {"security", "police", "medical"},
+    "environmental": {"technical", "fire brigade"},
+    "technical": {"technical"},
+}
+
+# Cost weights: a type mismatch costs as much as TYPE_MISMATCH_COST km of travel,
+# and each recent assignment as much as WORKLOAD_COST km, counting at most
+# MAX_COUNTED_WORKLOAD of them so a busy responder of the right type still beats
+# an idle one of the wrong type. PRIORITY_BONUS per severity point makes severe
+# incidents win when responders are scarce.
+TYPE_MISMATCH_COST = 5.0
+WORKLOAD_COST = 0.5
+MAX_COUNTED_WORKLOAD = 8
+PRIORITY_BONUS = 2.0
+# Distance assumed when either side has no usable coordinates.
+UNKNOWN_DISTANCE_KM = 1.0
+EARTH_RADIUS_KM = 6371.0
+
+def zone_centroids(zones: List[Dict]) -> Dict[str, tuple]:
+    """Centroid (lat, lng) of each zone's boundaries.coordinates, keyed by zone id and zone name."""
+    centroids = {}
+    for zone in zones:
+        coordinates = (zone.get("boundaries") or {}).get("coordinates") or []
+        points = [(c["lat"], c["lng"]) for c in coordinates if "lat" in c and "lng" in c]
+        if not points:
+            continue
+        centroid = tuple(np.mean(np.array(points, dtype=np.float64), axis=0))
+        centroids[zone["id"]] = centroid
+        if zone.get("name"):
+            centroids.setdefault(zone["name"], centroid)
+    return centroids
+
+def _point(location: Optional[Dict]) -> Optional[tuple]:
+    if isinstance(location, dict) and isinstance(location.get("lat"), (int, float)) and isinstance(location.get("lng"), (int, float)):
+        return location["lat"], location["lng"]
+    return None
+
+def _locate(entity: Dict, location_field: str, centroids: Dict[str, tuple]) -> Optional[tuple]:
+    return (
+        _point(entity.get(location_field))
+        or centroids.get(entity.get("zoneId"))
+        or centroids.get(entity.get("zone"))
+    )
+
+def _locate_responder(responder: Dict, centroids: Dict[str, tuple]) -> Optional[tuple]:
+    # A zone from the latest status event is more recent than the responder's stored position.
+    latest_zone = (responder.get("last_status_event") or {}).get("zoneId")
+    return centroids.get(latest_zone) or _locate(responder, "position", centroids)
+
+def _coordinates(points: List[Optional[tuple]]) -> np.ndarray:
+    return np.array([p if p is not None else (np.nan, np.nan) for p in points], dtype=np.float64).reshape(len(points), 2)
+
+def haversine_km(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances between (n, 2) and (m, 2) lat/lng arrays; NaN where a point is unknown."""
+    lat1, lng1 = np.radians(a[:, 0])[:, None], np.radians(a[:, 1])[:, None]
+    lat2, lng2 = np.radians(b[:, 0])[None, :], np.radians(b[:, 1])[None, :]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+def open_incidents(incidents: List[Dict], assigned_incident_ids: set) -> List[Dict]:
+    """Incidents that are not closed and have nobody assigned yet."""
+    return [
+        i for i in incidents
+        if str(i.get("status", "")).lower() not in CLOSED_STATUSES and i["id"] not in assigned_incident_ids
+    ]
+
+def plan_assignments(incidents: List[Dict], responders: List[Dict], zones: List[Dict], workload: Dict[str, int]) -> Dict[str, Any]:
+    """Solve the min-cost bipartite assignment between incidents and responders.
+
+    Each incident gets at most one responder and vice versa. The cost of a pair is
+    travel distance in km plus a type-mismatch penalty and the responder's recent (capped) workload,
+    minus a bonus for incident severity.
+    """
+    if not incidents or not responders:
+        return {"assignments": [], "total_cost": 0.0, "unassigned_incidents": [i["id"] for i in incidents]}
+    centroids = zone_centroids(zones)
+    distance = haversine_km(
+        _coordinates([_locate(i, "location", centroids) for i in incidents]),
+        _coordinates([_locate_responder(r, centroids) for r in responders]),
+    )
+    distance = np.where(np.isnan(distance), UNKNOWN_DISTANCE_KM, distance)
+
+    incident_types = [str(i.get("type", "")).lower() for i in incidents]
+    responder_types = np.array([str(r.get("type", "")).lower() for r in responders])
+    mismatch = np.array([
+        ~np.isin(responder_types, list(INCIDENT_RESPONDER_TYPES[t])) if t in INCIDENT_RESPONDER_TYPES else np.zeros(len(responders), dtype=bool)
+        for t in incident_types
+    ], dtype=np.float64)
+    load = np.array([workload.get(r["id"], 0) for r in responders], dtype=np.float64)
+    severities = np.array([severity(i) for i in incidents], dtype=np.float64)
+
+    cost = distance + TYPE_MISMATCH_COST * mismatch + WORKLOAD_COST * np.minimum(load, MAX_COUNTED_WORKLOAD)[None, :] - PRIORITY_BONUS * severities[:, None]
+    rows, cols = linear_sum_assignment(cost)
+    assignments = [
+        {
+            "incident_id": incidents[r]["id"],
+            "responder_id": responders[c]["id"],
+            "responder_type": responders[c].get("type"),
+            "distance_km": round(float(distance[r, c]), 3),
+            "type_match": not bool(mismatch[r, c]),
+            "workload": int(load[c]),
+            "cost": round(float(cost[r, c]), 3),
+        }
+        for r, c in zip(rows, cols)
+    ]
+    assigned_rows = set(rows.tolist())
+    return {
+        "assignments": assignments,
+        "total_cost": round(float(cost[rows, cols].sum()), 3),
+        "unassigned_incidents": [incidents[r]["id"] for r in range(len(incidents)) if r not in assigned_rows],
+    }
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from config import ENTITY_CACHE_TTL_SECONDS, ENTITY_CACHE_LISTEN
+from utils.firestore_utils import get_firestore_client
+
+logger = logging.getLogger(__name__)
+
+class CollectionCache:
+    """In-memory mirror of one Firestore collection.
+
+    An on_snapshot listener applies changes as they happen. If the listener is
+    not running (disabled, failed to start, or closed by an error) the mirror is
+    re-streamed whenever it is older than ttl_seconds.
+
+    Change listeners receive a {doc_id: data or None} mapping for every applied
+    change set; None marks a removed document.
+    """
+
+    def __init__(self, client, name: str, ttl_seconds: float, listen: bool = True):
+        self.client = client
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._docs: Dict[str, Dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self._reload: Optional[threading.Event] = None
+        self._watch = None
+        self._change_listeners: List[Callable[[Dict[str, Optional[Dict]]], None]] = []
+        if listen:
+            self._start_listener()
+
+    def _start_listener(self):
+        try:
+            self._watch = self.client.collection(self.name).on_snapshot(self._on_snapshot)
+            logger.info(f"[EntityCache] Listening to '{self.name}'")
+        except Exception as e:
+            self._watch = None
+            logger.warning(f"[EntityCache] Could not listen to '{self.name}', polling every {self.ttl_seconds}s: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            changed = {}
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self._docs.pop(doc.id, None)
+                    changed[doc.id] = None
+                else:
+                    self._docs[doc.id] = changed[doc.id] = {**doc.to_dict(), "id": doc.id}
+            self._loaded_at = time.monotonic()
+            self.version += 1
+            self._notify(changed)
+
+    def _notify(self, changed: Dict[str, Optional[Dict]]):
+        for listener in self._change_listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                logger.error(f"[EntityCache] Change listener for '{self.name}' failed: {e}")
+
+    def add_listener(self, listener: Callable[[Dict[str, Optional[Dict]]], None]):
+        """Register a change listener and replay the current contents to it."""
+        with self._lock:
+            self._change_listeners.append(listener)
+            if self._docs:
+                listener(dict(self._docs))
+
+    @property
+    def listening(self) -> bool:
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        if self.listening:
+            return True
+        return time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def refresh(self):
+        """Re-stream the whole collection, replacing the in-memory copy."""
+        self._replace({doc.id: {**doc.to_dict(), "id": doc.id} for doc in self.client.collection(self.name).stream()})
+
+    async def refresh_async(self, async_client):
+        """Like refresh(), but streams through a firestore.AsyncClient without blocking the event loop."""
+        self._replace({doc.id: {**doc.to_dict(), "id": doc.id} async for doc in async_client.collection(self.name).stream()})
+
+    def _replace(self, docs: Dict[str, Dict]):
+        with self._lock:
+            changed = {doc_id: None for doc_id in self._docs if doc_id not in docs}
+            changed.update((doc_id, doc) for doc_id, doc in docs.items() if self._docs.get(doc_id) != doc)
+            self._docs = docs
+            self._loaded_at = time.monotonic()
+            # Only real changes move the version, so a polling reload of unchanged data keeps version-keyed caches valid.
+            if changed:
+                self.version += 1
+                self._notify(changed)
+
+    def ensure_fresh(self):
+        """Reload the collection if it may be staler than the TTL; a no-op while listening."""
+        self._ensure_fresh()
+
+    def _ensure_fresh(self):
+        # The lock only guards the bookkeeping: the reload streams the collection without it, so
+        # async callers (which take the lock on the event loop) never wait on a blocking read.
+        # Concurrent sync callers wait for the one reload in flight instead of starting their own.
+        while True:
+            with self._lock:
+                if self._is_fresh():
+                    self.hits += 1
+                    return
+                reload = self._reload
+                if reload is None:
+                    self.misses += 1
+                    reload = self._reload = threading.Event()
+                    break
+            reload.wait()
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._reload = None
+            reload.set()
+
+    async def ensure_fresh_async(self, async_client):
+        """ensure_fresh() for async callers: a stale mirror is reloaded through the AsyncClient.
+        The lock is held only for the freshness check, never across the reload."""
+        with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return
+            self.misses += 1
+        await self.refresh_async(async_client)
+
+    def all(self, reload: bool = True) -> List[Dict]:
+        """The cached documents. reload=False skips the freshness check, for async callers that
+        have just awaited ensure_fresh_async() and must not stream the collection on the event loop."""
+        if reload:
+            self._ensure_fresh()
+        with self._lock:
+            return [dict(doc) for doc in self._docs.values()]
+
+    def get(self, doc_id: str, reload: bool = True) -> Optional[Dict]:
+        if reload:
+            self._ensure_fresh()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            return dict(doc) if doc is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "hits": self.hits,
+                "misses": self.misses,
+                "version": self.version,
+                "listening": self.listening,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None,
+            }
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+class EntityCache:
+    """Process-wide registry of CollectionCache instances, created on first use.
+
+    The Firestore client (for GCP_PROJECT, unless one is passed in) is also created on first use,
+    so importing the module opens no client and no listeners.
+    """
+
+    def __init__(self, client=None, ttl_seconds: float = ENTITY_CACHE_TTL_SECONDS, listen: bool = ENTITY_CACHE_LISTEN):
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self.listen = listen
+        self._collections: Dict[str, CollectionCache] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = get_firestore_client()
+        return self._client
+
+    def collection(self, name: str) -> CollectionCache:
+        client = self.client
+        with self._lock:
+            cache = self._collections.get(name)
+            if cache is None:
+                cache = CollectionCache(client, name, self.ttl_seconds, self.listen)
+                self._collections[name] = cache
+            return cache
+
+    def get_all(self, name: str, reload: bool = True) -> List[Dict]:
+        return self.collection(name).all(reload)
+
+    def get(self, name: str, doc_id: str, reload: bool = True) -> Optional[Dict]:
+        return self.collection(name).get(doc_id, reload)
+
+    async def ensure_fresh_async(self, async_client, *names: str):
+        """Make sure the named collections are fresh; follow it with reload=False reads, which stay in-memory
+        even if another await let the mirror go stale in between."""
+        await asyncio.gather(*(self.collection(name).ensure_fresh_async(async_client) for name in names))
+
+    def refresh(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Force a re-read of one collection, or of every cached collection when name is None."""
+        names = [name] if name else list(self._collections)
+        for collection_name in names:
+            self.collection(collection_name).refresh()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: cache.stats() for name, cache in list(self._collections.items())}
+
+    def close(self):
+        for cache in list(self._collections.values()):
+            cache.close()
+
+entity_cache = EntityCache()
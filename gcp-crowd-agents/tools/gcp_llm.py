@@ -1,14 +1,53 @@
 import os
-from vertexai.preview.generative_models import GenerativeModel
+from typing import Any, Dict, Iterator, Optional, Tuple
+import json
 from config import VERTEX_MODEL
+from tools import llm_gateway
+from tools.llm_scheduler import LLMOverloaded
+from tools.single_flight import SingleFlight, fingerprint
+from tools.structured_output import StructuredOutputError
+
+_flight = SingleFlight("query_gemini")
 
 def query_gemini(prompt: str) -> str:
+    """Gemini's answer to the prompt. Identical prompts already in flight share one call."""
+    return _flight.do(fingerprint(VERTEX_MODEL, prompt), _query_gemini, prompt)
+
+def _query_gemini(prompt: str) -> str:
     print(f"[LLM] Sending prompt to Gemini: {prompt[:500]}")  # Truncate for log readability
     try:
-        model = GenerativeModel(VERTEX_MODEL)
-        response = model.generate_content(prompt)
+        response = llm_gateway.generate_content(prompt)
         print(f"[LLM] Gemini response: {response.text[:500]}")  # Truncate for log readability
         return response.text
+    except LLMOverloaded:
+        # Capacity errors propagate so the API can answer 429 instead of a 200 carrying an error string.
+        raise
+    except Exception as e:
+        print(f"[LLM] Gemini API error: {e}")
+        return f"[Gemini API error: {e}]"
+
+def query_gemini_json(prompt: str, schema: Dict[str, Any], label: str = "") -> Tuple[Optional[Any], str]:
+    """query_gemini in structured-output mode, constrained to schema. Returns (result, raw response text);
+    result is None when the call failed or the answer could not be repaired."""
+    key = fingerprint(VERTEX_MODEL, json.dumps(schema, sort_keys=True), prompt)
+    return _flight.do(key, _query_gemini_json, prompt, schema, label)
+
+def _query_gemini_json(prompt: str, schema: Dict[str, Any], label: str) -> Tuple[Optional[Any], str]:
+    print(f"[LLM] Sending JSON prompt to Gemini ({label}): {prompt[:500]}")  # Truncate for log readability
+    try:
+        result, text = llm_gateway.generate_json(prompt, schema, label=label)
+        print(f"[LLM] Gemini response ({label}): {text[:500]}")  # Truncate for log readability
+        return result, text
+    except LLMOverloaded:
+        raise
+    except StructuredOutputError as e:
+        print(f"[LLM] Unusable Gemini JSON response ({label}): {e}")
+        return None, e.raw or ""
     except Exception as e:
         print(f"[LLM] Gemini API error: {e}")
-        return f"[Gemini API error: {e}]" 
\ No newline at end of file
+        return None, f"[Gemini API error: {e}]"
+
+def stream_gemini(prompt: str) -> Iterator[str]:
+    """query_gemini, but yielding the answer's text chunks as Gemini produces them. Errors propagate."""
+    print(f"[LLM] Streaming prompt to Gemini: {prompt[:500]}")  # Truncate for log readability
+    yield from llm_gateway.stream_content(prompt)
@@ -0,0 +1,128 @@
+import threading
+from typing import Any, Dict, Optional
+from google.cloud import firestore
+from tools.entity_cache import entity_cache
+from tools.metrics import counted_client
+
+db = counted_client(firestore.Client())
+
+REPORTS_COLLECTION = 'incident_reports'
+# Reports without a rating count as 4, matching the original on-the-fly statistics.
+DEFAULT_FEEDBACK_RATING = 4
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+def _contribution(report: Optional[Dict]) -> Dict[str, Any]:
+    """The counters one report adds to the rollup, as a nested dict of numbers."""
+    if not report:
+        return {}
+    resolved = bool(report.get('resolved', False))
+    severity = report.get('severity', 0)
+    counters = {
+        "total_incidents": 1,
+        "resolved_incidents": 1 if resolved else 0,
+        "severity_sum_resolved": _number(severity) if resolved else 0,
+        "feedback_sum": _number(report.get('feedback_rating', DEFAULT_FEEDBACK_RATING)),
+        "incident_types": {str(report.get('type', 'unknown')): 1},
+        "severity_distribution": {str(severity): 1},
+    }
+    venue_id = report.get('venue_id')
+    if venue_id:
+        counters["venues"] = {str(venue_id): {"total": 1, "resolved": 1 if resolved else 0}}
+    return counters
+
+def _combine(into: Dict[str, Any], counters: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            _combine(into.setdefault(key, {}), value, sign)
+        else:
+            into[key] = into.get(key, 0) + sign * value
+    return into
+
+def _drop_zero(counts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (counts or {}).items() if value}
+
+class IncidentRollup:
+    """Incident statistics kept as running totals over the cached 'incident_reports' collection.
+
+    A change listener on the entity cache applies each report's delta (new contribution minus
+    the one recorded for it before), so reports written by any path are counted, including other
+    services, console edits and deletes. Reading the statistics touches no Firestore documents
+    while the cache is listening.
+    """
+
+    def __init__(self, cache=entity_cache):
+        self._cache = cache
+        self._lock = threading.RLock()
+        self._contributions: Dict[str, Dict[str, Any]] = {}
+        self._totals: Dict[str, Any] = {}
+        self._started = False
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._cache.collection(REPORTS_COLLECTION).add_listener(self._on_reports)
+
+    def _on_reports(self, changed: Dict[str, Optional[Dict]]):
+        with self._lock:
+            for report_id, report in changed.items():
+                _combine(self._totals, self._contributions.pop(report_id, {}), sign=-1)
+                contribution = _contribution(report)
+                if contribution:
+                    self._contributions[report_id] = contribution
+                    _combine(self._totals, contribution)
+
+    def apply(self, report_id: str, report: Dict):
+        """Write-through for a report that was just committed; the listener later re-applies it idempotently."""
+        self._start()
+        self._on_reports({report_id: report})
+
+    def totals(self) -> Dict[str, Any]:
+        self._start()
+        self._cache.collection(REPORTS_COLLECTION).ensure_fresh()
+        with self._lock:
+            return _combine({}, self._totals)
+
+    def rebuild(self) -> Dict[str, Any]:
+        """Re-stream every incident report and recompute the totals from scratch."""
+        self._start()
+        reports = self._cache.collection(REPORTS_COLLECTION)
+        reports.refresh()
+        with self._lock:
+            self._contributions.clear()
+            self._totals.clear()
+            self._on_reports({report['id']: report for report in reports.all(reload=False)})
+            return _combine({}, self._totals)
+
+incident_rollup = IncidentRollup()
+
+def record_incident_report(report: Dict, report_id: Optional[str] = None) -> Dict[str, Any]:
+    """Create or overwrite an incident report and apply it to the rollup straight away."""
+    reports = db.collection(REPORTS_COLLECTION)
+    report_ref = reports.document(report_id) if report_id else reports.document()
+    report_ref.set(report)
+    incident_rollup.apply(report_ref.id, report)
+    return {"status": "success", "id": report_ref.id}
+
+def rebuild_rollup() -> Dict[str, Any]:
+    """Recompute the rollup from every incident report."""
+    return incident_rollup.rebuild()
+
+def read_statistics() -> Dict[str, Any]:
+    """Derive the incident statistics from the rollup totals."""
+    rollup = incident_rollup.totals()
+    total = rollup.get("total_incidents", 0)
+    resolved = rollup.get("resolved_incidents", 0)
+    return {
+        "total_incidents": total,
+        "resolved_incidents": resolved,
+        "resolution_rate": resolved / total if total else 0.0,
+        "avg_severity": rollup.get("severity_sum_resolved", 0) / max(resolved, 1) if total else 0.0,
+        "avg_feedback": rollup.get("feedback_sum", 0) / max(total, 1) if total else 0.0,
+        "incident_types": _drop_zero(rollup.get("incident_types")),
+        "severity_distribution": _drop_zero(rollup.get("severity_distribution")),
+        "venues": {venue: counts for venue, counts in (rollup.get("venues") or {}).items() if counts.get("total")},
+    }
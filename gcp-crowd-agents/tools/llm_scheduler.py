@@ -0,0 +1,326 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_BURST, LLM_QUEUE_MAX,
+    LLM_QUEUE_TIMEOUTS, LLM_AGENT_PRIORITIES
+)
+from tools import metrics
+
+# Priority classes, most urgent first.
+LIFE_SAFETY = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {LIFE_SAFETY: "life_safety", INTERACTIVE: "interactive", BACKGROUND: "background"}
+_PRIORITIES_BY_NAME = {name: priority for priority, name in PRIORITY_NAMES.items()}
+
+# Priority of the calls made inside each track_agent label; LLM_AGENT_PRIORITIES overrides entries.
+AGENT_PRIORITIES = {
+    "incident": LIFE_SAFETY,
+    "vision": LIFE_SAFETY,
+    "escalation": LIFE_SAFETY,
+    "dispatcher": LIFE_SAFETY,
+    "chat": INTERACTIVE,
+    "notification": INTERACTIVE,
+    "summary": BACKGROUND,
+    "command": BACKGROUND,
+}
+
+def _parse_overrides(spec: str) -> Dict[str, str]:
+    overrides = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            overrides[name.strip()] = value.strip()
+    return overrides
+
+AGENT_PRIORITIES.update({agent: _PRIORITIES_BY_NAME[name] for agent, name in _parse_overrides(LLM_AGENT_PRIORITIES).items()})
+_MODEL_CONCURRENCY = {model: int(value) for model, value in _parse_overrides(LLM_MODEL_CONCURRENCY).items()}
+_QUEUE_TIMEOUTS = {_PRIORITIES_BY_NAME[name]: float(value) for name, value in _parse_overrides(LLM_QUEUE_TIMEOUTS).items()}
+
+class LLMOverloaded(Exception):
+    """No LLM capacity for the call: the queue was full, the wait passed its deadline or the model
+    returned a quota error. Surfaced to HTTP clients as 429 with Retry-After."""
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+def is_quota_error(error: BaseException) -> bool:
+    """Vertex (google.api_core ResourceExhausted) and google.genai quota errors both carry code 429."""
+    return getattr(error, "code", None) == 429
+
+class TokenBucket:
+    """Requests-per-minute quota; rate_per_minute <= 0 disables it. Not thread-safe: the limiter's lock guards it."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until take() can next succeed."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._refill(now)
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.0)
+
+    def pause(self, seconds: float):
+        """Drain the bucket after an upstream quota error, so queued calls back off instead of retrying into it."""
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "enqueued", "deadline", "wake", "granted", "rejected")
+
+    def __init__(self, priority: int, seq: int, deadline: float, wake: Callable[[], Any]):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+        self.wake = wake
+        self.granted = False
+        self.rejected: Optional[str] = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class ModelLimiter:
+    """Concurrency limit, token bucket and priority queue for one model.
+
+    Calls start at once while there is a free slot, a token and nobody queued; otherwise they queue by
+    (priority, arrival). A full queue sheds its lowest-priority waiter for a more urgent arrival, or
+    rejects the arrival; so does a bucket that cannot yield a token before the deadline. Waiters give
+    up at their deadline. All of these are reported as LLMOverloaded.
+    """
+
+    def __init__(self, model: str, max_concurrency: int, bucket: TokenBucket, max_queue: int):
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = bucket
+        self.max_queue = max_queue
+        self.active = 0
+        self.shed = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _retry_after(self) -> float:
+        rate = self.bucket.rate if self.bucket.rate > 0 else float(self.max_concurrency)
+        return max(self.bucket.wait_time(), len(self._queue) / rate)
+
+    def _shed(self, priority: int, reason: str, started: float):
+        self.shed += 1
+        name = PRIORITY_NAMES[priority]
+        metrics.observe_llm_shed(self.model, name, reason)
+        metrics.observe_llm_queue(self.model, name, time.monotonic() - started, "shed")
+        return LLMOverloaded(f"LLM capacity exhausted for {self.model} ({reason})", self._retry_after())
+
+    def _dispatch(self):
+        while self._queue and self.active < self.max_concurrency and self.bucket.take():
+            waiter = heapq.heappop(self._queue)
+            waiter.granted = True
+            self.active += 1
+            metrics.observe_llm_queue(self.model, PRIORITY_NAMES[waiter.priority], time.monotonic() - waiter.enqueued)
+            waiter.wake()
+
+    def _remove(self, waiter: _Waiter):
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+
+    def enqueue(self, priority: int, timeout: float, wake: Callable[[], Any]) -> Optional[_Waiter]:
+        """None if the call may start now, else the queued waiter to poll."""
+        with self._lock:
+            if not self._queue and self.active < self.max_concurrency and self.bucket.take():
+                self.active += 1
+                metrics.observe_llm_queue(self.model, PRIORITY_NAMES[priority], 0.0)
+                return None
+            now = time.monotonic()
+            if self.bucket.wait_time() > timeout:
+                # Paused after a quota error or far behind on tokens: fail now rather than at the deadline.
+                raise self._shed(priority, "rate_limited", now)
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue) if self._queue else None
+                if worst is None or worst.priority <= priority:
+                    raise self._shed(priority, "queue_full", now)
+                self._remove(worst)
+                worst.rejected = "displaced"
+                worst.wake()
+            waiter = _Waiter(priority, next(self._seq), now + timeout, wake)
+            heapq.heappush(self._queue, waiter)
+            return waiter
+
+    def poll(self, waiter: _Waiter) -> Optional[float]:
+        """None once the waiter holds a slot, else how long to sleep before polling again.
+        Raises LLMOverloaded if it was displaced or its deadline passed."""
+        with self._lock:
+            self._dispatch()
+            if waiter.granted:
+                return None
+            if waiter.rejected:
+                raise self._shed(waiter.priority, waiter.rejected, waiter.enqueued)
+            remaining = waiter.deadline - time.monotonic()
+            if remaining <= 0:
+                self._remove(waiter)
+                raise self._shed(waiter.priority, "deadline", waiter.enqueued)
+            # Nobody releases a slot when only the bucket is short, so wake up when it refills.
+            if self.active < self.max_concurrency:
+                return min(remaining, max(self.bucket.wait_time(), 0.001))
+            return remaining
+
+    def abandon(self, waiter: _Waiter):
+        """The waiting caller went away (cancelled or interrupted): give back its slot or its place."""
+        with self._lock:
+            if waiter.granted:
+                self.active -= 1
+                self._dispatch()
+            elif not waiter.rejected and waiter in self._queue:
+                self._remove(waiter)
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+
+    def penalize(self, retry_after: float):
+        with self._lock:
+            self.bucket.pause(retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                queued[PRIORITY_NAMES[waiter.priority]] += 1
+            return {
+                "active": self.active,
+                "max_concurrency": self.max_concurrency,
+                "queued": queued,
+                "shed": self.shed,
+                "tokens": None if self.bucket.rate <= 0 else round(self.bucket.tokens, 2),
+            }
+
+class LLMScheduler:
+    """Front door for every Vertex call: one ModelLimiter per model, priority from the calling agent.
+
+        with llm_scheduler.slot(model_name):
+            response = model.generate_content(...)
+
+    Quota errors from the model inside the slot become LLMOverloaded and pause that model's bucket.
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(model)
+                if limiter is None:
+                    limiter = self._limiters[model] = ModelLimiter(
+                        model, _MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY),
+                        TokenBucket(LLM_REQUESTS_PER_MINUTE, LLM_BURST), LLM_QUEUE_MAX)
+        return limiter
+
+    @staticmethod
+    def priority_for(agent: Optional[str] = None) -> int:
+        return AGENT_PRIORITIES.get(agent or metrics.current_agent.get(), INTERACTIVE)
+
+    def _penalize(self, limiter: ModelLimiter, priority: int, error: BaseException) -> LLMOverloaded:
+        retry_after = getattr(error, "retry_after", None) or 5.0
+        limiter.penalize(retry_after)
+        metrics.observe_llm_shed(limiter.model, PRIORITY_NAMES[priority], "quota")
+        return LLMOverloaded(f"Model quota exhausted for {limiter.model}: {error}", retry_after)
+
+    @contextmanager
+    def slot(self, model: str, priority: Optional[int] = None):
+        priority = self.priority_for() if priority is None else priority
+        limiter = self.limiter(model)
+        event = threading.Event()
+        waiter = limiter.enqueue(priority, _QUEUE_TIMEOUTS.get(priority, 30.0), event.set)
+        if waiter is not None:
+            try:
+                while True:
+                    event.clear()
+                    timeout = limiter.poll(waiter)
+                    if timeout is None:
+                        break
+                    event.wait(timeout)
+            except LLMOverloaded:
+                raise
+            except BaseException:
+                limiter.abandon(waiter)
+                raise
+        try:
+            yield
+        except Exception as e:
+            if is_quota_error(e):
+                raise self._penalize(limiter, priority, e) from e
+            raise
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def async_slot(self, model: str, priority: Optional[int] = None):
+        priority = self.priority_for() if priority is None else priority
+        limiter = self.limiter(model)
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = limiter.enqueue(priority, _QUEUE_TIMEOUTS.get(priority, 30.0), lambda: loop.call_soon_threadsafe(event.set))
+        if waiter is not None:
+            try:
+                while True:
+                    event.clear()
+                    timeout = limiter.poll(waiter)
+                    if timeout is None:
+                        break
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except LLMOverloaded:
+                raise
+            except BaseException:
+                limiter.abandon(waiter)
+                raise
+        try:
+            yield
+        except Exception as e:
+            if is_quota_error(e):
+                raise self._penalize(limiter, priority, e) from e
+            raise
+        finally:
+            limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.model: limiter.stats() for limiter in limiters}
+
+llm_scheduler = LLMScheduler()
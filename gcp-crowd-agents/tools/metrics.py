@@ -0,0 +1,392 @@
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from starlette.routing import Match
+from google.cloud import firestore
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DOCUMENT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+BYTES_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+CHARS_BUCKETS = (100, 1_000, 5_000, 20_000, 100_000, 500_000)
+TOKEN_BUCKETS = (50, 250, 1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000)
+
+TOOL_DURATION = Histogram("drishti_tool_duration_seconds", "Wall time of db_tools tool calls", ["tool", "outcome"], buckets=LATENCY_BUCKETS)
+TOOL_RESULT_BYTES = Histogram("drishti_tool_result_bytes", "JSON size of tool results, for the calls sampled by TOOL_LOG_SAMPLE_RATE", ["tool"], buckets=BYTES_BUCKETS)
+TOOL_DOCUMENTS = Histogram("drishti_tool_firestore_documents", "Firestore documents read, queries issued and writes committed per tool call", ["tool", "op"], buckets=DOCUMENT_BUCKETS)
+
+HTTP_DURATION = Histogram("drishti_http_request_duration_seconds", "Wall time of HTTP requests", ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+HTTP_REQUEST_BYTES = Histogram("drishti_http_request_bytes", "HTTP request body size", ["method", "route"], buckets=BYTES_BUCKETS)
+HTTP_RESPONSE_BYTES = Histogram("drishti_http_response_bytes", "HTTP response body size", ["method", "route"], buckets=BYTES_BUCKETS)
+HTTP_DOCUMENTS = Histogram("drishti_http_firestore_documents", "Firestore documents read, queries issued and writes committed per HTTP request", ["route", "op"], buckets=DOCUMENT_BUCKETS)
+
+AGENT_DURATION = Histogram("drishti_agent_duration_seconds", "Wall time of agent operations", ["agent", "operation", "outcome"], buckets=LATENCY_BUCKETS)
+AGENT_DOCUMENTS = Histogram("drishti_agent_firestore_documents", "Firestore documents read, queries issued and writes committed per agent operation", ["agent", "op"], buckets=DOCUMENT_BUCKETS)
+
+LLM_DURATION = Histogram("drishti_llm_duration_seconds", "Wall time of LLM calls", ["agent", "model", "outcome"], buckets=LATENCY_BUCKETS)
+LLM_PROMPT_CHARS = Histogram("drishti_llm_prompt_chars", "LLM prompt size in characters", ["agent", "model"], buckets=CHARS_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("drishti_llm_response_chars", "LLM response size in characters", ["agent", "model"], buckets=CHARS_BUCKETS)
+LLM_TOKENS = Histogram("drishti_llm_tokens", "LLM tokens per call, from the response usage metadata", ["agent", "model", "kind"], buckets=TOKEN_BUCKETS)
+LLM_TIME_TO_FIRST_TOKEN = Histogram("drishti_llm_time_to_first_token_seconds", "Time until the first LLM output arrived", ["agent", "model"], buckets=LATENCY_BUCKETS)
+LLM_QUEUE_WAIT = Histogram("drishti_llm_queue_wait_seconds", "Time LLM calls waited in the scheduler queue", ["model", "priority", "outcome"], buckets=LATENCY_BUCKETS)
+LLM_SHED = Counter("drishti_llm_shed_total", "LLM calls rejected with 429 by the scheduler or the model quota", ["model", "priority", "reason"])
+LLM_SINGLE_FLIGHT = Counter("drishti_llm_single_flight_total", "LLM requests that made the call (leader) or shared an identical in-flight one (coalesced)", ["agent", "layer", "role"])
+
+class FirestoreUsage:
+    __slots__ = ("reads", "queries", "writes")
+
+    def __init__(self):
+        self.reads = 0
+        self.queries = 0
+        self.writes = 0
+
+# Every open usage scope (request, agent operation, tool call) sees the documents read and written inside it.
+_usage_scopes: ContextVar[tuple] = ContextVar("firestore_usage_scopes", default=())
+current_agent: ContextVar[str] = ContextVar("current_agent", default="none")
+# Worker threads started with carry_usage add to the same scopes as their caller.
+_usage_lock = threading.Lock()
+
+@contextmanager
+def usage_scope():
+    usage = FirestoreUsage()
+    token = _usage_scopes.set(_usage_scopes.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_scopes.reset(token)
+
+def record_reads(count: int = 1):
+    scopes = _usage_scopes.get()
+    if scopes and count:
+        with _usage_lock:
+            for usage in scopes:
+                usage.reads += count
+
+def record_queries(count: int = 1):
+    """Count Firestore RPCs that read documents (queries, get_all and document gets)."""
+    scopes = _usage_scopes.get()
+    if scopes and count:
+        with _usage_lock:
+            for usage in scopes:
+                usage.queries += count
+
+def record_writes(count: int = 1):
+    scopes = _usage_scopes.get()
+    if scopes and count:
+        with _usage_lock:
+            for usage in scopes:
+                usage.writes += count
+
+def carry_usage(func):
+    """Wrap func for a worker thread so the Firestore usage inside it counts toward the caller's scopes and agent."""
+    scopes, agent = _usage_scopes.get(), current_agent.get()
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        scopes_token, agent_token = _usage_scopes.set(scopes), current_agent.set(agent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _usage_scopes.reset(scopes_token)
+            current_agent.reset(agent_token)
+    return run
+
+def _observe_documents(histogram, label: str, usage: FirestoreUsage):
+    histogram.labels(label, "read").observe(usage.reads)
+    histogram.labels(label, "query").observe(usage.queries)
+    histogram.labels(label, "write").observe(usage.writes)
+
+def observe_tool(tool: str, seconds: float, usage: FirestoreUsage, outcome: str = "ok", result_bytes: Optional[int] = None):
+    TOOL_DURATION.labels(tool, outcome).observe(seconds)
+    _observe_documents(TOOL_DOCUMENTS, tool, usage)
+    if result_bytes is not None:
+        TOOL_RESULT_BYTES.labels(tool).observe(result_bytes)
+
+def observe_llm(agent: str, model: str, seconds: float, prompt_chars: int, response_chars: Optional[int], outcome: str = "ok",
+                prompt_tokens: Optional[int] = None, response_tokens: Optional[int] = None,
+                first_token_seconds: Optional[float] = None):
+    """Record one LLM call; llm_tracing.llm_span calls this when the span ends."""
+    LLM_DURATION.labels(agent, model, outcome).observe(seconds)
+    LLM_PROMPT_CHARS.labels(agent, model).observe(prompt_chars)
+    if response_chars is not None:
+        LLM_RESPONSE_CHARS.labels(agent, model).observe(response_chars)
+    if prompt_tokens is not None:
+        LLM_TOKENS.labels(agent, model, "prompt").observe(prompt_tokens)
+    if response_tokens is not None:
+        LLM_TOKENS.labels(agent, model, "response").observe(response_tokens)
+    if first_token_seconds is not None:
+        LLM_TIME_TO_FIRST_TOKEN.labels(agent, model).observe(first_token_seconds)
+
+def observe_llm_queue(model: str, priority: str, seconds: float, outcome: str = "started"):
+    """Record how long one call waited for an LLM slot; outcome is "started" or "shed"."""
+    LLM_QUEUE_WAIT.labels(model, priority, outcome).observe(seconds)
+
+def observe_llm_shed(model: str, priority: str, reason: str):
+    LLM_SHED.labels(model, priority, reason).inc()
+
+def observe_single_flight(layer: str, role: str):
+    """Record one request through single_flight; role is "leader" or "coalesced"."""
+    LLM_SINGLE_FLIGHT.labels(current_agent.get(), layer, role).inc()
+
+def _observe_agent(agent: str, operation: str, started: float, usage: FirestoreUsage, outcome: str):
+    AGENT_DURATION.labels(agent, operation, outcome).observe(time.perf_counter() - started)
+    _observe_documents(AGENT_DOCUMENTS, agent, usage)
+
+@contextmanager
+def _agent_step(agent: str, usage: FirestoreUsage):
+    """Agent label and usage scope for one step of a generator; set and reset within the step because
+    a streaming response may resume the generator in a different context (e.g. a threadpool worker)."""
+    agent_token = current_agent.set(agent)
+    scopes_token = _usage_scopes.set(_usage_scopes.get() + (usage,))
+    try:
+        yield
+    finally:
+        _usage_scopes.reset(scopes_token)
+        current_agent.reset(agent_token)
+
+def track_agent(agent: str, operation: Optional[str] = None):
+    """Time an agent method, count its Firestore documents and label the LLM calls made inside it.
+    Generators are timed from the first step until they finish or are closed."""
+    def decorator(func):
+        op = operation or func.__name__
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                usage, stream = FirestoreUsage(), func(*args, **kwargs)
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    while True:
+                        with _agent_step(agent, usage):
+                            try:
+                                item = await stream.__anext__()
+                            except StopAsyncIteration:
+                                outcome = "ok"
+                                return
+                        yield item
+                finally:
+                    await stream.aclose()
+                    _observe_agent(agent, op, started, usage, outcome)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                usage, stream = FirestoreUsage(), func(*args, **kwargs)
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    while True:
+                        with _agent_step(agent, usage):
+                            try:
+                                item = next(stream)
+                            except StopIteration:
+                                outcome = "ok"
+                                return
+                        yield item
+                finally:
+                    stream.close()
+                    _observe_agent(agent, op, started, usage, outcome)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = current_agent.set(agent)
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    with usage_scope() as usage:
+                        result = await func(*args, **kwargs)
+                        outcome = "ok"
+                        return result
+                finally:
+                    _observe_agent(agent, op, started, usage, outcome)
+                    current_agent.reset(token)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_agent.set(agent)
+            started, outcome = time.perf_counter(), "error"
+            try:
+                with usage_scope() as usage:
+                    result = func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+            finally:
+                _observe_agent(agent, op, started, usage, outcome)
+                current_agent.reset(token)
+        return wrapper
+    return decorator
+
+def _route_label(scope) -> str:
+    """Route template (e.g. /api/incidents/{incident_id}) so labels stay low-cardinality."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+def server_timing(seconds: float, usage: FirestoreUsage) -> str:
+    """Server-Timing value carrying the wall time so far and the request's Firestore usage as counts."""
+    return (f'app;dur={seconds * 1000:.1f}, '
+            f'fs-read;desc="Firestore documents read";dur={usage.reads}, '
+            f'fs-query;desc="Firestore queries";dur={usage.queries}, '
+            f'fs-write;desc="Firestore writes";dur={usage.writes}')
+
+class PrometheusMiddleware:
+    """ASGI middleware recording wall time, body sizes and Firestore usage per endpoint.
+
+    The Firestore counts are also returned in a Server-Timing header. It is written when the
+    response starts, so streaming responses only report what was used up to that point;
+    the histograms always get the final counts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {"status": 500, "bytes": 0}
+
+        with usage_scope() as usage:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    timing = server_timing(time.perf_counter() - started, usage).encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing)]}
+                elif message["type"] == "http.response.body":
+                    response["bytes"] += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route, method = _route_label(scope), scope["method"]
+                headers = dict(scope.get("headers") or [])
+                HTTP_DURATION.labels(method, route, str(response["status"])).observe(time.perf_counter() - started)
+                HTTP_REQUEST_BYTES.labels(method, route).observe(int(headers.get(b"content-length", 0) or 0))
+                HTTP_RESPONSE_BYTES.labels(method, route).observe(response["bytes"])
+                _observe_documents(HTTP_DOCUMENTS, route, usage)
+
+def metrics_payload() -> tuple:
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# Firestore usage is counted at the client seam: db_tools.db, async_db_tools.adb() and
+# the utils.firestore_utils client helpers hand out clients wrapped by counted_client, and every
+# collection, document, query, batch and transaction reached from them is wrapped the same way.
+# Only public client methods are intercepted; nothing in google-cloud-firestore is patched.
+_firestore_counting = False
+_COUNTED_TYPES = (
+    firestore.CollectionReference, firestore.AsyncCollectionReference, firestore.CollectionGroup,
+    firestore.DocumentReference, firestore.AsyncDocumentReference, firestore.Query, firestore.AsyncQuery,
+    firestore.WriteBatch, firestore.AsyncWriteBatch, firestore.Transaction, firestore.AsyncTransaction,
+)
+# Calls that queue or perform one write (counted when made, so a failed commit still counts).
+_WRITE_METHODS = {"set", "update", "delete", "create", "add"}
+
+def instrument_firestore():
+    """Start counting Firestore reads, queries and writes made through counted clients into the open
+    usage scopes. Called once at startup by the service entry points."""
+    global _firestore_counting
+    _firestore_counting = True
+
+def _unwrap(value):
+    if isinstance(value, CountedFirestore):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+def _wrap(value):
+    return CountedFirestore(value) if isinstance(value, _COUNTED_TYPES) else value
+
+def _count_stream(stream, at_least_one: bool):
+    """One query, and one read per document (at least one for queries, as Firestore bills)."""
+    record_queries()
+    if hasattr(stream, "__aiter__"):
+        async def counted_async():
+            found = 0
+            try:
+                async for item in stream:
+                    if isinstance(item, firestore.DocumentSnapshot):
+                        found += 1
+                    yield item
+            finally:
+                record_reads(max(found, 1) if at_least_one else found)
+        return counted_async()
+
+    def counted():
+        found = 0
+        try:
+            for item in stream:
+                if isinstance(item, firestore.DocumentSnapshot):
+                    found += 1
+                yield item
+        finally:
+            record_reads(max(found, 1) if at_least_one else found)
+    return counted()
+
+def _record_get(result):
+    # Transaction.get yields the snapshots of a document or query, so it is counted like a stream.
+    if hasattr(result, "__next__") or hasattr(result, "__anext__"):
+        return _count_stream(result, at_least_one=True)
+    record_queries()
+    record_reads(max(len(result), 1) if isinstance(result, list) else 1)
+    return result
+
+def _count_get(result):
+    if inspect.isawaitable(result):
+        async def counted():
+            return _record_get(await result)
+        return counted()
+    return _record_get(result)
+
+class CountedFirestore:
+    """Proxy for a Firestore client or one of the objects reached from it, counting the usage of
+    stream, get, get_all and write calls once instrument_firestore() has run."""
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*_unwrap(args), **{key: _unwrap(value) for key, value in kwargs.items()})
+            if _firestore_counting:
+                if name in ("stream", "get_all"):
+                    return _count_stream(result, at_least_one=name == "stream")
+                if name == "get":
+                    return _count_get(result)
+                if name in _WRITE_METHODS:
+                    record_writes()
+            return _wrap(result)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"CountedFirestore({self._target!r})"
+
+def counted_client(client):
+    """Wrap a firestore.Client or AsyncClient so its usage is counted (see instrument_firestore)."""
+    return CountedFirestore(client)
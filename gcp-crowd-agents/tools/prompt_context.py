@@ -0,0 +1,125 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+from config import PROMPT_CONTEXT_BUDGETS
+from tools.llm_tracing import note_prompt_context
+from tools.zone_staffing import CLOSED_STATUSES, capacity, severity
+
+# Rough size of a Gemini token in characters, used for the section budgets.
+CHARS_PER_TOKEN = 4
+MAX_CELL_CHARS = 100
+_WHITESPACE = re.compile(r"\s+")
+
+# Fields each collection contributes to prompts, in column order. Anything else is left out.
+INCIDENT_COLUMNS = ["id", "type", "status", "priority", "severity", "zoneId", "zone", "notes", "timestamp"]
+ZONE_COLUMNS = ["id", "name", "risk", "currentOccupancy", "capacity", "maxOccupancy", "status"]
+RESPONDER_COLUMNS = ["id", "name", "type", "status", "zoneId", "assignedIncident"]
+ALERT_COLUMNS = ["id", "alertType", "type", "zoneId", "message", "timestamp"]
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+DEFAULT_BUDGETS = _parse_budgets(PROMPT_CONTEXT_BUDGETS)
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _cell(value: Any) -> str:
+    if value is None or value == "" or value == [] or value == {}:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, (list, tuple)):
+        text = ",".join(_cell(v) for v in value)
+    elif isinstance(value, dict):
+        text = json.dumps({k: v for k, v in value.items() if v not in (None, "", [], {})}, separators=(',', ':'), default=str)
+    else:
+        text = str(value)
+    text = _WHITESPACE.sub(" ", text).replace("|", "/").strip()
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 3] + "..."
+
+def render_table(title: str, rows: List[Dict], columns: List[str], budget_tokens: int) -> str:
+    """rows (already in priority order) as a pipe-separated table under title, cut off at budget_tokens.
+    Columns that are empty in every row shown are dropped; the header says how many rows were left out."""
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    shown: List[List[str]] = []
+    used = 0
+    for row in rows:
+        cells = [_cell(row.get(column)) for column in columns]
+        size = sum(len(c) for c in cells) + len(cells)
+        if shown and used + size > budget_chars:
+            break
+        shown.append(cells)
+        used += size
+    keep = [i for i in range(len(columns)) if any(cells[i] for cells in shown)]
+    count = f"{len(shown)} of {len(rows)}" if len(shown) < len(rows) else str(len(rows))
+    lines = [f"{title} ({count}):"]
+    if shown:
+        lines.append("|".join(columns[i] for i in keep))
+        lines.extend("|".join(cells[i] for i in keep) for cells in shown)
+    return "\n".join(lines)
+
+def _timestamp_key(row: Dict) -> str:
+    return str(row.get("timestamp") or row.get("createdAt") or "")
+
+def _newest_first(rows: List[Dict]) -> List[Dict]:
+    return sorted(rows, key=_timestamp_key, reverse=True)
+
+def _is_open(incident: Dict) -> bool:
+    return str(incident.get("status", "")).lower() not in CLOSED_STATUSES
+
+def order_incidents(incidents: List[Dict]) -> List[Dict]:
+    """Open before closed, then most severe, then newest."""
+    return sorted(_newest_first(incidents), key=lambda i: (not _is_open(i), -severity(i)))
+
+def order_zones(zones: List[Dict], incidents: List[Dict]) -> List[Dict]:
+    """Zones with the most open incidents first, then the most crowded."""
+    open_by_zone: Dict[str, int] = {}
+    for incident in incidents:
+        if _is_open(incident):
+            zone_id = incident.get("zoneId") or incident.get("zone")
+            open_by_zone[zone_id] = open_by_zone.get(zone_id, 0) + 1
+
+    def key(zone):
+        occupancy, max_occupancy = capacity(zone)
+        numeric = isinstance(occupancy, (int, float)) and isinstance(max_occupancy, (int, float))
+        ratio = occupancy / max_occupancy if numeric and max_occupancy > 0 else 0
+        return -max(open_by_zone.get(zone.get("id"), 0), open_by_zone.get(zone.get("name"), 0)), -ratio
+
+    return sorted(zones, key=key)
+
+def order_responders(responders: List[Dict]) -> List[Dict]:
+    """Available responders first, grouped by type."""
+    return sorted(responders, key=lambda r: (str(r.get("status", "")).lower() != "available", str(r.get("type", "")), str(r.get("name", ""))))
+
+# (snapshot key, title, columns, ordering) of each section, in prompt order.
+SECTIONS: List[tuple] = [
+    ("incidents", "Incidents, most urgent first", INCIDENT_COLUMNS, lambda s: order_incidents(s.get("incidents", []))),
+    ("zones", "Zones, busiest first", ZONE_COLUMNS, lambda s: order_zones(s.get("zones", []), s.get("incidents", []))),
+    ("responders", "Responders, available first", RESPONDER_COLUMNS, lambda s: order_responders(s.get("responders", []))),
+    ("alerts", "Alerts, newest first", ALERT_COLUMNS, lambda s: _newest_first(s.get("alerts", []))),
+]
+
+def render_snapshot(snapshot: Dict[str, Any], budgets: Optional[Dict[str, int]] = None) -> str:
+    """fetch_snapshot() as compact tables for a prompt: selected fields only, nulls dropped,
+    most relevant rows first and each section held to its token budget (PROMPT_CONTEXT_BUDGETS).
+    The sizes before (the sections as JSON) and after are attached to the LLM span whose prompt contains the text."""
+    budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+    parts = []
+    if snapshot.get("taken_at"):
+        parts.append(f"Snapshot taken at {snapshot['taken_at']}")
+    before = 0
+    for key, title, columns, order in SECTIONS:
+        rows = snapshot.get(key)
+        if rows is None:
+            continue
+        before += len(json.dumps(rows, separators=(',', ':'), default=str))
+        parts.append(render_table(title, order(snapshot), columns, budgets.get(key, 500)))
+    text = "\n\n".join(parts)
+    note_prompt_context(text, before)
+    return text
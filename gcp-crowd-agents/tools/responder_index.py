@@ -0,0 +1,185 @@
+import threading
+from typing import Dict, List, Optional
+from tools.entity_cache import entity_cache
+
+def _type_key(responder_type: Optional[str]) -> str:
+    return (responder_type or "unknown").strip().lower()
+
+class ResponderAvailabilityIndex:
+    """Materialized view of available responders, bucketed by responder type, zone and both.
+
+    Fed by change listeners on the cached 'responders' and
+    'responder_status_updates' collections, plus write-through updates from the
+    assignment tools so a freshly assigned responder is never picked twice.
+    Buckets are insertion-ordered dicts used as ordered sets, so picking,
+    counting and membership updates are constant-time. Assigned responders are
+    tallied per zone and per incident alongside, for staffing calculations and
+    the dispatch optimizer.
+    """
+
+    def __init__(self, cache=entity_cache):
+        self._cache = cache
+        self._lock = threading.RLock()
+        self._responders: Dict[str, Dict] = {}
+        self._statuses: Dict[str, Dict] = {}
+        self._placement: Dict[str, tuple] = {}  # responder id -> (type key, zone id) of its buckets
+        self._available: Dict[str, None] = {}
+        self._by_type: Dict[str, Dict[str, None]] = {}
+        self._by_zone: Dict[str, Dict[str, None]] = {}
+        self._by_type_zone: Dict[tuple, Dict[str, None]] = {}
+        self._assigned_zone: Dict[str, str] = {}  # responder id -> zone it is assigned to
+        self._assigned_by_zone: Dict[str, int] = {}
+        self._assigned_incident: Dict[str, str] = {}  # responder id -> incident it is assigned to
+        self._assigned_by_incident: Dict[str, int] = {}
+        self._started = False
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._cache.collection('responders').add_listener(self._on_responders)
+        self._cache.collection('responder_status_updates').add_listener(self._on_statuses)
+
+    def _ensure_fresh(self, reload: bool = True):
+        self._start()
+        if reload:
+            self._cache.collection('responders').ensure_fresh()
+            self._cache.collection('responder_status_updates').ensure_fresh()
+
+    async def ensure_fresh_async(self, async_client):
+        """Reload stale source collections through an AsyncClient. Reads that follow pass reload=False,
+        so they stay in-memory even if the mirror went stale during a later await."""
+        self._start()
+        await self._cache.ensure_fresh_async(async_client, 'responders', 'responder_status_updates')
+
+    def _on_responders(self, changed: Dict[str, Optional[Dict]]):
+        with self._lock:
+            for responder_id, data in changed.items():
+                if data is None:
+                    self._responders.pop(responder_id, None)
+                else:
+                    self._responders[responder_id] = data
+                self._reindex(responder_id)
+
+    def _on_statuses(self, changed: Dict[str, Optional[Dict]]):
+        with self._lock:
+            for doc_id, data in changed.items():
+                # Only responder_status_updates/{responder_id} holds a responder's latest status;
+                # auto-id documents in the collection are standalone events.
+                if data is None:
+                    if self._statuses.pop(doc_id, None) is not None:
+                        self._reindex(doc_id)
+                elif data.get('responderId', doc_id) == doc_id:
+                    self._statuses[doc_id] = data
+                    self._reindex(doc_id)
+
+    def apply_status(self, responder_id: str, status_update: Dict):
+        """Write-through for a status update that was just committed to Firestore."""
+        with self._lock:
+            self._statuses[responder_id] = status_update
+            self._reindex(responder_id)
+
+    def _unplace(self, responder_id: str):
+        assigned_zone = self._assigned_zone.pop(responder_id, None)
+        if assigned_zone is not None:
+            self._assigned_by_zone[assigned_zone] -= 1
+        assigned_incident = self._assigned_incident.pop(responder_id, None)
+        if assigned_incident is not None:
+            if self._assigned_by_incident[assigned_incident] == 1:
+                del self._assigned_by_incident[assigned_incident]
+            else:
+                self._assigned_by_incident[assigned_incident] -= 1
+        placement = self._placement.pop(responder_id, None)
+        if placement is None:
+            return
+        type_key, zone_id = placement
+        self._available.pop(responder_id, None)
+        self._by_type.get(type_key, {}).pop(responder_id, None)
+        if zone_id is not None:
+            self._by_zone.get(zone_id, {}).pop(responder_id, None)
+            self._by_type_zone.get(placement, {}).pop(responder_id, None)
+
+    def _reindex(self, responder_id: str):
+        self._unplace(responder_id)
+        latest = self._statuses.get(responder_id) or {}
+        incident_id = latest.get('incidentId')
+        if latest.get('status') == 'assigned' and incident_id:
+            self._assigned_incident[responder_id] = incident_id
+            self._assigned_by_incident[incident_id] = self._assigned_by_incident.get(incident_id, 0) + 1
+        responder = self._responders.get(responder_id)
+        if responder is None:
+            return
+        status = latest.get('status') or responder.get('status', 'available')
+        zone_id = latest.get('zoneId') or responder.get('zoneId')
+        if status == 'assigned' and zone_id is not None:
+            self._assigned_zone[responder_id] = zone_id
+            self._assigned_by_zone[zone_id] = self._assigned_by_zone.get(zone_id, 0) + 1
+        if status != 'available':
+            return
+        type_key = _type_key(responder.get('type'))
+        self._placement[responder_id] = (type_key, zone_id)
+        self._available[responder_id] = None
+        self._by_type.setdefault(type_key, {})[responder_id] = None
+        if zone_id is not None:
+            self._by_zone.setdefault(zone_id, {})[responder_id] = None
+            self._by_type_zone.setdefault((type_key, zone_id), {})[responder_id] = None
+
+    def _bucket(self, responder_type: Optional[str], zone_id: Optional[str]) -> Dict[str, None]:
+        if responder_type is not None and zone_id is not None:
+            return self._by_type_zone.get((_type_key(responder_type), zone_id), {})
+        if responder_type is not None:
+            return self._by_type.get(_type_key(responder_type), {})
+        if zone_id is not None:
+            return self._by_zone.get(zone_id, {})
+        return self._available
+
+    def pick(self, responder_type: Optional[str] = None, zone_id: Optional[str] = None, exclude: Optional[set] = None, reload: bool = True) -> Optional[Dict]:
+        """Return one available responder matching the filters and not in exclude, or None."""
+        self._ensure_fresh(reload)
+        with self._lock:
+            bucket = self._bucket(responder_type, zone_id)
+            responder_id = next((rid for rid in bucket if not exclude or rid not in exclude), None)
+            return dict(self._responders[responder_id], status='available') if responder_id else None
+
+    def is_available(self, responder_id: str, reload: bool = True) -> bool:
+        """Whether the responder exists and is currently available."""
+        self._ensure_fresh(reload)
+        with self._lock:
+            return responder_id in self._available
+
+    def count(self, responder_type: Optional[str] = None, zone_id: Optional[str] = None, reload: bool = True) -> int:
+        self._ensure_fresh(reload)
+        with self._lock:
+            return len(self._bucket(responder_type, zone_id))
+
+    def list_available(self, responder_type: Optional[str] = None, zone_id: Optional[str] = None, reload: bool = True) -> List[Dict]:
+        self._ensure_fresh(reload)
+        with self._lock:
+            return [
+                dict(self._responders[rid], status='available', last_status_event=self._statuses.get(rid, {}))
+                for rid in self._bucket(responder_type, zone_id)
+            ]
+
+    def counts_by_type(self, reload: bool = True) -> Dict[str, int]:
+        self._ensure_fresh(reload)
+        with self._lock:
+            return {type_key: len(bucket) for type_key, bucket in self._by_type.items() if bucket}
+
+    def counts_by_zone(self, reload: bool = True) -> Dict[str, int]:
+        self._ensure_fresh(reload)
+        with self._lock:
+            return {zone_id: len(bucket) for zone_id, bucket in self._by_zone.items() if bucket}
+
+    def assigned_counts_by_zone(self, reload: bool = True) -> Dict[str, int]:
+        self._ensure_fresh(reload)
+        with self._lock:
+            return {zone_id: count for zone_id, count in self._assigned_by_zone.items() if count}
+
+    def assigned_incident_ids(self, reload: bool = True) -> set:
+        """Ids of incidents that currently have at least one responder assigned."""
+        self._ensure_fresh(reload)
+        with self._lock:
+            return set(self._assigned_by_incident)
+
+responder_index = ResponderAvailabilityIndex()
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from config import COMMAND_CACHE_TTL_SECONDS, COMMAND_CACHE_MAX_ENTRIES
+
+def data_digest(data: Any) -> str:
+    """SHA-256 of the data as it is fed to the model, independent of dict key order."""
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """LRU cache of LLM results keyed by (prompt template, digest of the data in the prompt).
+
+    Every entry remembers the data version it was computed at (e.g. the entity cache
+    collection versions) and is dropped on lookup once that version has moved on, even if
+    the part of the data in the prompt is unchanged. Entries also expire after ttl_seconds,
+    and the least recently used entry is evicted beyond max_entries.
+    """
+
+    def __init__(self, ttl_seconds: float = COMMAND_CACHE_TTL_SECONDS, max_entries: int = COMMAND_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evicted = 0
+        self._entries: "OrderedDict[Tuple, Tuple[Any, Hashable, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(template: str, data: Any) -> Tuple[str, str]:
+        return template, data_digest(data)
+
+    def get(self, key: Tuple, version: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, entry_version, expires_at = entry
+            if entry_version != version or time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.invalidated += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, version: Hashable, value: Any):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "evicted": self.evicted,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
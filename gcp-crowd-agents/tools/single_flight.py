@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from config import LLM_SINGLE_FLIGHT
+from tools import metrics
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 over the parts of a request (model, session, prompt...), used as the single-flight key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one.
+
+    The first caller for a key (the leader) makes the call; callers arriving with the same key
+    while it is in flight wait for it and get the same result or exception. Nothing is kept once
+    the call finishes, so this only dedupes bursts; ResponseCache is what keeps answers around.
+    """
+
+    def __init__(self, layer: str, enabled: bool = LLM_SINGLE_FLIGHT):
+        self.layer = layer
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        if not self.enabled:
+            return func(*args)
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            metrics.observe_single_flight(self.layer, "coalesced")
+            return future.result()
+        metrics.observe_single_flight(self.layer, "leader")
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    async def do_async(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        if not self.enabled:
+            return await func(*args)
+        task = self._tasks.get(key)
+        if task is None:
+            metrics.observe_single_flight(self.layer, "leader")
+            # A task rather than the leader's own await, so a leader that disconnects does not cancel the
+            # call for everyone waiting on it. It runs in the leader's context (agent label, usage scope).
+            task = self._tasks[key] = asyncio.ensure_future(func(*args))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            metrics.observe_single_flight(self.layer, "coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._tasks)
@@ -1,8 +1,8 @@
 from google.adk.tools import FunctionTool
-from .db_tools import (
+from .async_db_tools import (
     fetch_incidents, get_active_incidents, fetch_zones, fetch_responders, get_available_responders,
-    fetch_alerts, analyze_responder_assignments, assign_responder_to_incident, assign_any_responder_to_incident,
-    assign_responder_to_zone, assign_any_responder_to_zone, notify_unavailable, suggest_zones_needing_responders,
+    fetch_alerts, count_available_responders, analyze_responder_assignments, assign_responder_to_incident, assign_any_responder_to_incident,
+    assign_responder_to_zone, assign_any_responder_to_zone, assign_responders_bulk, optimize_responder_assignments, notify_unavailable, suggest_zones_needing_responders,
     get_incidents_for_responder, get_incidents_details_for_responder
 )
 import logging
@@ -37,6 +37,10 @@ class GetAvailableRespondersTool(FunctionTool):
     def __init__(self):
         super().__init__(func=get_available_responders)
 
+class CountAvailableRespondersTool(FunctionTool):
+    def __init__(self):
+        super().__init__(func=count_available_responders)
+
 class FetchAlertsTool(FunctionTool):
     def __init__(self):
         super().__init__(func=fetch_alerts)
@@ -61,6 +65,14 @@ class AssignAnyResponderToZoneTool(FunctionTool):
     def __init__(self):
         super().__init__(func=assign_any_responder_to_zone)
 
+class AssignRespondersBulkTool(FunctionTool):
+    def __init__(self):
+        super().__init__(func=assign_responders_bulk)
+
+class OptimizeResponderAssignmentsTool(FunctionTool):
+    def __init__(self):
+        super().__init__(func=optimize_responder_assignments)
+
 class NotifyUnavailableTool(FunctionTool):
     def __init__(self):
         super().__init__(func=notify_unavailable)
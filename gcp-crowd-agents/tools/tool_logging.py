@@ -1,25 +1,213 @@
 from functools import wraps
 from google.cloud import firestore
+from typing import Any, Dict, List, Optional
+from config import (
+    TOOL_LOG_QUEUE_SIZE, TOOL_LOG_BATCH_SIZE, TOOL_LOG_FLUSH_INTERVAL_SECONDS, TOOL_LOG_SAMPLE_RATE,
+    TOOL_LOG_MAX_RESULT_CHARS
+)
+from tools import metrics
+import atexit
+import hashlib
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
 import time
 
-db = firestore.Client()
+logger = logging.getLogger(__name__)
+
+# A Firestore WriteBatch holds at most 500 writes.
+MAX_BATCH_WRITES = 500
+
+def encode_result(result: Any) -> str:
+    try:
+        return json.dumps(result, default=str, sort_keys=True)
+    except (TypeError, ValueError):
+        return str(result)
+
+def summarize_result(result: Any, max_chars: int = TOOL_LOG_MAX_RESULT_CHARS, encoded: Optional[str] = None) -> Any:
+    """Keep small results as they are; replace large ones with their size, a SHA-256 and a preview."""
+    if encoded is None:
+        encoded = encode_result(result)
+    if len(encoded) <= max_chars:
+        return result
+    summary = {
+        "truncated": True,
+        "chars": len(encoded),
+        "sha256": hashlib.sha256(encoded.encode("utf-8")).hexdigest(),
+        "preview": encoded[:max_chars],
+    }
+    if isinstance(result, (list, dict)):
+        summary["items"] = len(result)
+    return summary
+
+class ToolCallLogSink:
+    """Bounded in-memory queue of tool call log entries, drained by a background thread into tool_call_logs.
+
+    Entries are committed in WriteBatches of up to batch_size writes, at least every
+    flush_interval seconds. record() never blocks: when the queue is full the entry is
+    dropped and counted. sample_rate < 1 logs only that fraction of calls.
+    """
+
+    def __init__(self, client=None, maxsize: int = TOOL_LOG_QUEUE_SIZE, batch_size: int = TOOL_LOG_BATCH_SIZE,
+                 flush_interval: float = TOOL_LOG_FLUSH_INTERVAL_SECONDS, sample_rate: float = TOOL_LOG_SAMPLE_RATE):
+        self.client = client or firestore.Client()
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tool-call-log-writer", daemon=True)
+                self._thread.start()
+
+    def sampled(self) -> bool:
+        """Decide whether to log this call; check it before building the entry so skipped calls cost nothing."""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+        return True
+
+    def record(self, entry: Dict) -> bool:
+        """Queue an entry for writing without blocking; returns False if the queue is full and it was dropped."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def _next_batch(self) -> List[Dict]:
+        entries = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(entries) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                entries.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return entries
+
+    def _commit(self, entries: List[Dict]):
+        batch = self.client.batch()
+        collection = self.client.collection('tool_call_logs')
+        for entry in entries:
+            batch.set(collection.document(), entry)
+        try:
+            batch.commit()
+            self.written += len(entries)
+        except Exception as e:
+            self.failed += len(entries)
+            logger.error(f"[ToolCallLogSink] Failed to write {len(entries)} tool call logs: {e}")
+        finally:
+            for _ in entries:
+                self._queue.task_done()
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            entries = self._next_batch()
+            if entries:
+                self._commit(entries)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until everything queued so far has been written (or failed)."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.05)
+
+    def close(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "written": self.written,
+            "failed": self.failed,
+            "sample_rate": self.sample_rate,
+        }
+
+tool_log_sink = ToolCallLogSink()
+atexit.register(tool_log_sink.close)
+
+def _log_entry(tool_name, args, kwargs, result, duration_ms, encoded=None):
+    # Try to extract session_id or incident_id for context
+    session_id = kwargs.get('session_id') or kwargs.get('incident_id') or 'unknown'
+    return {
+        "tool": tool_name,
+        "args": str(args),
+        "kwargs": summarize_result(kwargs),
+        "result": summarize_result(result, encoded=encoded),
+        "duration_ms": round(duration_ms, 2),
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        "session_id": session_id
+    }
+
+def _record(tool_name, args, kwargs, result, seconds, usage):
+    # Serializing the result is the expensive part, so only sampled calls pay for it;
+    # the result size histogram is fed from the same sample.
+    if not tool_log_sink.sampled():
+        metrics.observe_tool(tool_name, seconds, usage)
+        return
+    encoded = encode_result(result)
+    metrics.observe_tool(tool_name, seconds, usage, result_bytes=len(encoded))
+    entry = _log_entry(tool_name, args, kwargs, result, seconds * 1000, encoded)
+    if tool_log_sink.record(entry):
+        print(f"[TOOL LOG] {tool_name} called with args={args}, kwargs={kwargs}, result={str(entry['result'])[:200]}")
 
 def log_tool_call(tool_name):
+    """Log every call of the decorated tool to tool_call_logs through the background sink, and record its
+    latency and Firestore document counts (and, for sampled calls, result size) in the Prometheus metrics.
+    Works for plain and coroutine functions; the tool never waits on the log write."""
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                with metrics.usage_scope() as usage:
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception:
+                        metrics.observe_tool(tool_name, time.perf_counter() - started, usage, "error")
+                        raise
+                _record(tool_name, args, kwargs, result, time.perf_counter() - started, usage)
+                return result
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            result = func(*args, **kwargs)
-            # Try to extract session_id or incident_id for context
-            session_id = kwargs.get('session_id') or kwargs.get('incident_id') or 'unknown'
-            db.collection('tool_call_logs').add({
-                "tool": tool_name,
-                "args": str(args),
-                "kwargs": kwargs,
-                "result": result,
-                "timestamp": firestore.SERVER_TIMESTAMP,
-                "session_id": session_id
-            })
-            print(f"[TOOL LOG] {tool_name} called with args={args}, kwargs={kwargs}, result={result}")
+            started = time.perf_counter()
+            with metrics.usage_scope() as usage:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:
+                    metrics.observe_tool(tool_name, time.perf_counter() - started, usage, "error")
+                    raise
+            _record(tool_name, args, kwargs, result, time.perf_counter() - started, usage)
             return result
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
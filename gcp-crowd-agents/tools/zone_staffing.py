@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+# Incident statuses that no longer need responders.
+CLOSED_STATUSES = {"close", "closed", "resolved"}
+# Fallback severity (1-5) for incidents that only carry a priority.
+PRIORITY_SEVERITY = {"low": 1, "medium": 2, "high": 3, "critical": 5}
+# Staffing model: one responder per active incident, one more per SEVERITY_PER_RESPONDER
+# severity points in the zone, and one per CROWD_PER_RESPONDER people above
+# OCCUPANCY_THRESHOLD of capacity.
+SEVERITY_PER_RESPONDER = 5
+CROWD_PER_RESPONDER = 250
+OCCUPANCY_THRESHOLD = 0.8
+
+TABLE_COLUMNS = ["zone_id", "name", "active_incidents", "max_severity", "occupancy_ratio", "assigned", "required", "deficit"]
+
+def severity(incident: Dict) -> float:
+    """Incident severity (1-5), falling back to PRIORITY_SEVERITY for incidents that only carry a priority."""
+    value = incident.get("severity")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float(PRIORITY_SEVERITY.get(str(incident.get("priority", "")).lower(), 1))
+
+def capacity(zone: Dict) -> tuple:
+    """(current occupancy, max occupancy) from either the nested capacity map or the flat zone fields."""
+    value = zone.get("capacity")
+    if isinstance(value, dict):
+        return value.get("currentOccupancy") or 0, value.get("maxOccupancy") or 0
+    return zone.get("currentOccupancy") or 0, value or zone.get("maxOccupancy") or 0
+
+def compute_staffing(zones: List[Dict], incidents: List[Dict], assigned_by_zone: Dict[str, int]) -> Dict[str, Any]:
+    """Compute per-zone staffing arrays in one vectorized pass.
+    Incidents are matched to zones by zoneId, or by zone name for incidents that only carry 'zone'."""
+    zone_ids = [z["id"] for z in zones]
+    position = {zone_id: i for i, zone_id in enumerate(zone_ids)}
+    position.update({z["name"]: i for i, z in enumerate(zones) if z.get("name") and z["name"] not in position})
+    n = len(zone_ids)
+
+    active = [i for i in incidents if str(i.get("status", "")).lower() not in CLOSED_STATUSES]
+    located = [(position.get(i.get("zoneId"), position.get(i.get("zone"), -1)), severity(i)) for i in active]
+    located = [(idx, sev) for idx, sev in located if idx >= 0]
+    incident_zone = np.fromiter((idx for idx, _ in located), dtype=np.int64, count=len(located))
+    incident_severity = np.fromiter((sev for _, sev in located), dtype=np.float64, count=len(located))
+
+    active_count = np.bincount(incident_zone, minlength=n)
+    severity_sum = np.bincount(incident_zone, weights=incident_severity, minlength=n)
+    max_severity = np.zeros(n)
+    np.maximum.at(max_severity, incident_zone, incident_severity)
+
+    occupancy_pairs = np.array([capacity(z) for z in zones], dtype=np.float64).reshape(n, 2)
+    occupancy, max_occupancy = occupancy_pairs[:, 0], occupancy_pairs[:, 1]
+    occupancy_ratio = np.divide(occupancy, max_occupancy, out=np.zeros(n), where=max_occupancy > 0)
+    overcrowd = np.maximum(occupancy - OCCUPANCY_THRESHOLD * max_occupancy, 0) * (max_occupancy > 0)
+
+    assigned = np.fromiter((assigned_by_zone.get(zone_id, 0) for zone_id in zone_ids), dtype=np.int64, count=n)
+    required = (
+        active_count
+        + np.floor(severity_sum / SEVERITY_PER_RESPONDER).astype(np.int64)
+        + np.ceil(overcrowd / CROWD_PER_RESPONDER).astype(np.int64)
+    )
+    deficit = np.maximum(required - assigned, 0)
+    # Biggest deficit first, then highest severity, then most crowded.
+    order = np.lexsort((-occupancy_ratio, -max_severity, -deficit))
+    return {
+        "zone_ids": zone_ids,
+        "names": [z.get("name", z["id"]) for z in zones],
+        "active_incidents": active_count,
+        "max_severity": max_severity,
+        "occupancy_ratio": occupancy_ratio,
+        "assigned": assigned,
+        "required": required,
+        "deficit": deficit,
+        "order": order,
+    }
+
+def ranked_deficit_table(staffing: Dict[str, Any], limit: Optional[int] = None) -> Dict[str, Any]:
+    """Compact ranked table of zones with a responder deficit, suitable for handing to the LLM."""
+    order = staffing["order"][staffing["deficit"][staffing["order"]] > 0]
+    if limit:
+        order = order[:limit]
+    rows = [
+        [
+            staffing["zone_ids"][i],
+            staffing["names"][i],
+            int(staffing["active_incidents"][i]),
+            float(staffing["max_severity"][i]),
+            round(float(staffing["occupancy_ratio"][i]), 2),
+            int(staffing["assigned"][i]),
+            int(staffing["required"][i]),
+            int(staffing["deficit"][i]),
+        ]
+        for i in order
+    ]
+    return {"columns": TABLE_COLUMNS, "rows": rows, "total_deficit": int(staffing["deficit"].sum())}
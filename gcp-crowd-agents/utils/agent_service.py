@@ -4,23 +4,32 @@ import time
 import logging
 import re
 import asyncio
-from typing import Dict, Any
+from typing import AsyncGenerator, Dict, Any
 from google.adk.agents import LlmAgent
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import InMemorySessionService, Runner
 from google.adk.events import Event, EventActions
 from google.genai.types import Content, Part
+from tools.llm_scheduler import llm_scheduler
+from tools.llm_tracing import llm_span
+from tools.single_flight import SingleFlight, fingerprint
+from utils.log_policy import get_logger, lazy, lazy_text
 from tools.tool_classes import (
     FetchIncidentsTool,
     GetActiveIncidentsTool,
     FetchZonesTool,
     FetchRespondersTool,
     GetAvailableRespondersTool,
+    CountAvailableRespondersTool,
     FetchAlertsTool,
     AnalyzeResponderAssignmentsTool,
     AssignResponderToIncidentTool,
     AssignAnyResponderToIncidentTool,
     AssignResponderToZoneTool,
     AssignAnyResponderToZoneTool,
+    AssignRespondersBulkTool,
+    OptimizeResponderAssignmentsTool,
     NotifyUnavailableTool,
     SuggestZonesNeedingRespondersTool,
     GetIncidentsForResponderTool,
@@ -31,11 +40,22 @@ from tools.tool_classes import (
 handler = logging.StreamHandler()
 formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s', '%Y-%m-%d %H:%M:%S')
 handler.setFormatter(formatter)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger = get_logger(__name__)
 if not logger.hasHandlers():
     logger.addHandler(handler)
 
+class ScheduledGemini(Gemini):
+    """Gemini for the LlmAgent with every model turn taking its own llm_scheduler slot.
+
+    One agent run makes a model call per tool-use turn; scheduling each call (not the whole run)
+    charges the token bucket once per Vertex request and frees the slot while tools execute.
+    """
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        async with llm_scheduler.async_slot(self.model):
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+
 class AgentService:
     """Singleton class to manage shared LlmAgent, Runner, and InMemorySessionService."""
     _instance = None
@@ -51,6 +71,7 @@ class AgentService:
         self.session_service = InMemorySessionService()
         self.app_name = "gcp_crowd_agents"
         self.user_id = "default_user"
+        self._flight = SingleFlight("agent_run")
 
         # All tools
         tool_objects = [
@@ -59,12 +80,15 @@ class AgentService:
             FetchZonesTool(),
             FetchRespondersTool(),
             GetAvailableRespondersTool(),
+            CountAvailableRespondersTool(),
             FetchAlertsTool(),
             AnalyzeResponderAssignmentsTool(),
             AssignResponderToIncidentTool(),
             AssignAnyResponderToIncidentTool(),
             AssignResponderToZoneTool(),
             AssignAnyResponderToZoneTool(),
+            AssignRespondersBulkTool(),
+            OptimizeResponderAssignmentsTool(),
             NotifyUnavailableTool(),
             SuggestZonesNeedingRespondersTool(),
             GetIncidentsForResponderTool(),
@@ -73,12 +97,13 @@ class AgentService:
         logger.info(f"Registered tool objects: {[tool.__class__.__name__ for tool in tool_objects]}")
 
         model_name = os.getenv("VERTEX_MODEL", "gemini-1.5-pro")
+        self.model_name = model_name
         agent_name = os.getenv("AGENT_NAME", "crowd_agent")
         logger.info(f"Initializing LlmAgent with model: {model_name}, name: {agent_name}")
 
         try:
             self.llm_agent = LlmAgent(
-                model=model_name,
+                model=ScheduledGemini(model=model_name),
                 name=agent_name,
                 instruction=(
                     "You are an event safety AI assistant. Use the following tools to handle user queries:\n"
@@ -86,21 +111,27 @@ class AgentService:
                     "- get_active_incidents: Fetch only active incidents.\n"
                     "- fetch_zones: Fetch all zones from Firestore.\n"
                     "- fetch_responders: Fetch all responders from Firestore.\n"
-                    "- get_available_responders: Fetch only available responders.\n"
+                    "- get_available_responders(responder_type: str = None): Fetch only available responders, optionally of one type.\n"
+                    "- count_available_responders(responder_type: str = None, zone_id: str = None): Count available responders, with a per-type breakdown.\n"
                     "- fetch_alerts: Fetch all alerts from Firestore.\n"
                     "- analyze_responder_assignments: Analyze available responders and their incident assignments.\n"
                     "- assign_responder_to_incident(incident_id: str): Assign a specific responder to an incident.\n"
                     "- assign_any_responder_to_incident(incident_id: str): Assign any available responder to an incident.\n"
                     "- assign_responder_to_zone(responder_id: str, zone_id: str): Assign a specific responder to a zone.\n"
                     "- assign_any_responder_to_zone(zone_id: str): Assign any available responder to a zone.\n"
+                    "- assign_responders_bulk(assignments: list): Assign many responders in one batch; each item has incident_id or zone_id, and optionally responder_id and responder_type.\n"
+                    "- optimize_responder_assignments(commit: bool = True): Match all open, unstaffed incidents to available responders in one optimal pass (distance, type fit, workload, severity).\n"
                     "- notify_unavailable(zone_id: str): Log an alert for unavailable responders in a zone.\n"
-                    "- suggest_zones_needing_responders: Suggest zones or incidents that need more responders.\n"
+                    "- suggest_zones_needing_responders(limit: int = 20): Rank zones by responder deficit; returns a table of zone_id, name, active_incidents, max_severity, occupancy_ratio, assigned, required and deficit.\n"
                     "- get_incidents_for_responder(responder_id: str): Fetch all incidents for a given responder.\n"
                     "- get_incidents_details_for_responder(responder_id: str): Fetch full incident details for a given responder.\n"
                     "Instructions:\n"
                     "- If the user asks to assign a responder but does not specify which one, use the 'assign_any_responder_to_incident' or 'assign_any_responder_to_zone' tool.\n"
+                    "- If the user asks to assign responders to several incidents or zones at once, use 'assign_responders_bulk'.\n"
+                    "- If the user asks to dispatch responders to all open incidents or to rebalance assignments, use 'optimize_responder_assignments' (commit=false to only preview the plan).\n"
                     "- If the user asks where more responders are needed, use 'suggest_zones_needing_responders'.\n"
                     "- If the user asks for only active incidents or available responders, use 'get_active_incidents' or 'get_available_responders'.\n"
+                    "- If the user asks how many responders are available, use 'count_available_responders'.\n"
                     "- If the user asks for incidents assigned to a specific responder, use 'get_incidents_for_responder'.\n"
                     "- If the user asks for full incident details for a specific responder, use 'get_incidents_details_for_responder'.\n"
                     "- If a tool returns an error, return the 'error_message' as the response.\n"
@@ -167,7 +198,7 @@ class AgentService:
         state = session.state if hasattr(session, 'state') else {}
         state["structured_context"] = new_context
         session.state = state
-        logger.info(f"Updated structured context: {new_context}")
+        logger.info("Updated structured context: %s", new_context)
         return new_context
 
     async def get_short_term_context(self, session_id):
@@ -218,48 +249,102 @@ class AgentService:
         elif "content" not in event_data:
             event_data["content"] = Content(parts=[Part(text="")])
         event_type = event_data.pop("type", None)
-        sanitized_event_data = self._sanitize_for_log(event_data)
-        logger.info(f"[AgentService] Creating event with: {json.dumps(sanitized_event_data, separators=(',', ':'))}, original type: {event_type}")
+        logger.debug("[AgentService] Creating event with: %s, original type: %s",
+                     lazy(lambda: json.dumps(self._sanitize_for_log(event_data), default=str, separators=(',', ':'))), event_type)
         try:
             event = Event(**event_data)
             await self.session_service.append_event(session, event)
-            # Log session events after append
-            logger.info(f"[AgentService] Session events after append: {[e for e in getattr(session, 'events', [])]}")
+            logger.debug("[AgentService] Session %s has %d events after append", session_id, len(getattr(session, 'events', [])))
         except Exception as e:
             logger.error(f"[AgentService] Validation error details: {str(e)}")
             raise
 
     async def run_llm(self, prompt, session_id="default"):
+        """The agent's answer to the prompt in the session. Identical (session, prompt) runs already in
+        flight share one runner call, so the session records the exchange once. Each model turn of
+        the run takes its own llm_scheduler slot (see ScheduledGemini)."""
+        return await self._flight.do_async(fingerprint(self.model_name, session_id, prompt), self._run_llm, prompt, session_id)
+
+    async def _run_llm(self, prompt, session_id):
         input_content = Content(
             role="user",
             parts=[Part(text=prompt)]
         )
-        logger.info(f"[AgentService] Running LLM with prompt: {prompt}")
+        logger.info("[AgentService] Running LLM with prompt: %s", lazy_text(prompt))
         answer = ""
         try:
-            async for result_event in self.runner.run_async(
-                user_id=self.user_id,
-                session_id=session_id,
-                new_message=input_content
-            ):
-                logger.info(f"Result event: {result_event}")
-                if result_event.actions and hasattr(result_event.actions, "tool_call") and result_event.actions.tool_call:
-                    logger.info(f"Tool call: name={result_event.actions.tool_call.name}, args={result_event.actions.tool_call.args}")
-                if isinstance(result_event.content, Content):
-                    for part in result_event.content.parts:
-                        logger.info(f"Processing Part: {vars(part)}")
-                        if isinstance(part, Part) and hasattr(part, 'text') and part.text is not None:
-                            answer += part.text
-                        else:
-                            logger.warning(f"Skipping Part with invalid or missing text: {vars(part)}")
-                if result_event.error_code:
-                    logger.error(f"Error in result event: code={result_event.error_code}, message={result_event.error_message}")
-                    logger.info(f"Full result event details: {vars(result_event)}")
+            with llm_span(self.model_name, prompt, operation="agent_run") as span:
+                async for result_event in self.runner.run_async(
+                    user_id=self.user_id,
+                    session_id=session_id,
+                    new_message=input_content
+                ):
+                    logger.debug("Result event: %s", result_event)
+                    span.record_usage(getattr(result_event, "usage_metadata", None))
+                    if result_event.actions and hasattr(result_event.actions, "tool_call") and result_event.actions.tool_call:
+                        logger.info("Tool call: name=%s, args=%s", result_event.actions.tool_call.name, result_event.actions.tool_call.args)
+                    if isinstance(result_event.content, Content):
+                        for part in result_event.content.parts:
+                            logger.debug("Processing Part: %s", lazy(vars, part))
+                            if isinstance(part, Part) and hasattr(part, 'text') and part.text is not None:
+                                span.first_token()
+                                answer += part.text
+                            else:
+                                logger.warning("Skipping Part with invalid or missing text: %s", lazy(vars, part))
+                    if result_event.error_code:
+                        logger.error("Error in result event: code=%s, message=%s", result_event.error_code, result_event.error_message)
+                        span.error = f"{result_event.error_code}: {result_event.error_message}"
+                        logger.debug("Full result event details: %s", lazy(vars, result_event))
+                span.record_response(text=answer)
         except Exception as e:
             logger.error(f"[AgentService] Error in run_llm: {str(e)}")
             raise
-        logger.info(f"[AgentService] LLM answer: {answer}")
+        logger.info("[AgentService] LLM answer: %s", lazy_text(answer))
         return answer
 
+    async def run_llm_stream(self, prompt, session_id="default"):
+        """run_llm with SSE streaming from the runner, yielding text as partial events arrive.
+
+        The runner closes every streamed model turn with a non-partial event repeating the whole
+        text; that text is only yielded when the turn produced no partial events."""
+        input_content = Content(
+            role="user",
+            parts=[Part(text=prompt)]
+        )
+        logger.info("[AgentService] Streaming LLM with prompt: %s", lazy_text(prompt))
+        answer = ""
+        streamed_turn = False
+        try:
+            with llm_span(self.model_name, prompt, operation="agent_run_stream") as span:
+                async for result_event in self.runner.run_async(
+                    user_id=self.user_id,
+                    session_id=session_id,
+                    new_message=input_content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+                ):
+                    logger.debug("Result event: %s", result_event)
+                    text = ""
+                    if isinstance(result_event.content, Content):
+                        text = "".join(part.text for part in result_event.content.parts
+                                       if isinstance(part, Part) and part.text is not None)
+                    if getattr(result_event, "partial", False):
+                        streamed_turn = True
+                    else:
+                        span.record_usage(getattr(result_event, "usage_metadata", None))
+                        if streamed_turn:
+                            streamed_turn, text = False, ""
+                    if result_event.error_code:
+                        logger.error("Error in result event: code=%s, message=%s", result_event.error_code, result_event.error_message)
+                        span.error = f"{result_event.error_code}: {result_event.error_message}"
+                    if text:
+                        span.first_token()
+                        answer += text
+                        yield text
+                span.record_response(text=answer)
+        except Exception as e:
+            logger.error(f"[AgentService] Error in run_llm_stream: {str(e)}")
+            raise
+        logger.info("[AgentService] Streamed LLM answer: %s", lazy_text(answer))
+
     async def close(self):
         logger.info("[AgentService] Closing AgentService...")
\ No newline at end of file
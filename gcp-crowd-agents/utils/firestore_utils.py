@@ -1,8 +1,12 @@
 from google.cloud import firestore
 from config import GCP_PROJECT
+from tools.metrics import counted_client
 
 def get_firestore_client():
-    return firestore.Client(project=GCP_PROJECT) if GCP_PROJECT else firestore.Client()
+    return counted_client(firestore.Client(project=GCP_PROJECT) if GCP_PROJECT else firestore.Client())
+
+def get_async_firestore_client():
+    return counted_client(firestore.AsyncClient(project=GCP_PROJECT) if GCP_PROJECT else firestore.AsyncClient())
 
 def get_collection(name):
     db = get_firestore_client()
@@ -1,30 +1,27 @@
-import json
 import logging
+from tools.llm_scheduler import LLMOverloaded, llm_scheduler
+from tools.llm_gateway import json_config, response_text
+from tools.llm_tracing import llm_span
+from tools.structured_output import parse_json
 
-def extract_json_from_markdown(text):
-    """
-    Extract JSON from a markdown code block or plain text.
-    """
-    text = text.strip()
-    if text.startswith('```json'):
-        text = text[7:]
-    if text.startswith('```'):
-        text = text[3:]
-    if text.endswith('```'):
-        text = text[:-3]
-    return text
-
-
-def call_gemini(model, prompt, *parts):
+def call_gemini(model, prompt, *parts, schema=None):
     """
     Standard Gemini invocation with error handling and JSON extraction.
+    With a schema the call runs in structured-output mode and the answer is validated and repaired against it.
     Returns (parsed_json, raw_response_text)
     """
+    model_name = getattr(model, "_model_name", "gemini")
+    response = None
+    kwargs = {"generation_config": json_config(schema)} if schema is not None else {}
     try:
-        response = model.generate_content([prompt, *parts])
-        text = extract_json_from_markdown(response.text)
-        result = json.loads(text)
-        return result, response.text
+        with llm_scheduler.slot(model_name), llm_span(model_name, prompt) as span:
+            response = model.generate_content([prompt, *parts], **kwargs)
+            span.record_response(response)
+        text = response_text(response)
+        return parse_json(text, schema, model_name), text
+    except LLMOverloaded:
+        raise
     except Exception as e:
-        logging.error(f"[GeminiUtils] Failed to parse Gemini response: {e}, raw: {getattr(response, 'text', None)}")
-        return None, getattr(response, 'text', None) 
\ No newline at end of file
+        raw = response_text(response) if response is not None else None
+        logging.error(f"[GeminiUtils] Failed to parse Gemini response: {e}, raw: {raw}")
+        return None, raw
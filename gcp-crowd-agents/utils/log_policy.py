@@ -0,0 +1,84 @@
+import json
+import logging
+import random
+from typing import Any, Callable, Dict
+from config import LOG_MAX_CHARS, LOG_LEVELS, LOG_SAMPLE_RATES
+
+def _parse_overrides(spec: str) -> Dict[str, str]:
+    overrides = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            overrides[name.strip()] = value.strip()
+    return overrides
+
+_LEVELS = {name: value.upper() for name, value in _parse_overrides(LOG_LEVELS).items()}
+_SAMPLE_RATES = {name: float(value) for name, value in _parse_overrides(LOG_SAMPLE_RATES).items()}
+
+def truncate(text: str, max_chars: int = LOG_MAX_CHARS) -> str:
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+class Lazy:
+    """Log argument computed (and truncated) only when the record is formatted."""
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: Callable[..., Any], *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return truncate(str(self.func(*self.args)))
+
+    __repr__ = __str__
+
+def lazy(func: Callable[..., Any], *args) -> Lazy:
+    return Lazy(func, *args)
+
+def lazy_json(obj: Any) -> Lazy:
+    return Lazy(lambda: json.dumps(obj, default=str, separators=(',', ':')))
+
+def lazy_text(text: Any) -> Lazy:
+    """Multi-line text flattened onto one log line."""
+    return Lazy(lambda: str(text).replace("\n", " | "))
+
+class PolicyFilter(logging.Filter):
+    """Samples INFO-and-below records and truncates every message to max_chars."""
+
+    def __init__(self, sample_rate: float = 1.0, max_chars: int = LOG_MAX_CHARS):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.INFO and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record.msg, record.args = truncate(message, self.max_chars), None
+        return True
+
+def _override(table: Dict[str, Any], name: str):
+    """Most specific dotted-prefix match, so "agents" covers "agents.chat"."""
+    while name:
+        if name in table:
+            return table[name]
+        name = name.rpartition(".")[0]
+    return None
+
+def get_logger(name: str, default_level: int = logging.INFO) -> logging.Logger:
+    """logging.getLogger(name) with its level and sample rate taken from LOG_LEVELS / LOG_SAMPLE_RATES
+    ("utils.agent_service=DEBUG,comms.pubsub=0.1") and every message cut to LOG_MAX_CHARS.
+    Pass expensive values as lazy(), lazy_json() or lazy_text() %-style args so they are only
+    built for records that are actually emitted."""
+    logger = logging.getLogger(name)
+    if any(isinstance(f, PolicyFilter) for f in logger.filters):
+        return logger
+    level = _override(_LEVELS, name)
+    logger.setLevel(level or default_level)
+    sample_rate = _override(_SAMPLE_RATES, name)
+    logger.addFilter(PolicyFilter(1.0 if sample_rate is None else sample_rate))
+    return logger
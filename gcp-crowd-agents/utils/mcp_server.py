@@ -2,7 +2,7 @@ import json
 import logging
 from fastapi import APIRouter, Request, HTTPException
 from typing import Dict, Any
-from tools import db_tools
+from tools import async_db_tools
 import aiohttp
 import requests
 
@@ -12,26 +12,29 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 ALL_TOOLS = {
-    "fetch_incidents": {"function": db_tools.fetch_incidents, "schema": {"description": "Fetch all incidents"}},
-    "get_active_incidents": {"function": db_tools.get_active_incidents, "schema": {"description": "Fetch all non-closed incidents"}},
-    "fetch_zones": {"function": db_tools.fetch_zones, "schema": {"description": "Fetch all zones"}},
-    "fetch_responders": {"function": db_tools.fetch_responders, "schema": {"description": "Fetch all responders"}},
-    "get_available_responders": {"function": db_tools.get_available_responders, "schema": {"description": "Fetch only available responders"}},
-    "fetch_alerts": {"function": db_tools.fetch_alerts, "schema": {"description": "Fetch all alerts"}},
-    "analyze_responder_assignments": {"function": db_tools.analyze_responder_assignments, "schema": {"description": "Analyze responder assignments"}},
-    "assign_responder_to_incident": {"function": db_tools.assign_responder_to_incident, "schema": {"description": "Assign a responder to an incident"}},
-    "assign_any_responder_to_incident": {"function": db_tools.assign_any_responder_to_incident, "schema": {"description": "Assign any available responder to an incident"}},
-    "assign_responder_to_zone": {"function": db_tools.assign_responder_to_zone, "schema": {"description": "Assign a responder to a zone"}},
-    "assign_any_responder_to_zone": {"function": db_tools.assign_any_responder_to_zone, "schema": {"description": "Assign any available responder to a zone"}},
-    "notify_unavailable": {"function": db_tools.notify_unavailable, "schema": {"description": "Log an alert for unavailable responders"}},
-    "suggest_zones_needing_responders": {"function": db_tools.suggest_zones_needing_responders, "schema": {"description": "Suggest zones needing responders"}},
+    "fetch_incidents": {"function": async_db_tools.fetch_incidents, "schema": {"description": "Fetch all incidents"}},
+    "get_active_incidents": {"function": async_db_tools.get_active_incidents, "schema": {"description": "Fetch all non-closed incidents"}},
+    "fetch_zones": {"function": async_db_tools.fetch_zones, "schema": {"description": "Fetch all zones"}},
+    "fetch_responders": {"function": async_db_tools.fetch_responders, "schema": {"description": "Fetch all responders"}},
+    "get_available_responders": {"function": async_db_tools.get_available_responders, "schema": {"description": "Fetch only available responders"}},
+    "count_available_responders": {"function": async_db_tools.count_available_responders, "schema": {"description": "Count available responders by type and zone"}},
+    "fetch_alerts": {"function": async_db_tools.fetch_alerts, "schema": {"description": "Fetch all alerts"}},
+    "analyze_responder_assignments": {"function": async_db_tools.analyze_responder_assignments, "schema": {"description": "Analyze responder assignments"}},
+    "assign_responder_to_incident": {"function": async_db_tools.assign_responder_to_incident, "schema": {"description": "Assign a responder to an incident"}},
+    "assign_any_responder_to_incident": {"function": async_db_tools.assign_any_responder_to_incident, "schema": {"description": "Assign any available responder to an incident"}},
+    "assign_responder_to_zone": {"function": async_db_tools.assign_responder_to_zone, "schema": {"description": "Assign a responder to a zone"}},
+    "assign_any_responder_to_zone": {"function": async_db_tools.assign_any_responder_to_zone, "schema": {"description": "Assign any available responder to a zone"}},
+    "assign_responders_bulk": {"function": async_db_tools.assign_responders_bulk, "schema": {"description": "Assign many responders to incidents or zones in one batch"}},
+    "optimize_responder_assignments": {"function": async_db_tools.optimize_responder_assignments, "schema": {"description": "Optimally match open incidents to available responders"}},
+    "notify_unavailable": {"function": async_db_tools.notify_unavailable, "schema": {"description": "Log an alert for unavailable responders"}},
+    "suggest_zones_needing_responders": {"function": async_db_tools.suggest_zones_needing_responders, "schema": {"description": "Suggest zones needing responders"}},
 }
 
 class MCPServer:
     def __init__(self):
         self.tools = ALL_TOOLS
 
-    def handle_request(self, request_data: Dict) -> Dict:
+    async def handle_request(self, request_data: Dict) -> Dict:
         """Handles JSON-RPC requests."""
         try:
             method = request_data.get("method")
@@ -50,7 +53,7 @@ class MCPServer:
                 return response
 
             elif method in self.tools:
-                result = self.tools[method]["function"](**params)
+                result = await self.tools[method]["function"](**params)
                 response = {
                     "jsonrpc": "2.0",
                     "result": result,
@@ -127,7 +130,7 @@ mcp_server = MCPServer()
 async def mcp_endpoint(request: Request):
     try:
         request_data = await request.json()
-        response = mcp_server.handle_request(request_data)
+        response = await mcp_server.handle_request(request_data)
         return response
     except Exception as e:
         logger.error(f"[MCPServer] Endpoint error: {str(e)}")
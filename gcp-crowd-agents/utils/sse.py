@@ -0,0 +1,36 @@
+import json
+import logging
+from typing import AsyncIterator, Iterator, Union
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx / Cloud Run front ends from buffering the stream.
+    "X-Accel-Buffering": "no",
+}
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _events(chunks: Union[Iterator[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+    if not hasattr(chunks, "__aiter__"):
+        # Sync generators (blocking Gemini streams) advance in the threadpool.
+        chunks = iterate_in_threadpool(chunks)
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event("token", {"text": chunk})
+    except Exception as e:
+        logger.error(f"[SSE] Stream failed: {e}")
+        yield sse_event("error", {"error": str(e), "status": getattr(e, "status_code", 500)})
+        return
+    yield sse_event("done", {"text": "".join(parts)})
+
+def sse_response(chunks: Union[Iterator[str], AsyncIterator[str]]) -> StreamingResponse:
+    """Text chunks as Server-Sent Events: one "token" event per chunk, then "done" with the full
+    text, or "error" (with the HTTP status it would have had, e.g. 429) if the stream fails."""
+    return StreamingResponse(_events(chunks), media_type="text/event-stream", headers=SSE_HEADERS)